@@ -0,0 +1,233 @@
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from temperature_scoring.config import data_dir, plots_dir, project_dir
+from temperature_scoring.engine import load_regression_model, load_sbti_target_status
+from temperature_scoring.synthetic import make_input_data
+
+from clean_data import SHEET_NAMES, clean_input_data
+from process_targets import append_historical_data_to_emission_targets, process_targets
+from calculate_scores import calculate_score
+from plot_scores import plot_temperature_scores
+
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+AGGREGATION_METHODS = ["Average", "Emissions", "Revenue", "Market Cap"]
+RESULT_COLUMNS = [
+    "label",
+    "python",
+    "n_companies",
+    "stage",
+    "method",
+    "seconds",
+    "peak_mb",
+]
+
+
+def write_input_data(n_companies, seed):
+    dfs = make_input_data(n_companies, seed)
+    os.makedirs(data_dir("raw"), exist_ok=True)
+    os.makedirs(data_dir("clean"), exist_ok=True)
+    os.makedirs(plots_dir(), exist_ok=True)
+
+    raw_file = data_dir("raw", "input_data.xlsx")
+    with pd.ExcelWriter(raw_file) as writer:
+        for sheet_name, key in SHEET_NAMES.items():
+            dfs[key].to_excel(writer, sheet_name=sheet_name, index=False)
+    dfs["emission_data"].to_csv(data_dir("clean", "emission_data.csv"), index=False)
+    return raw_file
+
+
+def measure(function, memory=True):
+    # Every run starts without cached workbooks
+    shutil.rmtree(data_dir("cache"), ignore_errors=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+
+        # Peak of memory allocated by Python and NumPy, in a second run since
+        # tracing slows down the stage
+        peak_mb = float("nan")
+        if memory:
+            shutil.rmtree(data_dir("cache"), ignore_errors=True)
+            tracemalloc.start()
+            try:
+                function()
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            finally:
+                tracemalloc.stop()
+    return seconds, peak_mb
+
+
+def get_stages(raw_file, n_companies, engine, max_plot_size):
+    stages = [
+        (
+            "clean_input_data",
+            "",
+            lambda: clean_input_data(raw_file, data_dir("clean", "input_data.xlsx")),
+        ),
+        ("process_targets", "", process_targets),
+        ("append_historical_data", "", append_historical_data_to_emission_targets),
+    ]
+    stages += [
+        (
+            "calculate_score",
+            method,
+            lambda method=method: calculate_score(
+                aggregation_methods=[method], engine=engine
+            ),
+        )
+        for method in AGGREGATION_METHODS
+    ]
+    # All portfolio scores are needed for the plot
+    stages.append(
+        (
+            "calculate_score",
+            "all",
+            lambda: calculate_score(
+                aggregation_methods=AGGREGATION_METHODS, engine=engine
+            ),
+        )
+    )
+    if n_companies <= max_plot_size:
+        stages.append(
+            (
+                "plot_temperature_scores",
+                "all",
+                lambda: plot_temperature_scores(
+                    aggregation_methods=AGGREGATION_METHODS
+                ),
+            )
+        )
+    return stages
+
+
+def run_benchmarks(
+    sizes=SIZES,
+    engine="numpy",
+    memory=True,
+    max_plot_size=1_000,
+    label=None,
+    seed=0,
+):
+    # Load the SBTi data once, outside of the measured stages
+    load_regression_model()
+    load_sbti_target_status()
+
+    # Every size runs in its own directory, the caller's one is restored after
+    previous_dir = os.environ.get("TEMPERATURE_SCORING_DIR")
+    results = []
+    for n_companies in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ["TEMPERATURE_SCORING_DIR"] = directory
+            try:
+                raw_file = write_input_data(n_companies, seed)
+                for stage, method, function in get_stages(
+                    raw_file, n_companies, engine, max_plot_size
+                ):
+                    seconds, peak_mb = measure(function, memory)
+                    results.append(
+                        {
+                            "label": label,
+                            "python": platform.python_version(),
+                            "n_companies": n_companies,
+                            "stage": stage,
+                            "method": method,
+                            "seconds": seconds,
+                            "peak_mb": peak_mb,
+                        }
+                    )
+                    print(
+                        f"{n_companies:>7} {stage:<24} {method:<10} "
+                        f"{seconds:8.2f}s {peak_mb:9.1f} MB"
+                    )
+            finally:
+                if previous_dir is None:
+                    del os.environ["TEMPERATURE_SCORING_DIR"]
+                else:
+                    os.environ["TEMPERATURE_SCORING_DIR"] = previous_dir
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+def compare_results(df, df_baseline, tolerance=1.25, min_seconds=0.5):
+    # Ratios to the baseline, stages slower or larger than the tolerance are
+    # regressions, short stages are too noisy to compare times
+    keys = ["n_companies", "stage", "method"]
+    df_baseline = df_baseline.fillna({"method": ""})
+    df = df.merge(
+        df_baseline[keys + ["seconds", "peak_mb"]],
+        on=keys,
+        how="left",
+        suffixes=("", "_baseline"),
+    )
+    df["time_ratio"] = df["seconds"] / df["seconds_baseline"]
+    df["memory_ratio"] = df["peak_mb"] / df["peak_mb_baseline"]
+    slower = (df["time_ratio"] > tolerance) & (df["seconds"] >= min_seconds)
+    df["regression"] = slower | (df["memory_ratio"] > tolerance)
+    return df
+
+
+def get_label():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_dir(),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "nogit"
+    return f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{commit}"
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--engine", default="numpy", choices=["numpy", "sbti"])
+    parser.add_argument("--no-memory", action="store_true", help="only time stages")
+    parser.add_argument(
+        "--max-plot-size", type=int, default=1_000, help="largest plotted size"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", help="name of the results file")
+    parser.add_argument("--compare", help="results file of a baseline run")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args()
+
+    # Results are saved in the project, not in the temporary data directories
+    label = args.label or get_label()
+    results_file = data_dir("benchmarks", f"{label}.csv")
+
+    df = run_benchmarks(
+        args.sizes,
+        engine=args.engine,
+        memory=not args.no_memory,
+        max_plot_size=args.max_plot_size,
+        label=label,
+        seed=args.seed,
+    )
+    os.makedirs(results_file.parent, exist_ok=True)
+    df.to_csv(results_file, index=False)
+    print("Results saved in", results_file)
+
+    if args.compare:
+        df = compare_results(df, pd.read_csv(args.compare), args.tolerance)
+        columns = ["n_companies", "stage", "method", "time_ratio", "memory_ratio"]
+        print(df[columns].to_string(index=False, float_format="{:.2f}".format))
+        if df["regression"].any():
+            print("Regressions:")
+            print(df.loc[df["regression"], columns].to_string(index=False))
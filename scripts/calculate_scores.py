@@ -1,132 +1,496 @@
 import pandas as pd
 import numpy as np
 
-import SBTi
-from SBTi.data.excel import ExcelProvider
-from SBTi.portfolio_aggregation import PortfolioAggregationMethod
-from SBTi.portfolio_coverage_tvp import PortfolioCoverageTVP
-from SBTi.temperature_score import TemperatureScore, Scenario
-from SBTi.target_validation import TargetProtocol
 from SBTi.interfaces import ETimeFrames, EScope
 
+from temperature_scoring.backtest import (
+    emission_years,
+    snapshot_ids,
+    split_snapshot_ids,
+    split_snapshots,
+    stack_snapshots,
+)
+from temperature_scoring.cache import file_hash, read_excel_cached
 from temperature_scoring.config import data_dir
+from temperature_scoring.engine import calculate_temperature_scores
+from temperature_scoring.incremental import (
+    changed_companies,
+    empty_portfolio_sums,
+    get_input_hashes,
+    get_state_params,
+    load_state,
+    patch_scores,
+    save_state,
+    update_portfolio_sums,
+)
+from temperature_scoring.outputs import (
+    DEFAULT_FORMATS,
+    background_writes,
+    output_files,
+    write_output,
+)
+from temperature_scoring.portfolios import (
+    PORTFOLIO_ID,
+    get_portfolio_scores,
+    score_portfolios,
+)
+from temperature_scoring.revision import revise_combined_scores
+from temperature_scoring.schema import SCOPE_ORDER, TIME_FRAME_ORDER, to_target_type
+from temperature_scoring.sensitivity import get_scoring_setup, run_sensitivity
+from temperature_scoring.tracing import span, traced
 
 
+# Portfolio weights of each aggregation method, other method names are taken
+# as custom weight columns in the portfolio or fundamental data
+AGGREGATION_WEIGHTS = {
+    "Average": None,
+    "Emissions": "ghg_s1s2",
+    "Market Cap": "company_market_cap",
+    "Revenue": "company_revenue",
+}
+
+
+def get_investment_values(df_portfolio, aggregation_method):
+    column = AGGREGATION_WEIGHTS.get(aggregation_method, aggregation_method)
+    if column is None:
+        return pd.Series(1, index=df_portfolio.index)
+    return df_portfolio[column]
+
+
+def merge_portfolio(df_portfolio, df_fundamental_data):
+    return df_portfolio.merge(
+        df_fundamental_data.drop(columns="company_name"), on="company_id", how="left"
+    )
+
+
+def get_portfolio(input_file):
+    return merge_portfolio(
+        read_excel_cached(input_file, "portfolio_data"),
+        read_excel_cached(input_file, "fundamental_data"),
+    )
+
+
+def get_holdings(df_portfolio, aggregation_methods):
+    # Each aggregation method is a portfolio of the same companies with
+    # different weights, so all of them are aggregated at once
+    return pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    PORTFOLIO_ID: aggregation_method,
+                    "company_id": df_portfolio["company_id"],
+                    "investment_value": get_investment_values(
+                        df_portfolio, aggregation_method
+                    ),
+                }
+            )
+            for aggregation_method in aggregation_methods
+        ]
+    )
+
+
+TIME_FRAMES = [ETimeFrames.SHORT, ETimeFrames.MID, ETimeFrames.LONG]
+SCOPES = [EScope.S1S2, EScope.S1S2S3, EScope.S3]
+
+
+def calculate_company_scores(
+    input_file,
+    df_portfolio,
+    revised_combined_score=False,
+    engine="sbti",
+    combined_fallback="max",
+):
+    if engine not in ["sbti", "numpy"]:
+        raise ValueError(f"Unknown scoring engine: {engine}")
+
+    with span(f"{engine}_calculate", "score") as record:
+        if engine == "sbti":
+            # The SBTi tool is imported only when it scores
+            from SBTi.temperature_score import TemperatureScore
+            from SBTi.utils import dataframe_to_portfolio
+
+            from temperature_scoring.providers import CachedExcelProvider
+
+            temperature_score = TemperatureScore(
+                time_frames=TIME_FRAMES,
+                scopes=SCOPES,
+            )
+            data_provider = CachedExcelProvider(input_file)
+            portfolio = dataframe_to_portfolio(df_portfolio)
+            df = temperature_score.calculate(
+                data_providers=[data_provider],
+                portfolio=portfolio,
+            )
+        else:
+            # Vectorized engine with the same results as the SBTi tool
+            df = calculate_temperature_scores(
+                read_excel_cached(input_file, "target_data"),
+                read_excel_cached(input_file, "fundamental_data"),
+                df_portfolio,
+                time_frames=TIME_FRAMES,
+                scopes=SCOPES,
+            )
+        record["rows"] = len(df)
+
+    return finish_company_scores(df, revised_combined_score, combined_fallback)
+
+
+def finish_company_scores(df, revised_combined_score=False, combined_fallback="max"):
+    df["target_type"] = to_target_type(df["target_type"])
+
+    # Keep only non-default scores
+    # df = df[df["temperature_results"] < 1]
+
+    columns = ["company_name", "company_id"]
+    columns = columns + [col for col in df.columns if col not in columns]
+    df = df[columns]
+
+    # Revise S1+S2+S3 scores if GHG emissions data are missing
+    if revised_combined_score:
+        df["revised_temperature_score"] = revise_combined_scores(df, combined_fallback)
+
+    return df
+
+
+def get_aggregated_scores(df, revised_combined_score=False):
+    # Portfolios aggregate the revised scores where there are any
+    if not revised_combined_score:
+        return df
+    return df.assign(
+        temperature_score=df["revised_temperature_score"].fillna(
+            df["temperature_score"]
+        )
+    )
+
+
+def calculate_portfolio_scores(
+    df_holdings,
+    suffix="",
+    revised_combined_score=False,
+    engine="numpy",
+    combined_fallback="max",
+):
+    # Score every company held in any portfolio once, then aggregate
+    # all portfolios (portfolio_id, company_id, investment_value) together
+    input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+    df_fundamental_data = read_excel_cached(input_file, "fundamental_data")
+    columns = [c for c in ["company_id", "company_isin"] if c in df_holdings]
+    df_universe = df_holdings[columns].drop_duplicates("company_id")
+    df_universe = df_universe.merge(df_fundamental_data, on="company_id", how="inner")
+    df_universe["investment_value"] = 1
+
+    df = calculate_company_scores(
+        input_file, df_universe, revised_combined_score, engine, combined_fallback
+    )
+    return score_portfolios(
+        get_aggregated_scores(df, revised_combined_score), df_holdings
+    )
+
+
+@traced()
 def calculate_score(
     suffix="",
     revised_combined_score=False,
     aggregation_methods=["Average"],
+    engine="sbti",
+    combined_fallback="max",
+    output_suffix=None,
+    output_formats=DEFAULT_FORMATS,
 ):
+    # Scenarios reading the same input data can write to different outputs
+    if output_suffix is None:
+        output_suffix = suffix
     input_file = data_dir("clean", f"input_data{suffix}.xlsx")
-    output_file = data_dir("clean", f"output_data{suffix}.xlsx")
+    company_files = output_files(f"output_data{output_suffix}", output_formats)
 
-    time_frames = [ETimeFrames.SHORT, ETimeFrames.MID, ETimeFrames.LONG]
-    scopes = [EScope.S1S2, EScope.S1S2S3, EScope.S3]
+    df_portfolio = get_portfolio(input_file)
 
-    temperature_score = TemperatureScore(
-        time_frames=time_frames,
-        scopes=scopes,
+    # Company scores do not depend on the investment values, so score once
+    df_portfolio["investment_value"] = get_investment_values(
+        df_portfolio, aggregation_methods[0]
     )
-
-    data_provider = ExcelProvider(input_file)
-
-    df_portfolio = pd.read_excel(input_file, sheet_name="portfolio_data")
-    df_fundamental_data = pd.read_excel(input_file, sheet_name="fundamental_data")
-    df_portfolio = df_portfolio.merge(
-        df_fundamental_data.drop(columns="company_name"), on="company_id", how="left"
+    df = calculate_company_scores(
+        input_file, df_portfolio, revised_combined_score, engine, combined_fallback
     )
 
-    for aggregation_method in aggregation_methods:
+    # Save individual scores only once, while the portfolios are aggregated
+    with background_writes() as write:
+        write(write_output, df, f"output_data{output_suffix}", output_formats)
 
-        if aggregation_method == "Average":
-            df_portfolio["investment_value"] = 1
-        elif aggregation_method == "Emissions":
-            df_portfolio["investment_value"] = df_portfolio["ghg_s1s2"]
-        elif aggregation_method == "Market Cap":
-            df_portfolio["investment_value"] = df_portfolio["company_market_cap"]
-        elif aggregation_method == "Revenue":
-            df_portfolio["investment_value"] = df_portfolio["company_revenue"]
+        df = get_aggregated_scores(df, revised_combined_score)
 
-        portfolio = SBTi.utils.dataframe_to_portfolio(df_portfolio)
+        with span("aggregation", "score", methods=len(aggregation_methods)) as record:
+            df_holdings = get_holdings(df_portfolio, aggregation_methods)
+            df_scores = score_portfolios(df, df_holdings)
+            df_scores["temperature_score"] = df_scores["temperature_score"].round(2)
+            record["rows"] = len(df_holdings)
 
-        df = temperature_score.calculate(
-            data_providers=[data_provider],
-            portfolio=portfolio,
-        )
+    return company_files + write_portfolio_scores(df_scores, output_suffix)
 
-        df["target_type"] = df["target_type"].str.capitalize()
-
-        # Keep only non-default scores
-        # df = df[df["temperature_results"] < 1]
-
-        columns = ["company_name", "company_id"]
-        columns = columns + [col for col in df.columns if col not in columns]
-        df = df[columns]
-
-        # Revise S1+S2+S3 scores if GHG emissions data are missing
-        if revised_combined_score:
-            df["scope"] = df["scope"].astype(str)
-            df_revised = (
-                df[
-                    [
-                        "company_id",
-                        "time_frame",
-                        "ghg_s1s2",
-                        "ghg_s3",
-                        "scope",
-                        "temperature_score",
-                    ]
-                ]
-                .pivot(
-                    index=["company_id", "time_frame", "ghg_s1s2", "ghg_s3"],
-                    columns="scope",
-                    values="temperature_score",
-                )
-                .reset_index()
+
+def write_portfolio_scores(df_scores, output_suffix):
+    output_files = []
+    with span("csv_write", "io", files=df_scores[PORTFOLIO_ID].nunique()):
+        for aggregation_method, df_agg in df_scores.groupby(PORTFOLIO_ID, sort=False):
+            df_agg = df_agg.pivot(
+                index="scope", columns="time_frame", values="temperature_score"
             )
-            missing_ghg = df_revised["ghg_s1s2"].isna() | df_revised["ghg_s3"].isna()
-            df_revised.loc[missing_ghg, "S1S2S3"] = df_revised.loc[
-                missing_ghg, ["S1S2", "S3"]
-            ].max(axis=1)
-            df_revised = df_revised.melt(
-                id_vars=["company_id", "time_frame"],
-                value_vars=["S1S2", "S3", "S1S2S3"],
-                var_name="scope",
-                value_name="revised_temperature_score",
+            df_agg = df_agg.loc[SCOPE_ORDER, TIME_FRAME_ORDER]
+            df_agg.columns.name = None
+            output_files.append(
+                data_dir(
+                    "clean", f"portfolio_scores{output_suffix}_{aggregation_method}.csv"
+                )
             )
-            df = df.merge(
-                df_revised, on=["company_id", "time_frame", "scope"], how="left"
+            df_agg.to_csv(output_files[-1])
+    return output_files
+
+
+@traced()
+def calculate_score_incremental(
+    suffix="",
+    revised_combined_score=False,
+    aggregation_methods=["Average"],
+    combined_fallback="max",
+    output_suffix=None,
+    max_changed_share=0.5,
+    write_company_scores=True,
+    output_formats=DEFAULT_FORMATS,
+):
+    # Same outputs as calculate_score with the numpy engine, but only
+    # companies whose target, fundamental or portfolio rows changed since the
+    # last run are rescored and the portfolio scores are updated by their
+    # contributions. Without a saved state, or if most companies changed,
+    # all companies are scored. The company scores are kept with the state,
+    # writing them takes most of the time for large inputs and can be skipped.
+    if output_suffix is None:
+        output_suffix = suffix
+    input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+    company_files = output_files(f"output_data{output_suffix}", output_formats)
+    all_files = (company_files if write_company_scores else []) + [
+        data_dir("clean", f"portfolio_scores{output_suffix}_{method}.csv")
+        for method in aggregation_methods
+    ]
+
+    df_targets = read_excel_cached(input_file, "target_data")
+    df_fundamental = read_excel_cached(input_file, "fundamental_data")
+    df_portfolio = get_portfolio(input_file)
+    df_portfolio["investment_value"] = get_investment_values(
+        df_portfolio, aggregation_methods[0]
+    )
+    df_holdings = get_holdings(df_portfolio, aggregation_methods)
+    hashes = get_input_hashes(
+        df_targets, df_fundamental, read_excel_cached(input_file, "portfolio_data")
+    )
+
+    state_name = f"calculate_score{output_suffix}"
+    params = get_state_params(
+        suffix=suffix,
+        revised_combined_score=revised_combined_score,
+        aggregation_methods=list(aggregation_methods),
+        combined_fallback=combined_fallback,
+        # Company scores are finished and aggregated by this script
+        script=file_hash(__file__),
+    )
+    state = load_state(state_name, params)
+    company_ids = hashes.index
+    if state is not None:
+        company_ids = changed_companies(state["hashes"], hashes)
+        if not len(company_ids) and all(path.exists() for path in all_files):
+            print(f"No changed companies in {input_file.name}")
+            return all_files
+        if len(company_ids) > max_changed_share * len(hashes):
+            state = None
+            company_ids = hashes.index
+
+    with span("incremental_calculate", "score", companies=len(company_ids)) as record:
+        if len(company_ids):
+            in_changed = lambda df: df[df["company_id"].astype(str).isin(company_ids)]
+            df_changed = calculate_temperature_scores(
+                in_changed(df_targets),
+                in_changed(df_fundamental),
+                in_changed(df_portfolio),
+                time_frames=TIME_FRAMES,
+                scopes=SCOPES,
             )
-            df["scope"] = df["scope"].replace(
-                {"S1S2": EScope.S1S2, "S3": EScope.S3, "S1S2S3": EScope.S1S2S3}
+            df_changed = finish_company_scores(
+                df_changed, revised_combined_score, combined_fallback
             )
-        if aggregation_method == aggregation_methods[0]:
-            # Save individual scores only once
-            df.to_excel(output_file, index=False)
-
-        # Aggregate scores
-        if revised_combined_score:
-            df["temperature_score"] = df["revised_temperature_score"].fillna(
-                df["temperature_score"]
+        else:
+            # Only the outputs are missing
+            df_changed = state["scores"].iloc[:0]
+        record["rows"] = len(df_changed)
+
+    # Companies in the order of a full run
+    order = df_fundamental["company_id"].astype(str).unique()
+    if state is None:
+        df = patch_scores(df_changed, df_changed.iloc[:0], [], order)
+    else:
+        df = patch_scores(state["scores"], df_changed, company_ids, order)
+
+    with background_writes() as write:
+        if write_company_scores:
+            write(write_output, df, f"output_data{output_suffix}", output_formats)
+
+        with span("aggregation", "score", companies=len(company_ids)):
+            df_aggregated = get_aggregated_scores(df, revised_combined_score)
+            if state is None:
+                sums = empty_portfolio_sums(
+                    df_aggregated, df_holdings, "temperature_score"
+                )
+                old = (df_aggregated.iloc[:0], df_holdings.iloc[:0])
+            else:
+                sums = state["sums"]
+                old = (
+                    get_aggregated_scores(state["scores"], revised_combined_score),
+                    state["holdings"],
+                )
+            sums = update_portfolio_sums(
+                sums,
+                old,
+                (df_aggregated, df_holdings),
+                company_ids,
+                "temperature_score",
             )
-        temperature_score.aggregation_method = PortfolioAggregationMethod.WATS
-        # aggregate by revenues
-        aggregated_scores = temperature_score.aggregate_scores(df)
-        df_agg = pd.DataFrame(aggregated_scores.dict()).applymap(
-            lambda x: round(x["all"]["score"], 2)
+            df_scores = get_portfolio_scores(sums["sums"], sums["weights"])
+            df_scores["temperature_score"] = df_scores["temperature_score"].round(2)
+
+    write_portfolio_scores(df_scores, output_suffix)
+    save_state(
+        state_name,
+        {
+            "params": params,
+            "hashes": hashes,
+            "scores": df,
+            "holdings": df_holdings,
+            "sums": sums,
+        },
+    )
+    print(f"Rescored {len(company_ids)} of {len(hashes)} companies")
+    return all_files
+
+
+@traced()
+def calculate_score_sensitivity(
+    suffix="",
+    aggregation_methods=["Average"],
+    n_draws=1000,
+    uncertainty=None,
+    combined_fallback=None,
+    seed=0,
+):
+    # Percentile bands of company and portfolio scores over perturbed inputs,
+    # all draws are scored at once from a single scoring setup
+    input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+    df_portfolio = get_portfolio(input_file)
+    setup = get_scoring_setup(
+        read_excel_cached(input_file, "target_data"),
+        read_excel_cached(input_file, "fundamental_data"),
+        df_portfolio.assign(investment_value=1),
+    )
+    df_companies, df_portfolios = run_sensitivity(
+        setup,
+        get_holdings(df_portfolio, aggregation_methods),
+        n_draws=n_draws,
+        uncertainty=uncertainty,
+        seed=seed,
+        combined_fallback=combined_fallback,
+    )
+
+    output_files = [
+        data_dir("clean", f"company_score_bands{suffix}.csv"),
+        data_dir("clean", f"portfolio_score_bands{suffix}.csv"),
+    ]
+    df_companies.round(2).to_csv(output_files[0], index=False)
+    df_portfolios.round(2).to_csv(output_files[1], index=False)
+    return output_files
+
+
+@traced()
+def calculate_score_backtest(
+    suffix="",
+    years=None,
+    revised_combined_score=False,
+    aggregation_methods=["Average"],
+    combined_fallback="max",
+    output_suffix=None,
+    output_formats=DEFAULT_FORMATS,
+):
+    # Portfolio scores as of each reporting year of the emission data, by
+    # default all of them. Snapshots of all years are scored in one pass of
+    # the numpy engine, which unlike the SBTi tool takes a current year per
+    # company.
+    if output_suffix is None:
+        output_suffix = suffix
+    input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+    df_emissions = pd.read_csv(data_dir("clean", "emission_data.csv"))
+    if years is None:
+        years = emission_years(df_emissions)
+
+    with span("backtest_snapshots", years=len(years)) as record:
+        df_targets, df_fundamental, df_portfolio, current_year = stack_snapshots(
+            read_excel_cached(input_file, "target_data"),
+            read_excel_cached(input_file, "fundamental_data"),
+            read_excel_cached(input_file, "portfolio_data"),
+            df_emissions,
+            years,
+        )
+        # Weights of the year, e.g. its emissions
+        df_portfolio = df_portfolio.merge(
+            df_fundamental.drop(columns="company_name"), on="company_id", how="left"
+        )
+        df_portfolio["investment_value"] = get_investment_values(
+            df_portfolio, aggregation_methods[0]
+        )
+        record["rows"] = len(df_fundamental)
+
+    with span("backtest_calculate", "score", years=len(years)) as record:
+        df = calculate_temperature_scores(
+            df_targets,
+            df_fundamental,
+            df_portfolio,
+            time_frames=TIME_FRAMES,
+            scopes=SCOPES,
+            current_year=current_year,
+        )
+        df = finish_company_scores(df, revised_combined_score, combined_fallback)
+        record["rows"] = len(df)
+
+    with span("aggregation", "score", years=len(years)):
+        # Portfolios of each year hold the companies of the year
+        df_holdings = get_holdings(df_portfolio, aggregation_methods)
+        df_holdings[PORTFOLIO_ID] = snapshot_ids(
+            df_holdings[PORTFOLIO_ID],
+            split_snapshot_ids(df_holdings["company_id"])[1],
         )
-        df_agg.index.name = "scope"
-        df_agg.to_csv(
-            data_dir("clean", f"portfolio_scores{suffix}_{aggregation_method}.csv")
+        df_scores = score_portfolios(
+            get_aggregated_scores(df, revised_combined_score), df_holdings
         )
+        df_scores["temperature_score"] = df_scores["temperature_score"].round(2)
+        df_scores = split_snapshots(df_scores, PORTFOLIO_ID)
+
+    output_files = [data_dir("clean", f"backtest_scores{output_suffix}.csv")]
+    df_scores.sort_values(["year", PORTFOLIO_ID], kind="stable").to_csv(
+        output_files[0], index=False
+    )
+    return output_files + write_output(
+        split_snapshots(df), f"backtest_output_data{output_suffix}", output_formats
+    )
 
 
 if __name__ == "__main__":
 
+    # Workbooks of the company scores are published with the repository
     # calculate_score("_example")
-    calculate_score("", revised_combined_score=True)
+    calculate_score("", revised_combined_score=True, output_formats=["arrow", "xlsx"])
     calculate_score(
         "_with_estimates",
         revised_combined_score=False,
         aggregation_methods=["Average", "Emissions", "Revenue", "Market Cap"],
+        output_formats=["arrow", "xlsx"],
     )
+    # Daily updates of the target data
+    # calculate_score_incremental("", revised_combined_score=True)
+    # calculate_score_sensitivity("", n_draws=1000, combined_fallback="max")
+    # Trends over the reporting years of the emission data
+    # calculate_score_backtest("", revised_combined_score=True)
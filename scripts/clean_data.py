@@ -1,70 +1,219 @@
+import os
+
+import openpyxl
 import pandas as pd
 
+from temperature_scoring.cache import read_excel_cached
 from temperature_scoring.config import data_dir
-
-
-def clean_input_data(raw_file, clean_file, use_estimates=False):
-    dfs = pd.read_excel(raw_file, sheet_name=None)
-
-    new_keys = {
-        "Target Data": "target_data",
-        "Fundamental Data": "fundamental_data",
-        "Portfolio Data": "portfolio_data",
-    }
-
-    dfs = {new_keys[key]: df for key, df in dfs.items()}
-
-    df = dfs["target_data"]
-    columns = df.columns
-    ghg_columns = [f"base_year_ghg_s{i}" for i in [1, 2, 3]]
-
+from temperature_scoring.tracing import span, traced
+
+
+SHEET_NAMES = {
+    "Target Data": "target_data",
+    "Fundamental Data": "fundamental_data",
+    "Portfolio Data": "portfolio_data",
+}
+GHG_COLUMNS = [f"base_year_ghg_s{i}" for i in [1, 2, 3]]
+
+
+def _to_frame(rows, header, start):
+    df = pd.DataFrame.from_records(rows, columns=header)
+    df.index = pd.RangeIndex(start, start + len(df))
+    # Empty cells are None in openpyxl and NaN in read_excel
+    return df.where(df.notna(), float("nan")).infer_objects()
+
+
+def iter_sheet(raw_file, sheet_name, chunk_size):
+    # Read a worksheet in chunks of rows without loading the whole workbook
+    wb = openpyxl.load_workbook(raw_file, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = [
+            f"Unnamed: {i}" if name is None else name
+            for i, name in enumerate(next(rows))
+        ]
+        chunk, empty_rows, start = [], [], 0
+        for row in rows:
+            # Like read_excel, drop empty rows at the end of the sheet only
+            if all(value is None for value in row):
+                empty_rows.append(row)
+                continue
+            chunk += empty_rows + [row]
+            empty_rows = []
+            if len(chunk) >= chunk_size:
+                yield _to_frame(chunk, header, start)
+                start += len(chunk)
+                chunk = []
+        if chunk or start == 0:
+            yield _to_frame(chunk, header, start)
+    finally:
+        wb.close()
+
+
+def filter_targets(df):
     validity_conditions = (
         df["scope"].notna()
         & df["reduction_ambition"].notna()
         & df["base_year"].notna()
         & df["end_year"].notna()
-        # & df[ghg_columns].notna().any(axis=1)
+        # & df[GHG_COLUMNS].notna().any(axis=1)
     )
-    print(
-        "These Excel rows are invalid:",
-        [i + 2 for i in validity_conditions[~validity_conditions].index],
+    invalid_rows = [i + 2 for i in validity_conditions[~validity_conditions].index]
+    df = df[validity_conditions].copy()
+
+    # Strip whitespaces in scope, which is float in chunks without valid rows
+    df["scope"] = df["scope"].astype(object).str.strip()
+    return df, invalid_rows
+
+
+def get_ghg_data(target_chunks):
+    # GHG emissions by company and base year over all valid targets
+    keys = ["company_id", "base_year"]
+    ghg_data = []
+    companies = set()
+    invalid_rows = []
+    for df in target_chunks:
+        df, chunk_invalid_rows = filter_targets(df)
+        invalid_rows += chunk_invalid_rows
+        companies.update(df["company_id"])
+        ghg_data.append(df[keys + GHG_COLUMNS].drop_duplicates())
+    df = pd.concat(ghg_data).drop_duplicates()
+
+    # Keys with more than one value of the same GHG emissions are conflicts
+    df_conflicts = (
+        df.melt(id_vars=keys, var_name="column", value_name="value")
+        .dropna()
+        .drop_duplicates()
     )
-    dfs["target_data"] = df[validity_conditions].copy()
+    df_conflicts = df_conflicts[
+        df_conflicts.duplicated(keys + ["column"], keep=False)
+    ].sort_values(keys + ["column"])
 
-    # Strip whitespaces in scope
-    dfs["target_data"]["scope"] = dfs["target_data"]["scope"].str.strip()
+    ghg_data = df.groupby(keys)[GHG_COLUMNS].first().dropna(how="all")
+    return ghg_data.reset_index(), df_conflicts, companies, invalid_rows
 
-    # Fill GHG emissions by scope where possible
-    df = dfs["target_data"]
-    for ghg_col in ghg_columns:
-        df_ghg = df[["company_id", "base_year", ghg_col]].dropna().drop_duplicates()
-        df = df.drop(columns=ghg_col).merge(
-            df_ghg, on=["company_id", "base_year"], how="left"
-        )
-    df = df.drop_duplicates()
-    dfs["target_data"] = df[columns]
-
-    # Use estimates in fundamental data
-    if use_estimates:
-        df = dfs["fundamental_data"]
-        df["ghg_s3"] = (
-            df["ghg_s3"].fillna(df["base_year_ghg_s3"]).fillna(df["ghg_s3_estimate"])
-        )
-        dfs["fundamental_data"] = df
 
-    # Assume equal investment of 1 USD
-    df = dfs["portfolio_data"]
-    df["investment_value"] = 1
-    dfs["portfolio_data"] = df
+def _row_hashes(df):
+    # Hash values rather than dtypes, which can differ between chunks
+    values = df.astype(object).where(df.notna(), None)
+    return pd.Series(
+        [hash(row) for row in values.itertuples(index=False)],
+        index=df.index,
+        dtype=object,
+    )
+
 
-    companies = dfs["target_data"]["company_id"].drop_duplicates()
-    for key in ["fundamental_data", "portfolio_data"]:
-        df = dfs[key]
-        dfs[key] = df[df["company_id"].isin(companies)]
+def clean_targets(target_chunks, ghg_data):
+    seen_rows = set()
+    for df in target_chunks:
+        columns = df.columns
+        df, _ = filter_targets(df)
 
-    with pd.ExcelWriter(clean_file) as writer:
-        for key, df in dfs.items():
-            df.to_excel(writer, sheet_name=key, index=False)
+        # Fill missing GHG emissions by company and base year in one merge
+        df = df.merge(
+            ghg_data,
+            on=["company_id", "base_year"],
+            how="left",
+            suffixes=("", "_fill"),
+        )
+        for ghg_col in GHG_COLUMNS:
+            df[ghg_col] = df[ghg_col].fillna(df[f"{ghg_col}_fill"])
+        df = df[columns].drop_duplicates()
+
+        # Drop rows that are duplicates of rows in previous chunks
+        row_hashes = _row_hashes(df)
+        df = df[~row_hashes.isin(seen_rows).values]
+        seen_rows.update(row_hashes)
+        yield df
+
+
+def clean_fundamental_data(fundamental_chunks, companies, use_estimates):
+    for df in fundamental_chunks:
+        # Use estimates in fundamental data
+        if use_estimates:
+            df["ghg_s3"] = (
+                df["ghg_s3"]
+                .fillna(df["base_year_ghg_s3"])
+                .fillna(df["ghg_s3_estimate"])
+            )
+        yield df[df["company_id"].isin(companies)]
+
+
+def clean_portfolio_data(portfolio_chunks, companies):
+    for df in portfolio_chunks:
+        # Assume equal investment of 1 USD
+        df["investment_value"] = 1
+        yield df[df["company_id"].isin(companies)]
+
+
+def write_sheets(clean_file, sheets, streaming=False):
+    with span(
+        "excel_write", "io", file=os.path.basename(clean_file), streaming=streaming
+    ):
+        _write_sheets(clean_file, sheets, streaming)
+
+
+def _write_sheets(clean_file, sheets, streaming):
+    if not streaming:
+        with pd.ExcelWriter(clean_file) as writer:
+            for key, chunks in sheets.items():
+                df = pd.concat(list(chunks))
+                df.to_excel(writer, sheet_name=key, index=False)
+        return
+
+    # Write-only workbooks keep only the current row in memory
+    wb = openpyxl.Workbook(write_only=True)
+    for key, chunks in sheets.items():
+        ws = wb.create_sheet(key)
+        for i, df in enumerate(chunks):
+            if i == 0:
+                ws.append(list(df.columns))
+            for row in df.itertuples(index=False):
+                ws.append([None if pd.isna(value) else value for value in row])
+    wb.save(clean_file)
+
+
+@traced()
+def clean_input_data(raw_file, clean_file, use_estimates=False, chunk_size=None):
+    # Without a chunk size, every sheet is a single chunk read at once
+    if chunk_size is None:
+        dfs = read_excel_cached(raw_file)
+
+        def chunks(sheet_name):
+            yield dfs[sheet_name].copy()
+
+    else:
+
+        def chunks(sheet_name):
+            return iter_sheet(raw_file, sheet_name, chunk_size)
+
+    sheet_names = {key: sheet_name for sheet_name, key in SHEET_NAMES.items()}
+
+    # The first pass collects GHG emissions and companies with valid targets
+    with span("collect_ghg_data") as record:
+        ghg_data, df_conflicts, companies, invalid_rows = get_ghg_data(
+            chunks(sheet_names["target_data"])
+        )
+        record.update(
+            companies=len(companies),
+            invalid_rows=len(invalid_rows),
+            conflicts=len(df_conflicts),
+        )
+    print("These Excel rows are invalid:", invalid_rows)
+    if len(df_conflicts) > 0:
+        print("These targets have conflicting base year GHG emissions:")
+        print(df_conflicts.to_string(index=False))
+
+    sheets = {
+        "target_data": clean_targets(chunks(sheet_names["target_data"]), ghg_data),
+        "fundamental_data": clean_fundamental_data(
+            chunks(sheet_names["fundamental_data"]), companies, use_estimates
+        ),
+        "portfolio_data": clean_portfolio_data(
+            chunks(sheet_names["portfolio_data"]), companies
+        ),
+    }
+    write_sheets(clean_file, sheets, streaming=chunk_size is not None)
 
 
 if __name__ == "__main__":
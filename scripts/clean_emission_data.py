@@ -1,9 +1,23 @@
 import pandas as pd
-import numpy as np
+from openpyxl.utils import column_index_from_string
 
+from temperature_scoring.cache import read_excel_cached
 from temperature_scoring.config import data_dir
+from temperature_scoring.parsing import parse_numbers
+from temperature_scoring.tracing import traced
 
 
+# Column ranges of the years in the ESG data sheet, below its header rows
+YEAR_COLUMNS = {
+    2021: "C:M",
+    2020: "W:AE",
+    2019: "AI:AP",
+    2018: "AT:BA",
+}
+SKIPROWS = 3
+
+
+@traced()
 def clean_company_data(raw_file, clean_file):
     df = pd.read_excel(raw_file)
     df = df.rename(
@@ -19,10 +33,33 @@ def clean_company_data(raw_file, clean_file):
     df.to_csv(clean_file, index=False)
 
 
+def _column_positions(columns):
+    # Positions of Excel column ranges such as "C:M" or "A,C:E"
+    positions = []
+    for part in columns.split(","):
+        first, _, last = part.strip().partition(":")
+        positions += range(
+            column_index_from_string(first) - 1,
+            column_index_from_string(last or first),
+        )
+    return positions
+
+
+@traced()
 def clean_emission_data(raw_file, clean_file, year_columns, skiprows):
+    # Load the workbook once, the cached sheet has its first row as header
+    df_sheet = next(iter(read_excel_cached(raw_file).values()))
+    if skiprows > 0:
+        header_row = df_sheet.iloc[skiprows - 1]
+        df_sheet = df_sheet.iloc[skiprows:]
+    else:
+        header_row = pd.Series(df_sheet.columns, index=df_sheet.columns)
+
     dfs = []
     for year, columns in year_columns.items():
-        df = pd.read_excel(raw_file, usecols=columns, skiprows=skiprows)
+        positions = _column_positions(columns)
+        df = df_sheet.iloc[:, positions].infer_objects()
+        df.columns = [str(name) for name in header_row.iloc[positions]]
         df = df.rename(columns=lambda x: x.split(".")[0])
         df = df.rename(columns={"scope_2m": "scope_2", "scope_1n2m": "scope_1n2"})
         df = df[~df.isna().all(axis=1)]
@@ -30,18 +67,8 @@ def clean_emission_data(raw_file, clean_file, year_columns, skiprows):
 
     df = pd.concat(dfs)
     df = df.drop(columns=["scope_2_loc", "scope_2loc"])
-    for col in df.columns:
-        if not col.startswith("scope"):
-            continue
-        df[col] = df[col].replace("x", np.nan)
-        df[col] = (
-            df[col]
-            .astype(str)
-            .str.replace("\xa0", " ")
-            .str.replace(" ", "")
-            .str.replace(",", ".")
-            .astype(float)
-        ).round(2)
+    scope_columns = [col for col in df.columns if col.startswith("scope")]
+    df[scope_columns] = parse_numbers(df[scope_columns].to_numpy(object)).round(2)
     df["scope_1+2"] = df[["scope_1", "scope_2"]].sum(axis=1).round(2)
     df = df.drop(columns="scope_1n2")
     df = df[df["scope_1+2"] > 0]
@@ -87,11 +114,4 @@ if __name__ == "__main__":
 
     raw_file = data_dir("raw", "Dane ESG GPW.xlsx")
     clean_file = data_dir("clean", "emission_data.csv")
-
-    year_columns = {
-        2021: "C:M",
-        2020: "W:AE",
-        2019: "AI:AP",
-        2018: "AT:BA",
-    }
-    clean_emission_data(raw_file, clean_file, year_columns, skiprows=3)
+    clean_emission_data(raw_file, clean_file, YEAR_COLUMNS, SKIPROWS)
@@ -1,12 +1,26 @@
 import os
+import numpy as np
 import pandas as pd
-from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-import plotly.express as px
-import plotly.graph_objs as go
 import plotly.io as pio
 
 from temperature_scoring.config import data_dir, plots_dir
+from temperature_scoring.outputs import read_output
+from temperature_scoring.schema import pivot_scores, score_labels
+from temperature_scoring.tracing import span, traced
+
+
+# Formats written by kaleido, except for HTML written by plotly
+EXPORT_FORMATS = ["png", "jpeg", "webp", "svg", "pdf", "html"]
+
+# Larger universes are plotted in pages of at most this many companies
+MAX_PAGE_SIZE = 100
+
+# Bands of the score distribution, the default score of 3.2 is in the last one
+SCORE_BINS = [-np.inf, 1.5, 2.0, 2.7, 3.2, np.inf]
+SCORE_BANDS = ["<1.5", "1.5-2", "2-2.7", "2.7-3.2", ">=3.2"]
 
 
 def make_instrat_template():
@@ -36,7 +50,9 @@ def make_instrat_template():
     return template
 
 
-def plot_heatmap(df):
+def plot_heatmap(df, title=None):
+    # Plotly is imported only for images
+    import plotly.express as px
 
     template = make_instrat_template()
     width = (len(df.columns) + 8) * 50
@@ -66,71 +82,254 @@ def plot_heatmap(df):
             }
         }
     )
+    if title is not None:
+        fig.update_layout(title=title, margin={"t": 150})
 
     return fig
 
 
-def plot_temperature_scores(
-    suffix="", use_revised_scores=False, aggregation_methods=["Average"]
+def plot_summary(df_summary):
+    import plotly.express as px
+
+    fig = px.imshow(
+        df_summary,
+        text_auto=True,
+        labels={"color": "Companies", "y": "Temperature Score"},
+        color_continuous_scale="Blues",
+        template=make_instrat_template(),
+        width=(len(df_summary.columns) + 8) * 50,
+        height=(len(df_summary.index) + 4) * 50,
+    )
+    fig.update_xaxes(side="top")
+    return fig
+
+
+def get_plot_data(
+    suffix="", use_revised_scores=False, aggregation_methods=["Average"], page_by=None
 ):
-    output_file = data_dir("clean", f"output_data{suffix}.xlsx")
-    plot_file = plots_dir(f"temperature_scores{suffix}.png")
-    plot_data_file = plots_dir(f"temperature_scores{suffix}.csv")
-
-    df = pd.read_excel(output_file)
-
-    df["time_frame"] = df["time_frame"].str.capitalize()
-    df["scope"] = df["scope"].replace({"S1S2": "S1+S2", "S1S2S3": "S1+S2+S3"})
-    df["Scope and Time Frame"] = df["scope"] + " " + df["time_frame"]
-    df = df.rename(
-        columns={
-            "company_name": "Company",
-            "temperature_score"
-            if not use_revised_scores
-            else "revised_temperature_score": "Temperature Score",
-        }
+    # Companies followed by the portfolios, the number of companies and their
+    # page_by column are kept in the attributes
+    # Company scores in the fastest format written by the last run
+    df = read_output(f"output_data{suffix}")
+
+    groups = None
+    if page_by is not None:
+        groups = df.drop_duplicates("company_name").set_index("company_name")[page_by]
+
+    score_column = (
+        "revised_temperature_score" if use_revised_scores else "temperature_score"
     )
-    df = df.pivot(
-        index="Company", columns="Scope and Time Frame", values="Temperature Score"
+    df = pivot_scores(
+        df["company_name"],
+        df["scope"],
+        df["time_frame"],
+        df[score_column],
+        dtype=np.float32,
     )
 
     # Sort companies alphabetically
-    df = df.sort_index(key=lambda x: x.str.lower())
-
-    # Sort columns first by scope, then by time frame
-    scopes = ["S1+S2", "S3", "S1+S2+S3"]
-    time_frames = ["Short", "Mid", "Long"]
-    columns = [" ".join(p) for p in product(scopes, time_frames)]
-    df = df[[col for col in columns if col in df.columns]]
+    df = df.sort_index().sort_index(key=lambda x: x.str.lower())
+    n_companies = len(df)
 
     for method in aggregation_methods:
         df_agg = pd.read_csv(
             data_dir("clean", f"portfolio_scores{suffix}_{method}.csv")
         )
-        df_agg["scope"] = df_agg["scope"].replace(
-            {"S1S2": "S1+S2", "S1S2S3": "S1+S2+S3"}
-        )
         df_agg = df_agg.melt(
             id_vars="scope", var_name="time_frame", value_name="Temperature Score"
         )
-        df_agg["time_frame"] = df_agg["time_frame"].str.capitalize()
-        df_agg["Scope and Time Frame"] = df_agg["scope"] + " " + df_agg["time_frame"]
-        df_agg["Company"] = method
-        df_agg = df_agg.pivot(
-            index="Company", columns="Scope and Time Frame", values="Temperature Score"
+        df_agg = pivot_scores(
+            pd.Series(method, index=df_agg.index),
+            df_agg["scope"],
+            df_agg["time_frame"],
+            df_agg["Temperature Score"],
+            dtype=np.float32,
         )
         df = pd.concat([df, df_agg])
 
-    df.to_csv(plot_data_file)
-    fig = plot_heatmap(df)
+    # Columns first by scope, then by time frame
+    df.index.name = "Company"
+    df.columns = pd.Index(score_labels(df.columns), name="Scope and Time Frame")
+    df.attrs["n_companies"] = n_companies
+    df.attrs["groups"] = groups
+    return df
+
+
+def get_pages(df, page_size, groups=None):
+    # Titles and companies of pages of at most page_size companies, by group
+    # if given
+    companies = df.index[: df.attrs["n_companies"]]
+    if groups is None:
+        groups = pd.Series("", index=companies)
+    groups = groups.reindex(companies).fillna("Other").astype(str)
+
+    pages = []
+    for group, group_companies in groups.groupby(groups.values, sort=True):
+        n_pages = -(-len(group_companies) // page_size)
+        for i in range(n_pages):
+            title = group
+            if n_pages > 1:
+                title = f"{group} {i + 1}/{n_pages}".strip()
+            page = group_companies.index[i * page_size : (i + 1) * page_size]
+            pages.append((title or None, page))
+    return pages
+
+
+def get_score_summary(df):
+    # Numbers of companies per score band, scope and time frame
+    df_companies = df.iloc[: df.attrs["n_companies"]]
+    df_summary = df_companies.apply(
+        lambda scores: pd.cut(
+            scores, SCORE_BINS, labels=SCORE_BANDS, right=False
+        ).value_counts(sort=False)
+    )
+    df_summary.loc["No score"] = df_companies.isna().sum()
+    df_summary.index.name = "Temperature Score"
+    return df_summary
+
+
+def _export_figure(fig, file_stem, formats, scale):
+    files = []
+    for file_format in formats:
+        file = Path(f"{file_stem}.{file_format}")
+        if file_format == "html":
+            # Plotly.js is loaded from its CDN, not embedded in every file
+            with span("html_export", "io", file=file.name):
+                pio.write_html(fig, file, include_plotlyjs="cdn")
+        else:
+            with span("kaleido_export", "io", file=file.name):
+                pio.write_image(fig, file, format=file_format, scale=scale)
+        files.append(file)
+    return files
+
+
+def _export_chunk(chunk, formats, scale):
+    return [
+        file
+        for file_stem, fig in chunk
+        for file in _export_figure(fig, file_stem, formats, scale)
+    ]
+
+
+def get_export_formats(formats):
+    # "none" stands for no images, the plot data are written anyway
+    formats = [file_format for file_format in formats if file_format != "none"]
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown plot formats: {', '.join(sorted(unknown))}")
+    return formats
+
+
+def export_figures(figures, formats=["png"], scale=2, workers=None):
+    # Figures keyed by their file paths without suffix. Kaleido keeps its
+    # renderer running in a process, so the figures are exported by this
+    # process or split into one chunk per worker, each starting it once.
+    formats = get_export_formats(formats)
+    items = [(str(file_stem), fig.to_dict()) for file_stem, fig in figures.items()]
+    if not workers or workers < 2 or len(items) < 2:
+        return _export_chunk(items, formats, scale)
+
+    chunks = [items[i::workers] for i in range(min(workers, len(items)))]
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        results = executor.map(
+            _export_chunk, chunks, [formats] * len(chunks), [scale] * len(chunks)
+        )
+        return [file for files in results for file in files]
+
 
-    fig.write_image(plot_file, scale=2)
+@traced()
+def plot_all_temperature_scores(
+    variants,
+    formats=["png"],
+    scale=2,
+    workers=None,
+    page_size=None,
+    page_by=None,
+    summary=False,
+):
+    # Variants are keyword arguments of get_plot_data. All figures are built
+    # first and exported in one batch, formats may leave out raster images or
+    # be empty or "none" to write the plot data only. Companies are plotted in
+    # pages if a page size or a page_by column is given or there are too many
+    # of them, so that images grow with the page size only. The summary shows
+    # the distribution of company scores.
+    formats = get_export_formats(formats)
+    files = []
+    figures = {}
+    for variant in variants:
+        suffix = variant.get("suffix", "")
+        file_stem = plots_dir(f"temperature_scores{suffix}")
+        df = get_plot_data(**variant, page_by=page_by)
+        files.append(Path(f"{file_stem}.csv"))
+        df.to_csv(files[-1])
+
+        if summary:
+            df_summary = get_score_summary(df)
+            files.append(Path(f"{file_stem}_summary.csv"))
+            df_summary.to_csv(files[-1])
+            if formats:
+                figures[f"{file_stem}_summary"] = plot_summary(df_summary)
+
+        # Pages of a previous run may be more
+        for old_file in plots_dir().glob(f"{file_stem.name}_page*"):
+            old_file.unlink()
+
+        n_companies = df.attrs["n_companies"]
+        if page_size is None and page_by is None and n_companies <= MAX_PAGE_SIZE:
+            if formats:
+                figures[file_stem] = plot_heatmap(df)
+            continue
+
+        pages = get_pages(df, page_size or MAX_PAGE_SIZE, df.attrs["groups"])
+        files.append(Path(f"{file_stem}_pages.csv"))
+        df_pages = pd.concat(
+            [
+                pd.DataFrame({"page": i, "title": title}, index=companies)
+                for i, (title, companies) in enumerate(pages, 1)
+            ]
+        )
+        df_pages.to_csv(files[-1])
+
+        # Every page ends with the portfolios
+        df_companies, df_portfolios = df.iloc[:n_companies], df.iloc[n_companies:]
+        if formats:
+            for i, (title, companies) in enumerate(pages, 1):
+                df_page = pd.concat([df_companies.loc[companies], df_portfolios])
+                figures[f"{file_stem}_page{i:03d}"] = plot_heatmap(df_page, title)
+    return files + export_figures(figures, formats, scale, workers)
+
+
+@traced()
+def plot_temperature_scores(
+    suffix="",
+    use_revised_scores=False,
+    aggregation_methods=["Average"],
+    formats=["png"],
+):
+    variant = {
+        "suffix": suffix,
+        "use_revised_scores": use_revised_scores,
+        "aggregation_methods": aggregation_methods,
+    }
+    return plot_all_temperature_scores([variant], formats)
 
 
 if __name__ == "__main__":
 
     os.makedirs(plots_dir(), exist_ok=True)
 
-    # plot_temperature_scores("_example")
-    plot_temperature_scores(use_revised_scores=True, aggregation_methods=["Average"])
-    plot_temperature_scores("_with_estimates", aggregation_methods=["Average", "Emissions", "Revenue", "Market Cap"])
+    plot_all_temperature_scores(
+        [
+            # {"suffix": "_example"},
+            {"use_revised_scores": True, "aggregation_methods": ["Average"]},
+            {
+                "suffix": "_with_estimates",
+                "aggregation_methods": [
+                    "Average",
+                    "Emissions",
+                    "Revenue",
+                    "Market Cap",
+                ],
+            },
+        ]
+    )
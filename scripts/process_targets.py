@@ -1,60 +1,36 @@
+from pathlib import Path
+
 import pandas as pd
 
+from temperature_scoring.cache import read_excel_cached
 from temperature_scoring.config import data_dir
+from temperature_scoring.rules import apply_rules, load_rules
+from temperature_scoring.tracing import span, traced
+from temperature_scoring.trajectories import (
+    calculate_carbon_budgets,
+    calculate_trajectories,
+)
+
 
+TARGET_RULES_FILE = Path(__file__).with_name("target_rules.json")
 
-def process_targets(suffix=""):
+
+@traced()
+def process_targets(suffix="", rules_file=TARGET_RULES_FILE):
 
     input_file = data_dir("clean", f"input_data{suffix}.xlsx")
-    df = pd.read_excel(input_file, sheet_name="target_data")
-
-    # Allow Grupa Kęty's intensity target
-    df = df[(df["target_type"] == "Absolute") | (df["company_name"] == "Grupa Kęty")]
-
-    # Since Enea has small S2 emissions, assume S1 target is S1+S2 target
-    df.loc[(df["company_name"] == "Enea") & (df["scope"] == "S1"), "scope"] = "S1+S2"
-
-    # Aggregate Grupa Azoty S1+S2 target
-    df_azoty = df[df["company_name"] == "Grupa Azoty"].copy()
-
-    for scope in ["S1", "S2"]:
-        is_scope = df_azoty["scope"] == scope
-        df_azoty.loc[is_scope, "reduction_ambition"] *= df_azoty.loc[
-            is_scope, f"base_year_ghg_{scope.lower()}"
-        ] / df_azoty.loc[is_scope, ["base_year_ghg_s1", "base_year_ghg_s2"]].sum(axis=1)
-    df_azoty = (
-        df_azoty.groupby(
-            [
-                "company_name",
-                "base_year",
-                "end_year",
-                "base_year_ghg_s1",
-                "base_year_ghg_s2",
-                "coverage_s1",
-                "coverage_s2",
-            ]
-        )
-        .agg({"reduction_ambition": "sum"})
-        .reset_index()
-    )
-    df_azoty["scope"] = "S1+S2"
-    df = pd.concat([df, df_azoty])
+    df = read_excel_cached(input_file, "target_data")
+
+    # Company-specific adjustments and coverage scaling
+    with span("apply_rules", rows=len(df)) as record:
+        df, df_report = apply_rules(df, load_rules(rules_file))
+        record["hits"] = int(df_report["hits"].sum())
+    print(df_report.to_string(index=False))
 
     df = df[df["scope"].isin(["S1+S2", "S1+S2+S3"])]
 
     df["base_year_ghg_s1s2"] = df[["base_year_ghg_s1", "base_year_ghg_s2"]].sum(axis=1)
 
-    reduced_coverage = (df["scope"] == "S1+S2") & (
-        df["coverage_s1"] * df["coverage_s2"] < 1
-    )
-    df.loc[reduced_coverage, "reduction_ambition"] *= (
-        df.loc[reduced_coverage, "coverage_s1"]
-        * df.loc[reduced_coverage, "base_year_ghg_s1"]
-        + df.loc[reduced_coverage, "coverage_s2"]
-        * df.loc[reduced_coverage, "base_year_ghg_s2"]
-    ) / df.loc[reduced_coverage, "base_year_ghg_s1s2"]
-
-    print(df[reduced_coverage].to_csv("df.csv"))
     df = df[df["reduction_ambition"] > 0]
 
     df = df[
@@ -95,6 +71,7 @@ def process_targets(suffix=""):
         df_res.to_csv(data_dir("clean", f"{col}_targets.csv"), index=False)
 
 
+@traced()
 def append_historical_data_to_emission_targets():
 
     df_targets = pd.read_csv(data_dir("clean", "emissions_targets.csv"))
@@ -119,43 +96,29 @@ def append_historical_data_to_emission_targets():
     df = df[df["emissions"].notna()]
     df["emissions"] = df["emissions"].round(0)
 
-    # Check if target and historical data is consistent
-    df_emissions = df.groupby(["year", "company"])["emissions"].mean().reset_index()
-
-    df = df.merge(
-        df_emissions, how="left", on=["year", "company"], suffixes=("", "_mean")
-    )
-
-    mismatch = df[df["emissions"] != df["emissions_mean"]].drop(
-        columns="emissions_mean"
-    )
-    if len(mismatch) > 0:
-        mismatch.to_csv("mismatch.csv", index=False)
+    # Target and historical data of the same year should be consistent
+    emissions_mean = df.groupby(["year", "company"])["emissions"].transform("mean")
+    df_mismatch = df[df["emissions"] != emissions_mean]
+    if len(df_mismatch) > 0:
         print("There are some inconsistencies in S1+S2 emission data.")
-        print(mismatch)
+        print(df_mismatch)
 
-    df = df.groupby(["year", "company"])["emissions"].mean().round(0).reset_index()
+    df = df.assign(emissions=emissions_mean.round(0))
+    df = df.drop_duplicates(["year", "company"]).drop(columns="type")
 
     df_pivot = df.pivot(
         index="year", columns="company", values="emissions"
     ).reset_index()
     df_pivot.to_csv(data_dir("clean", "emission_targets_amended.csv"), index=False)
 
-    # Split into historical part and projection
+    # Split into historical part and projection, which starts at the last
+    # historical data point of each company
     df["projection"] = df["year"] > 2022
+    df_last_historical = df[~df["projection"]].groupby("company").tail(1)
+    df_last_historical = df_last_historical.assign(projection=True)
+    df = pd.concat([df, df_last_historical])
 
-    last_historical_rows = []
-    for company, subdf in df.groupby("company"):
-        last_row = subdf[~subdf["projection"]].iloc[-1:, :]
-        last_historical_rows.append(last_row)
-
-    df_last_historical = pd.concat(last_historical_rows)
-    df_last_historical["projection"] = True
-
-    df = pd.concat([df, df_last_historical]).sort_values("year")
-
-    df["column"] = df["company"]
-    df.loc[df["projection"], "column"] += " (proj.)"
+    df["column"] = df["company"].where(~df["projection"], df["company"] + " (proj.)")
 
     df_pivot = df.pivot(
         index="year", columns="column", values="emissions"
@@ -165,12 +128,48 @@ def append_historical_data_to_emission_targets():
         data_dir("clean", "emission_targets_amended_and_split.csv"), index=False
     )
 
-    for col in df_pivot.set_index("year").columns:
-        if col.endswith("(proj.)"):
-            print(col)
+    return df_mismatch.reset_index(drop=True)
+
+
+def get_historical_emissions(companies):
+    df = pd.read_csv(data_dir("clean", "emission_data.csv"))
+    df = df[(df["scope"] == "S1+S2") & df["company_name"].isin(companies)]
+    years = [column for column in df.columns if column.isdigit()]
+    df = df.set_index("company_name")[years].transpose()
+    df.index = df.index.astype(int)
+    return df
+
+
+@traced()
+def calculate_emission_trajectories(
+    method="linear", start_year=2022, end_year=2050, net_zero_year=2050
+):
+
+    df_targets = pd.read_csv(data_dir("clean", "emissions_targets.csv"))
+    df_targets = df_targets.set_index("year")
+    df_history = get_historical_emissions(df_targets.columns)
+
+    # Annual pathways of all companies, anchored to their last historical year
+    df_trajectories = calculate_trajectories(
+        df_history, df_targets, method=method, end_year=end_year
+    )
+    df_trajectories.reset_index().to_csv(
+        data_dir("clean", "emission_trajectories.csv"), index=False
+    )
+
+    # Cumulative emissions against a linear path to net zero
+    df_budgets = calculate_carbon_budgets(
+        df_trajectories, start_year, end_year, net_zero_year=net_zero_year
+    )
+    df_budgets.reset_index().to_csv(
+        data_dir("clean", "carbon_budgets.csv"), index=False
+    )
+
+    return df_budgets
 
 
 if __name__ == "__main__":
 
     process_targets()
     append_historical_data_to_emission_targets()
+    calculate_emission_trajectories()
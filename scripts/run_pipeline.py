@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import os
+
+from temperature_scoring.config import data_dir, plots_dir
+from temperature_scoring.outputs import output_files
+from temperature_scoring.pipeline import make_stage, run_pipeline
+from temperature_scoring.tracing import trace_run
+
+from clean_data import clean_input_data
+from clean_emission_data import (
+    SKIPROWS,
+    YEAR_COLUMNS,
+    clean_company_data,
+    clean_emission_data,
+)
+from process_targets import (
+    TARGET_RULES_FILE,
+    process_targets,
+    append_historical_data_to_emission_targets,
+    calculate_emission_trajectories,
+)
+from calculate_scores import calculate_score
+from plot_scores import plot_temperature_scores
+
+
+RAW_INPUT_FILE = data_dir("raw", "Dane - spółki z ogłoszonymi celami .xlsx")
+
+# Score variants as in the scripts' main blocks
+SCORE_VARIANTS = {
+    "": {
+        "revised_combined_score": True,
+        "aggregation_methods": ["Average"],
+        "output_formats": ["arrow", "xlsx"],
+    },
+    "_with_estimates": {
+        "revised_combined_score": False,
+        "aggregation_methods": ["Average", "Emissions", "Revenue", "Market Cap"],
+        "output_formats": ["arrow", "xlsx"],
+    },
+}
+
+
+def plot_scores(suffix, use_revised_scores, aggregation_methods):
+    os.makedirs(plots_dir(), exist_ok=True)
+    plot_temperature_scores(suffix, use_revised_scores, aggregation_methods)
+
+
+def get_stages():
+    stages = [
+        make_stage(
+            "clean_company_data",
+            clean_company_data,
+            inputs=[data_dir("raw", "company_data.xlsx")],
+            outputs=[data_dir("clean", "company_data.csv")],
+            raw_file=data_dir("raw", "company_data.xlsx"),
+            clean_file=data_dir("clean", "company_data.csv"),
+        ),
+        make_stage(
+            "clean_emission_data",
+            clean_emission_data,
+            inputs=[
+                data_dir("raw", "Dane ESG GPW.xlsx"),
+                data_dir("clean", "company_data.csv"),
+            ],
+            outputs=[data_dir("clean", "emission_data.csv")],
+            raw_file=data_dir("raw", "Dane ESG GPW.xlsx"),
+            clean_file=data_dir("clean", "emission_data.csv"),
+            year_columns=YEAR_COLUMNS,
+            skiprows=SKIPROWS,
+        ),
+        make_stage(
+            "process_targets",
+            process_targets,
+            inputs=[data_dir("clean", "input_data.xlsx"), TARGET_RULES_FILE],
+            outputs=[
+                data_dir("clean", "emissions_targets.csv"),
+                data_dir("clean", "relative_emissions_targets.csv"),
+            ],
+        ),
+        make_stage(
+            "append_historical_data",
+            append_historical_data_to_emission_targets,
+            inputs=[
+                data_dir("clean", "emissions_targets.csv"),
+                data_dir("clean", "emission_data.csv"),
+            ],
+            outputs=[
+                data_dir("clean", "emission_targets_amended.csv"),
+                data_dir("clean", "emission_targets_amended_and_split.csv"),
+            ],
+        ),
+        make_stage(
+            "emission_trajectories",
+            calculate_emission_trajectories,
+            inputs=[
+                data_dir("clean", "emissions_targets.csv"),
+                data_dir("clean", "emission_data.csv"),
+            ],
+            outputs=[
+                data_dir("clean", "emission_trajectories.csv"),
+                data_dir("clean", "carbon_budgets.csv"),
+            ],
+        ),
+    ]
+
+    for suffix, params in SCORE_VARIANTS.items():
+        input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+        company_files = output_files(f"output_data{suffix}", params["output_formats"])
+        score_files = [
+            data_dir("clean", f"portfolio_scores{suffix}_{method}.csv")
+            for method in params["aggregation_methods"]
+        ]
+        stages += [
+            make_stage(
+                f"clean_input_data{suffix}",
+                clean_input_data,
+                inputs=[RAW_INPUT_FILE],
+                outputs=[input_file],
+                raw_file=RAW_INPUT_FILE,
+                clean_file=input_file,
+                use_estimates=suffix == "_with_estimates",
+            ),
+            make_stage(
+                f"calculate_score{suffix}",
+                calculate_score,
+                inputs=[input_file],
+                outputs=company_files + score_files,
+                suffix=suffix,
+                **params,
+            ),
+            make_stage(
+                f"plot_scores{suffix}",
+                plot_scores,
+                inputs=company_files + score_files,
+                outputs=[
+                    plots_dir(f"temperature_scores{suffix}.png"),
+                    plots_dir(f"temperature_scores{suffix}.csv"),
+                ],
+                suffix=suffix,
+                use_revised_scores=params["revised_combined_score"],
+                aggregation_methods=params["aggregation_methods"],
+            ),
+        ]
+    return stages
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Rebuild outdated outputs")
+    parser.add_argument("stages", nargs="*", help="stages to run with their inputs")
+    parser.add_argument("--force", action="store_true", help="run all stages")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only list the outdated stages"
+    )
+    parser.add_argument("--trace", help="Chrome trace file of the run")
+    args = parser.parse_args()
+
+    with trace_run(args.trace) if args.trace else contextlib.nullcontext():
+        results = run_pipeline(
+            get_stages(), args.stages or None, force=args.force, dry_run=args.dry_run
+        )
+    for name, status, elapsed in results:
+        print(f"{name:<32} {status:<22} {elapsed:.2f}s")
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from temperature_scoring.cache import read_excel_cached
+from temperature_scoring.config import data_dir, plots_dir
+from temperature_scoring.engine import load_regression_model, load_sbti_target_status
+from temperature_scoring.outputs import DEFAULT_FORMATS
+
+from clean_data import clean_input_data
+from calculate_scores import calculate_score
+from plot_scores import get_export_formats, plot_all_temperature_scores
+
+
+SCENARIO_DEFAULTS = {
+    "suffix": "",
+    "output_suffix": None,
+    "raw_file": None,
+    "use_estimates": False,
+    "revised_combined_score": False,
+    "aggregation_methods": ["Average"],
+    "engine": "sbti",
+    "combined_fallback": "max",
+    "output_formats": DEFAULT_FORMATS,
+    "plot": False,
+}
+
+
+def load_manifest(manifest_file):
+    with open(manifest_file, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    scenarios = []
+    for i, scenario in enumerate(manifest["scenarios"]):
+        unknown = set(scenario) - set(SCENARIO_DEFAULTS) - {"name"}
+        if unknown:
+            raise ValueError(f"Unknown scenario fields: {', '.join(sorted(unknown))}")
+        scenario = {**SCENARIO_DEFAULTS, "name": f"scenario_{i}", **scenario}
+        if scenario["output_suffix"] is None:
+            scenario["output_suffix"] = scenario["suffix"]
+        scenarios.append(scenario)
+
+    names = [scenario["name"] for scenario in scenarios]
+    output_suffixes = [scenario["output_suffix"] for scenario in scenarios]
+    if len(set(names)) < len(names):
+        raise ValueError("Scenario names must be unique")
+    if len(set(output_suffixes)) < len(output_suffixes):
+        raise ValueError("Scenarios must not write to the same output files")
+    return scenarios
+
+
+def get_cleaning_jobs(scenarios):
+    # Scenarios with the same suffix share the clean input data
+    jobs = {}
+    for scenario in scenarios:
+        if scenario["raw_file"] is None:
+            continue
+        job = {
+            "name": f"clean{scenario['suffix']}",
+            "raw_file": scenario["raw_file"],
+            "suffix": scenario["suffix"],
+            "use_estimates": scenario["use_estimates"],
+        }
+        if jobs.setdefault(scenario["suffix"], job) != job:
+            raise ValueError(
+                f"Scenarios with suffix '{scenario['suffix']}' are cleaned differently"
+            )
+    return list(jobs.values())
+
+
+def run_cleaning(job):
+    start = time.perf_counter()
+    clean_file = data_dir("clean", f"input_data{job['suffix']}.xlsx")
+    clean_input_data(
+        data_dir("raw", job["raw_file"]), clean_file, use_estimates=job["use_estimates"]
+    )
+    return {"clean": time.perf_counter() - start, "outputs": [str(clean_file)]}
+
+
+def run_scenario(scenario):
+    timings = {}
+    start = time.perf_counter()
+    output_files = calculate_score(
+        scenario["suffix"],
+        revised_combined_score=scenario["revised_combined_score"],
+        aggregation_methods=scenario["aggregation_methods"],
+        engine=scenario["engine"],
+        combined_fallback=scenario["combined_fallback"],
+        output_suffix=scenario["output_suffix"],
+        output_formats=scenario["output_formats"],
+    )
+    timings["score"] = time.perf_counter() - start
+    return {**timings, "outputs": [str(file) for file in output_files]}
+
+
+def run_plots(scenarios, results, formats, workers):
+    # Plots of all scored scenarios are exported in one batch, so that kaleido
+    # starts once per worker instead of once per scenario
+    scenarios = [
+        scenario
+        for scenario in scenarios
+        if scenario["plot"] and results[scenario["name"]]["status"] == "ok"
+    ]
+    if not scenarios:
+        return 0.0
+
+    start = time.perf_counter()
+    try:
+        files = plot_all_temperature_scores(
+            [
+                {
+                    "suffix": scenario["output_suffix"],
+                    "use_revised_scores": scenario["revised_combined_score"],
+                    "aggregation_methods": scenario["aggregation_methods"],
+                }
+                for scenario in scenarios
+            ],
+            formats=formats,
+            workers=workers,
+        )
+    except Exception:
+        error = traceback.format_exc()
+        for scenario in scenarios:
+            results[scenario["name"]].update(status="failed", error=error)
+        return time.perf_counter() - start
+
+    for scenario in scenarios:
+        prefix = f"temperature_scores{scenario['output_suffix']}."
+        results[scenario["name"]]["outputs"] += [
+            str(file) for file in files if Path(file).name.startswith(prefix)
+        ]
+    return time.perf_counter() - start
+
+
+def warm_cache(scenarios):
+    # Convert the inputs once in the parent process, the workers then read the
+    # same memory-mapped Arrow files instead of parsing the workbooks again.
+    # Inputs that cannot be read fail the scenarios of their suffix only.
+    start = time.perf_counter()
+    errors = {}
+    for suffix in sorted({scenario["suffix"] for scenario in scenarios}):
+        try:
+            read_excel_cached(data_dir("clean", f"input_data{suffix}.xlsx"))
+        except Exception:
+            errors[suffix] = traceback.format_exc()
+    load_regression_model()
+    load_sbti_target_status()
+    return time.perf_counter() - start, errors
+
+
+def run_pool(function, jobs, workers):
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(function, job): job["name"] for job in jobs}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = {"status": "ok", **future.result()}
+            except Exception:
+                results[name] = {"status": "failed", "error": traceback.format_exc()}
+            print(f"{name}: {results[name]['status']}")
+    return results
+
+
+def run_scenarios(manifest_file, workers=None, clean=False, plot_formats=["png"]):
+    # Formats are checked before any scenario runs, "none" writes plot data only
+    plot_formats = get_export_formats(plot_formats)
+    scenarios = load_manifest(manifest_file)
+    os.makedirs(plots_dir(), exist_ok=True)
+
+    results = {}
+    skipped = {}
+    if clean:
+        jobs = get_cleaning_jobs(scenarios)
+        results.update(run_pool(run_cleaning, jobs, workers))
+        # Scenarios are not scored on the input data of a failed cleaning job
+        for job in jobs:
+            if results[job["name"]]["status"] != "ok":
+                skipped[job["suffix"]] = f"Cleaning job {job['name']} failed"
+
+    warm_cache_time, errors = warm_cache(
+        [scenario for scenario in scenarios if scenario["suffix"] not in skipped]
+    )
+    failed = {}
+    for scenario in scenarios:
+        if scenario["suffix"] in skipped:
+            failed[scenario["name"]] = {
+                "status": "skipped",
+                "error": skipped[scenario["suffix"]],
+            }
+        elif scenario["suffix"] in errors:
+            failed[scenario["name"]] = {
+                "status": "failed",
+                "error": errors[scenario["suffix"]],
+            }
+    for name, result in failed.items():
+        print(f"{name}: {result['status']}")
+    results.update(failed)
+
+    scenarios_to_run = [s for s in scenarios if s["name"] not in failed]
+    results.update(run_pool(run_scenario, scenarios_to_run, workers))
+    plot_time = run_plots(scenarios, results, plot_formats, workers)
+
+    df = pd.DataFrame.from_dict(results, orient="index")
+    df.index.name = "name"
+    df.attrs["warm_cache"] = warm_cache_time
+    df.attrs["plot"] = plot_time
+    return df
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run scenarios in parallel")
+    parser.add_argument(
+        "manifest",
+        nargs="?",
+        default=Path(__file__).with_name("scenarios.json"),
+        help="JSON file with a list of scenarios",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--clean", action="store_true", help="clean the raw data first")
+    parser.add_argument("--report", default=None, help="CSV file for the timings")
+    parser.add_argument(
+        "--plot-formats",
+        nargs="*",
+        default=["png"],
+        help="image formats, e.g. png svg html, none for the plot data only",
+    )
+    args = parser.parse_args()
+
+    df = run_scenarios(
+        args.manifest,
+        workers=args.workers,
+        clean=args.clean,
+        plot_formats=args.plot_formats,
+    )
+    print(f"warm cache: {df.attrs['warm_cache']:.2f}s")
+    print(f"plots: {df.attrs['plot']:.2f}s")
+    print(df.drop(columns=["outputs", "error"], errors="ignore").to_string())
+    for name, error in df.get("error", pd.Series(dtype=str)).dropna().items():
+        print(f"\n{name} failed:\n{error}")
+    if args.report is not None:
+        df.to_csv(args.report)
@@ -0,0 +1,354 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from temperature_scoring.cache import read_excel_cached
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import (
+    calculate_temperature_scores,
+    load_regression_model,
+    load_sbti_target_status,
+)
+from temperature_scoring.portfolios import PORTFOLIO_ID, score_portfolios
+from temperature_scoring.schema import to_scope, to_time_frame
+
+from calculate_scores import (
+    SCOPES,
+    TIME_FRAMES,
+    finish_company_scores,
+    get_holdings,
+    merge_portfolio,
+)
+
+
+# Local scoring service for what-if requests. The input data are parsed once
+# and kept in memory with the SBTi data, so a request only pays for the
+# vectorized engine. Requests are JSON objects, all fields optional:
+#
+#   targets               target rows replacing all targets of their companies
+#   remove_targets        company ids whose targets are dropped
+#   fundamental           partial fundamental rows, values replace the loaded ones
+#                         and null clears them
+#   holdings              rows of portfolio_id, company_id and investment_value
+#   aggregation_methods   portfolios of the loaded portfolio to score if no
+#                         holdings are given, ["Average"] by default, weighted
+#                         by the fundamental data of the request
+#   companies             company ids of the returned company scores
+#   revised_combined_score, combined_fallback   as in calculate_score
+#
+# Loaded data are never modified, requests work on copies and run in threads.
+
+
+def load_service_state(input_file):
+    # Warm up the SBTi data as well as the input data
+    load_regression_model()
+    load_sbti_target_status()
+    return {
+        "input_file": str(input_file),
+        "target_data": read_excel_cached(input_file, "target_data"),
+        "fundamental_data": read_excel_cached(input_file, "fundamental_data"),
+        "portfolio_data": read_excel_cached(input_file, "portfolio_data"),
+        "loaded_at": time.time(),
+    }
+
+
+def _records(df):
+    # JSON has no NaN
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _company_ids(ids, df):
+    # Company ids of requests as in the loaded data, e.g. 7 for "7"
+    ids = pd.Series(list(ids), dtype=object)
+    if pd.api.types.is_numeric_dtype(df["company_id"]):
+        return pd.to_numeric(ids).values
+    return ids.astype(str).values
+
+
+def _with_company_ids(df_changes, df):
+    if "company_id" not in df_changes:
+        raise ValueError("Missing company_id of changed rows")
+    return df_changes.assign(company_id=_company_ids(df_changes["company_id"], df))
+
+
+def apply_target_changes(df_targets, request):
+    df_changes = pd.DataFrame(request.get("targets", []))
+    replaced = set(_company_ids(request.get("remove_targets", []), df_targets))
+    if len(df_changes):
+        df_changes = _with_company_ids(df_changes, df_targets)
+        replaced.update(df_changes["company_id"])
+    df = df_targets[~df_targets["company_id"].isin(replaced)]
+    if len(df_changes):
+        df = pd.concat([df, df_changes], ignore_index=True)
+    return df
+
+
+def apply_fundamental_changes(df_fundamental, request):
+    if not request.get("fundamental"):
+        return df_fundamental
+    rows = request["fundamental"]
+    df_changes = _with_company_ids(pd.DataFrame(rows), df_fundamental)
+    unknown = set(df_changes.columns) - set(df_fundamental.columns)
+    if unknown:
+        raise ValueError(f"Unknown fundamental columns: {', '.join(sorted(unknown))}")
+
+    df = df_fundamental.set_index("company_id")
+    new_companies = pd.Index(df_changes["company_id"].unique()).difference(df.index)
+    df = df.reindex(df.index.append(new_companies).rename("company_id"))
+    # Only the fields given in each row change, null clears a value
+    for company_id, row in zip(df_changes["company_id"], rows):
+        for column, value in row.items():
+            if column != "company_id":
+                df.loc[company_id, column] = np.nan if value is None else value
+    return df.reset_index()
+
+
+def get_universe(df_portfolio, df_fundamental, df_holdings):
+    # Companies of the loaded portfolio and of the requested holdings
+    company_ids = pd.Index(df_portfolio["company_id"]).append(
+        pd.Index(df_holdings["company_id"])
+    )
+    company_ids = company_ids.unique().intersection(df_fundamental["company_id"])
+    df = df_fundamental[df_fundamental["company_id"].isin(company_ids)]
+    df = df.merge(
+        df_portfolio[["company_id", "company_isin"]].drop_duplicates("company_id"),
+        on="company_id",
+        how="left",
+    )
+    return df.assign(investment_value=1)
+
+
+def score_request(state, request):
+    start = time.perf_counter()
+    df_targets = apply_target_changes(state["target_data"], request)
+    df_fundamental = apply_fundamental_changes(state["fundamental_data"], request)
+
+    # Weights of the aggregation methods follow the changed fundamental data
+    df_portfolio = merge_portfolio(state["portfolio_data"], df_fundamental)
+    if request.get("holdings"):
+        df_holdings = pd.DataFrame(request["holdings"])
+        missing = {PORTFOLIO_ID, "company_id", "investment_value"} - set(df_holdings)
+        if missing:
+            raise ValueError(f"Missing holdings columns: {', '.join(sorted(missing))}")
+        df_holdings = _with_company_ids(df_holdings, df_fundamental)
+    else:
+        df_holdings = get_holdings(
+            df_portfolio, request.get("aggregation_methods", ["Average"])
+        )
+
+    df = calculate_temperature_scores(
+        df_targets,
+        df_fundamental,
+        get_universe(df_portfolio, df_fundamental, df_holdings),
+        time_frames=TIME_FRAMES,
+        scopes=SCOPES,
+    )
+    revised_combined_score = request.get("revised_combined_score", False)
+    df = finish_company_scores(
+        df, revised_combined_score, request.get("combined_fallback", "max")
+    )
+    if revised_combined_score:
+        df["temperature_score"] = df["revised_temperature_score"].fillna(
+            df["temperature_score"]
+        )
+
+    df_scores = score_portfolios(df, df_holdings)
+    df_scores["temperature_score"] = df_scores["temperature_score"].round(2)
+
+    df_companies = df[["company_id", "company_name", "temperature_score"]].assign(
+        scope=to_scope(df["scope"]).astype(object),
+        time_frame=to_time_frame(df["time_frame"]).astype(object),
+    )
+    if request.get("companies") is not None:
+        companies = [str(company_id) for company_id in request["companies"]]
+        df_companies = df_companies[df_companies["company_id"].isin(companies)]
+
+    return {
+        "companies": _records(df_companies),
+        "portfolios": _records(df_scores),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    # GET /health, POST /score and POST /reload with an optional input_file
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send(404, {"error": f"Unknown path: {self.path}"})
+        state = self.server.state
+        self._send(
+            200,
+            {
+                "status": "ok",
+                "input_file": state["input_file"],
+                "companies": len(state["fundamental_data"]),
+                "loaded_at": state["loaded_at"],
+            },
+        )
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+            if self.path == "/score":
+                # Take the state once, a reload may replace it meanwhile
+                return self._send(200, score_request(self.server.state, request))
+            if self.path == "/reload":
+                input_file = request.get("input_file", self.server.state["input_file"])
+                self.server.state = load_service_state(input_file)
+                return self._send(200, {"status": "reloaded"})
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+        except (ValueError, KeyError, TypeError) as error:
+            self._send(400, {"error": f"{type(error).__name__}: {error}"})
+        except Exception as error:
+            self._send(500, {"error": f"{type(error).__name__}: {error}"})
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(state, host="127.0.0.1", port=8765, socket_path=None):
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, ScoringHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ScoringHandler)
+        server.daemon_threads = True
+    server.state = state
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ScoringClient:
+    # Client of a running service, over TCP or a Unix socket
+    def __init__(self, host="127.0.0.1", port=8765, socket_path=None, timeout=60):
+        self.host, self.port = host, port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _call(self, method, path, body=None):
+        if self.socket_path is not None:
+            connection = UnixHTTPConnection(self.socket_path, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+        try:
+            data = None if body is None else json.dumps(body)
+            connection.request(
+                method, path, body=data, headers={"Content-Type": "application/json"}
+            )
+            response = connection.getresponse()
+            result = json.loads(response.read())
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise RuntimeError(f"Scoring service error {response.status}: {result}")
+        return result
+
+    def health(self):
+        return self._call("GET", "/health")
+
+    def score(self, request=None):
+        return self._call("POST", "/score", request or {})
+
+    def reload(self, input_file=None):
+        return self._call(
+            "POST",
+            "/reload",
+            {} if input_file is None else {"input_file": str(input_file)},
+        )
+
+
+class LocalScoringClient:
+    # Stand-in for ScoringClient that scores in this process, without a server
+    def __init__(self, state):
+        self.state = state
+
+    def health(self):
+        return {"status": "ok", "input_file": self.state["input_file"]}
+
+    def score(self, request=None):
+        # Round trip through JSON like the service
+        return json.loads(json.dumps(score_request(self.state, request or {})))
+
+    def reload(self, input_file=None):
+        self.state = load_service_state(input_file or self.state["input_file"])
+        return {"status": "reloaded"}
+
+
+def serve(suffix="", host="127.0.0.1", port=8765, socket_path=None):
+    input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+    server = make_server(load_service_state(input_file), host, port, socket_path)
+    address = socket_path or f"http://{host}:{port}"
+    print(f"Scoring {input_file.name} at {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def start_background_server(state, host="127.0.0.1", port=0, socket_path=None):
+    # A server in a daemon thread, port 0 picks a free port
+    server = make_server(state, host, port, socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve temperature scores")
+    parser.add_argument("--suffix", default="", help="suffix of the input data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", default=None, help="Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    serve(args.suffix, args.host, args.port, args.socket)
@@ -0,0 +1,115 @@
+import pandas as pd
+
+from SBTi.configs import TemperatureScoreConfig
+from SBTi.interfaces import EScope, ETimeFrames
+from SBTi.portfolio_aggregation import PortfolioAggregationMethod
+
+from temperature_scoring.schema import (
+    SCOPE_ORDER,
+    TIME_FRAME_ORDER,
+    to_scope,
+    to_time_frame,
+)
+
+
+# Grouped equivalents of SBTi's TemperatureScore.aggregate_scores, computed
+# directly on the score table instead of through nested pydantic models
+
+C = TemperatureScoreConfig
+COLS = TemperatureScoreConfig.COLS
+
+SCOPE_NAMES = {scope: scope.name for scope in EScope}
+SCOPE_NAMES.update({scope.value: scope.name for scope in EScope})
+TIME_FRAME_NAMES = {time_frame: time_frame.value for time_frame in ETimeFrames}
+TIME_FRAME_NAMES.update(
+    {time_frame.name: time_frame.value for time_frame in ETimeFrames}
+)
+
+
+def normalize_keys(df):
+    # Accept scopes and time frames as enums, names, values or labels
+    scope = to_scope(df[COLS.SCOPE]).astype(object)
+    time_frame = to_time_frame(df[COLS.TIME_FRAME]).astype(object)
+    return scope, time_frame
+
+
+def _check_column(df, column):
+    missing = df.loc[df[column].isna(), COLS.COMPANY_NAME].unique()
+    if len(missing) > 0:
+        raise ValueError(
+            f"The value for {column} is missing for the following companies: "
+            + ", ".join(map(str, missing))
+        )
+
+
+def get_weights(df, scope, method):
+    # Unnormalized weight of each row in its time frame and scope
+    if method == PortfolioAggregationMethod.WATS:
+        return df[COLS.INVESTMENT_VALUE].astype(float)
+
+    use_s1s2 = scope.isin([EScope.S1S2.name, EScope.S1S2S3.name])
+    use_s3 = scope.isin([EScope.S3.name, EScope.S1S2S3.name])
+    if use_s1s2.any():
+        _check_column(df[use_s1s2], COLS.GHG_SCOPE12)
+    if use_s3.any():
+        _check_column(df[use_s3], COLS.GHG_SCOPE3)
+    emissions = use_s1s2 * df[COLS.GHG_SCOPE12].fillna(0) + use_s3 * df[
+        COLS.GHG_SCOPE3
+    ].fillna(0)
+
+    if method == PortfolioAggregationMethod.TETS:
+        return emissions
+
+    if PortfolioAggregationMethod.is_emissions_based(method):
+        if method == PortfolioAggregationMethod.ECOTS:
+            value_columns = [COLS.COMPANY_ENTERPRISE_VALUE, COLS.CASH_EQUIVALENTS]
+        else:
+            value_columns = [PortfolioAggregationMethod.get_value_column(method, COLS)]
+        for column in value_columns + [COLS.INVESTMENT_VALUE]:
+            _check_column(df, column)
+        value = df[value_columns].sum(axis=1)
+        return df[COLS.INVESTMENT_VALUE] / value * emissions
+
+    raise ValueError("The specified portfolio aggregation method is invalid")
+
+
+def aggregate_scores(
+    df,
+    method=PortfolioAggregationMethod.WATS,
+    score_column=COLS.TEMPERATURE_SCORE,
+    contributions=False,
+):
+    scope, time_frame = normalize_keys(df)
+    weights = get_weights(df, scope, method)
+    keys = [time_frame.rename(COLS.TIME_FRAME), scope.rename(COLS.SCOPE)]
+
+    total_weights = weights.groupby(keys).transform("sum")
+    contribution = weights * df[score_column] / total_weights
+    scores = contribution.groupby(keys).sum()
+
+    df_agg = scores.unstack(COLS.TIME_FRAME)
+    df_agg = df_agg.reindex(
+        index=[s for s in SCOPE_ORDER if s in df_agg.index],
+        columns=[t for t in TIME_FRAME_ORDER if t in df_agg.columns],
+    )
+    df_agg.columns.name = None
+    if not contributions:
+        return df_agg
+
+    df_contributions = pd.DataFrame(
+        {
+            COLS.COMPANY_NAME: df[COLS.COMPANY_NAME],
+            COLS.COMPANY_ID: df[COLS.COMPANY_ID],
+            COLS.TIME_FRAME: pd.Categorical(time_frame, TIME_FRAME_ORDER, ordered=True),
+            COLS.SCOPE: pd.Categorical(scope, SCOPE_ORDER, ordered=True),
+            score_column: df[score_column],
+            COLS.CONTRIBUTION: contribution,
+            COLS.CONTRIBUTION_RELATIVE: contribution
+            / (contribution.groupby(keys).transform("sum") / 100),
+        }
+    )
+    df_contributions = df_contributions.sort_values(
+        [COLS.TIME_FRAME, COLS.SCOPE, COLS.CONTRIBUTION_RELATIVE],
+        ascending=[True, True, False],
+    )
+    return df_agg, df_contributions
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from temperature_scoring.engine import COLS
+
+
+# Scores as of past reporting years. Each year is a snapshot of the input
+# data: the emissions reported for the year replace the current emissions of
+# the fundamental data, only targets with a base year up to the year are known,
+# and targets are validated and assigned time frames as of the year. The
+# snapshots are stacked with companies keyed by id and year, so that all years
+# are parsed, matched to the regression model and scored in one pass.
+
+YEAR = "year"
+
+# Company ids of snapshots are "<company id>@<year>"
+SEPARATOR = "@"
+
+# Scopes of the emission data and their fundamental data columns
+EMISSION_COLUMNS = {"S1+S2": COLS.GHG_SCOPE12, "S3": COLS.GHG_SCOPE3}
+
+
+def snapshot_ids(ids, years):
+    return pd.Series(ids).astype(str).values + SEPARATOR + np.asarray(years).astype(str)
+
+
+def split_snapshot_ids(ids):
+    # Original ids and years of snapshot ids
+    parts = pd.Series(ids).astype(str).str.rsplit(SEPARATOR, n=1, expand=True)
+    return parts[0].values, parts[1].astype(int).values
+
+
+def emission_years(df_emissions):
+    return sorted(int(column) for column in df_emissions.columns if column.isdigit())
+
+
+def get_emissions(df_emissions, year):
+    # Emissions reported for the year by company name, NaN if not reported
+    df = df_emissions[
+        df_emissions["scope"].isin(EMISSION_COLUMNS)
+        & df_emissions["company_name"].notna()
+    ]
+    df = df.pivot(index="company_name", columns="scope", values=str(year))
+    return df.reindex(columns=list(EMISSION_COLUMNS)).rename(columns=EMISSION_COLUMNS)
+
+
+def get_snapshot(df_targets, df_fundamental, df_portfolio, df_emissions, year):
+    df_targets = df_targets[df_targets[COLS.BASE_YEAR] <= year].copy()
+
+    # Companies without emission data keep their current emissions
+    df_fundamental = df_fundamental.copy()
+    df_year = get_emissions(df_emissions, year)
+    reported = df_fundamental[COLS.COMPANY_NAME].isin(df_year.index).values
+    for column in EMISSION_COLUMNS.values():
+        emissions = df_fundamental[COLS.COMPANY_NAME].map(df_year[column])
+        df_fundamental[column] = np.where(reported, emissions, df_fundamental[column])
+
+    df_portfolio = df_portfolio.copy()
+    for df in [df_targets, df_fundamental, df_portfolio]:
+        df[COLS.COMPANY_ID] = snapshot_ids(df[COLS.COMPANY_ID], year)
+    return df_targets, df_fundamental, df_portfolio
+
+
+def stack_snapshots(df_targets, df_fundamental, df_portfolio, df_emissions, years):
+    # Inputs of all years and the current year of every snapshot company
+    snapshots = [
+        get_snapshot(df_targets, df_fundamental, df_portfolio, df_emissions, year)
+        for year in years
+    ]
+    df_targets, df_fundamental, df_portfolio = [
+        pd.concat(dfs, ignore_index=True) for dfs in zip(*snapshots)
+    ]
+    company_ids = df_fundamental[COLS.COMPANY_ID].unique()
+    current_year = pd.Series(split_snapshot_ids(company_ids)[1], index=company_ids)
+    return df_targets, df_fundamental, df_portfolio, current_year
+
+
+def split_snapshots(df, column=COLS.COMPANY_ID):
+    # Year column first and the original ids of the snapshot ids
+    ids, years = split_snapshot_ids(df[column])
+    df = df.assign(**{column: ids})
+    df.insert(0, YEAR, years)
+    return df
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from temperature_scoring.config import data_dir
+from temperature_scoring.tracing import count_rows, span
+
+
+# Hashes of files already seen in this process, keyed by path, mtime and size
+_file_hashes = {}
+
+
+def file_hash(path):
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def package_hash():
+    # Hash of all sources of the package, which the stages and scores depend on
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def cache_dir(*path):
+    return data_dir("cache", *path)
+
+
+def _write_sheet(df, file):
+    # Arrow IPC (Feather v2) files can be memory-mapped when uncompressed
+    try:
+        feather.write_feather(df, f"{file}.arrow", compression="uncompressed")
+        return f"{file.name}.arrow"
+    except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError):
+        # Mixed-type columns and non-string headers cannot be stored in Arrow
+        with open(f"{file}.pkl", "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return f"{file.name}.pkl"
+
+
+def _read_sheet(file):
+    if file.suffix == ".arrow":
+        df = feather.read_table(file, memory_map=True).to_pandas()
+        # Arrow restores missing strings as None, read_excel gives NaN
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].where(df[column].notna(), np.nan)
+        return df
+    with open(file, "rb") as f:
+        return pickle.load(f)
+
+
+def _cache_prefix(path):
+    # Workbooks of the same name in different directories have their own caches
+    location = hashlib.sha256(str(path.resolve().parent).encode()).hexdigest()
+    return f"{path.stem}-{location[:8]}"
+
+
+def _convert_workbook(path, directory):
+    dfs = pd.read_excel(path, sheet_name=None)
+
+    # Write to a temporary directory first so that readers never see a partial cache
+    os.makedirs(directory.parent, exist_ok=True)
+    tmp_directory = Path(tempfile.mkdtemp(dir=directory.parent))
+    sheets = {}
+    for i, (sheet_name, df) in enumerate(dfs.items()):
+        sheets[sheet_name] = _write_sheet(df, tmp_directory / f"sheet_{i}")
+    with open(tmp_directory / "sheets.json", "w", encoding="utf-8") as f:
+        json.dump(sheets, f, ensure_ascii=False)
+
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Another process has converted the same workbook in the meantime
+        shutil.rmtree(tmp_directory)
+
+    # Drop caches of previous versions of the workbook
+    for old_directory in directory.parent.glob(f"{_cache_prefix(path)}-*"):
+        if old_directory != directory and old_directory.is_dir():
+            shutil.rmtree(old_directory, ignore_errors=True)
+
+
+def read_excel_cached(path, sheet_name=None):
+    path = Path(path)
+    with span("excel_read", "io", file=path.name, sheet=sheet_name) as record:
+        directory = cache_dir(f"{_cache_prefix(path)}-{file_hash(path)[:16]}")
+        record["cached"] = (directory / "sheets.json").exists()
+        if not record["cached"]:
+            _convert_workbook(path, directory)
+
+        with open(directory / "sheets.json", encoding="utf-8") as f:
+            sheets = json.load(f)
+
+        if sheet_name is None:
+            dfs = {key: _read_sheet(directory / file) for key, file in sheets.items()}
+        else:
+            dfs = _read_sheet(directory / sheets[sheet_name])
+        record["rows"] = count_rows(dfs)
+        return dfs
@@ -0,0 +1,286 @@
+import argparse
+import contextlib
+import importlib
+import runpy
+import sys
+
+from temperature_scoring.config import data_dir, plots_dir, scripts_dir
+
+
+# Entry point of the temperature-scoring command. Every subcommand imports the
+# script of its stage only when it runs, so a single stage does not load
+# pandas, the SBTi tool or plotly for the others. The scripts are not part of
+# the package, so the command works from a source checkout (e.g. an editable
+# install) only.
+
+RAW_INPUT_FILE = "Dane - spółki z ogłoszonymi celami .xlsx"
+AGGREGATION_METHODS = ["Average", "Emissions", "Revenue", "Market Cap"]
+# As in temperature_scoring.outputs, which imports pandas
+OUTPUT_FORMATS = ["arrow", "parquet", "csv", "xlsx"]
+
+# Scripts with their own command line, arguments are passed through
+DELEGATED = {
+    "pipeline": ("run_pipeline", "rebuild outdated outputs"),
+    "scenarios": ("run_scenarios", "run scenarios in parallel"),
+    "benchmark": ("benchmark", "benchmark the pipeline stages"),
+    "serve": ("scoring_service", "serve temperature scores"),
+}
+
+
+def _add_scripts_path():
+    # Scripts import each other as top-level modules
+    if str(scripts_dir()) not in sys.path:
+        sys.path.insert(0, str(scripts_dir()))
+
+
+def _check_scripts_dir():
+    if not scripts_dir().is_dir():
+        sys.exit(
+            f"No scripts in {scripts_dir()}, temperature-scoring runs from a "
+            "source checkout of the repository only"
+        )
+
+
+def import_script(name):
+    _check_scripts_dir()
+    _add_scripts_path()
+    return importlib.import_module(name)
+
+
+def run_script(name, argv):
+    _check_scripts_dir()
+    _add_scripts_path()
+    path = str(scripts_dir(f"{name}.py"))
+    sys.argv = [path] + list(argv)
+    runpy.run_path(path, run_name="__main__")
+
+
+def clean(args):
+    import_script("clean_data").clean_input_data(
+        args.raw_file,
+        data_dir("clean", f"input_data{args.suffix}.xlsx"),
+        use_estimates=args.estimates,
+        chunk_size=args.chunk_size,
+    )
+
+
+def emissions(args):
+    script = import_script("clean_emission_data")
+    script.clean_company_data(
+        data_dir("raw", "company_data.xlsx"), data_dir("clean", "company_data.csv")
+    )
+    script.clean_emission_data(
+        data_dir("raw", "Dane ESG GPW.xlsx"),
+        data_dir("clean", "emission_data.csv"),
+        script.YEAR_COLUMNS,
+        script.SKIPROWS,
+    )
+
+
+def targets(args):
+    script = import_script("process_targets")
+    script.process_targets(args.suffix, args.rules_file or script.TARGET_RULES_FILE)
+    script.append_historical_data_to_emission_targets()
+    script.calculate_emission_trajectories(method=args.method)
+
+
+def score(args):
+    import_script("calculate_scores").calculate_score(
+        args.suffix,
+        revised_combined_score=args.revised,
+        aggregation_methods=args.methods,
+        engine=args.engine,
+        combined_fallback=args.fallback,
+        output_suffix=args.output_suffix,
+        output_formats=args.output_formats,
+    )
+
+
+def score_incremental(args):
+    import_script("calculate_scores").calculate_score_incremental(
+        args.suffix,
+        revised_combined_score=args.revised,
+        aggregation_methods=args.methods,
+        combined_fallback=args.fallback,
+        output_suffix=args.output_suffix,
+        write_company_scores=not args.no_company_scores,
+        output_formats=args.output_formats,
+    )
+
+
+def sensitivity(args):
+    import_script("calculate_scores").calculate_score_sensitivity(
+        args.suffix,
+        aggregation_methods=args.methods,
+        n_draws=args.draws,
+        combined_fallback=args.fallback if args.revised else None,
+        seed=args.seed,
+    )
+
+
+def backtest(args):
+    import_script("calculate_scores").calculate_score_backtest(
+        args.suffix,
+        years=args.years,
+        revised_combined_score=args.revised,
+        aggregation_methods=args.methods,
+        combined_fallback=args.fallback,
+        output_suffix=args.output_suffix,
+        output_formats=args.output_formats,
+    )
+
+
+def plot(args):
+    plots_dir().mkdir(parents=True, exist_ok=True)
+    variants = [
+        {
+            "suffix": suffix,
+            "use_revised_scores": args.revised,
+            "aggregation_methods": args.methods,
+        }
+        for suffix in args.suffixes or [args.suffix]
+    ]
+    import_script("plot_scores").plot_all_temperature_scores(
+        variants,
+        formats=args.formats,
+        workers=args.workers,
+        page_size=args.page_size,
+        page_by=args.page_by,
+        summary=args.summary,
+    )
+
+
+def _add_output_arguments(parser):
+    parser.add_argument("--output-suffix", default=None)
+    parser.add_argument(
+        "--output-formats",
+        nargs="+",
+        default=["arrow"],
+        choices=OUTPUT_FORMATS,
+        help="formats of the company scores, xlsx only on request",
+    )
+
+
+def _add_score_arguments(parser, fallback=True):
+    parser.add_argument("--suffix", default="", help="suffix of the input data")
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        default=["Average"],
+        help=f"aggregation methods, e.g. {' '.join(AGGREGATION_METHODS)}",
+    )
+    parser.add_argument("--revised", action="store_true", help="revise combined scores")
+    if fallback:
+        parser.add_argument("--fallback", default="max", help="revision fallback rule")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="temperature-scoring", description="Temperature scoring stages"
+    )
+    parser.add_argument("--trace", help="Chrome trace file of the run")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("clean", help="clean the raw input data")
+    command.add_argument("--raw-file", default=data_dir("raw", RAW_INPUT_FILE))
+    command.add_argument("--suffix", default="", help="suffix of the clean data")
+    command.add_argument("--estimates", action="store_true", help="use estimates")
+    command.add_argument("--chunk-size", type=int, default=None)
+    command.set_defaults(run=clean)
+
+    command = commands.add_parser("emissions", help="clean company and emission data")
+    command.set_defaults(run=emissions)
+
+    command = commands.add_parser(
+        "targets", help="process targets and emission trajectories"
+    )
+    command.add_argument("--suffix", default="", help="suffix of the input data")
+    command.add_argument("--rules-file", help="target rules, default of the script")
+    command.add_argument(
+        "--method", default="linear", help="interpolation of the trajectories"
+    )
+    command.set_defaults(run=targets)
+
+    command = commands.add_parser("score", help="calculate temperature scores")
+    _add_score_arguments(command)
+    command.add_argument("--engine", default="sbti", choices=["sbti", "numpy"])
+    _add_output_arguments(command)
+    command.set_defaults(run=score)
+
+    command = commands.add_parser(
+        "score-incremental", help="rescore companies with changed inputs"
+    )
+    _add_score_arguments(command)
+    _add_output_arguments(command)
+    command.add_argument(
+        "--no-company-scores",
+        action="store_true",
+        help="only update the portfolio scores",
+    )
+    command.set_defaults(run=score_incremental)
+
+    command = commands.add_parser("sensitivity", help="score percentile bands")
+    _add_score_arguments(command)
+    command.add_argument("--draws", type=int, default=1000)
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(run=sensitivity)
+
+    command = commands.add_parser("backtest", help="score past reporting years")
+    _add_score_arguments(command)
+    command.add_argument(
+        "--years",
+        nargs="+",
+        type=int,
+        help="years of the emission data, all by default",
+    )
+    _add_output_arguments(command)
+    command.set_defaults(run=backtest)
+
+    command = commands.add_parser("plot", help="plot temperature scores")
+    _add_score_arguments(command, fallback=False)
+    command.add_argument(
+        "--suffixes", nargs="+", help="suffixes of the outputs plotted in one batch"
+    )
+    command.add_argument(
+        "--formats",
+        nargs="*",
+        default=["png"],
+        help="image formats, e.g. png svg html, none for the plot data only",
+    )
+    command.add_argument("--workers", type=int, default=None)
+    command.add_argument("--page-size", type=int, default=None)
+    command.add_argument("--page-by", help="column grouping the pages, e.g. sector")
+    command.add_argument(
+        "--summary", action="store_true", help="plot the score distribution"
+    )
+    command.set_defaults(run=plot)
+
+    for name, (script, description) in DELEGATED.items():
+        # Help and other options go to the script
+        command = commands.add_parser(name, help=description, add_help=False)
+        command.set_defaults(run=None, script=script)
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.run is not None and extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.trace:
+        from temperature_scoring.tracing import trace_run
+
+        context = trace_run(args.trace)
+    else:
+        context = contextlib.nullcontext()
+
+    with context:
+        if args.run is None:
+            run_script(args.script, extra)
+        else:
+            args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
+import functools
+import os
 from pathlib import Path
-import inspect
+
+
+@functools.lru_cache(maxsize=None)
+def _root_dir(root):
+    if root is None:
+        return Path(__file__).resolve().parents[2]
+    return Path(root)
 
 
 def project_dir(*path):
-    root = (
-        Path(inspect.getframeinfo(inspect.currentframe()).filename).resolve().parents[2]
-    )
-    return Path(root, *path)
+    # Benchmarks run the scripts on data in another directory
+    return _root_dir(os.environ.get("TEMPERATURE_SCORING_DIR")).joinpath(*path)
 
 
 def data_dir(*path):
@@ -15,3 +21,9 @@ def data_dir(*path):
 
 def plots_dir(*path):
     return project_dir("plots", *path)
+
+
+def scripts_dir(*path):
+    # Scripts stay next to the sources when the data are elsewhere. They are
+    # not packaged, so they exist in a source checkout only.
+    return _root_dir(None).joinpath("scripts", *path)
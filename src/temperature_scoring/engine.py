@@ -0,0 +1,498 @@
+import datetime
+import functools
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from SBTi.configs import PortfolioCoverageTVPConfig, TemperatureScoreConfig
+from SBTi.interfaces import (
+    EScope,
+    ETimeFrames,
+    IDataProviderCompany,
+    IDataProviderTarget,
+    PortfolioCompany,
+)
+
+from temperature_scoring.cache import read_excel_cached
+
+
+# Vectorized port of SBTi's TargetProtocol and TemperatureScore.calculate: the
+# same validation, target grouping, regression and scope logic, but applied to
+# whole columns instead of row by row.
+
+C = TemperatureScoreConfig
+COLS = TemperatureScoreConfig.COLS
+
+TARGET_COLUMNS = list(IDataProviderTarget.__fields__)
+COMPANY_COLUMNS = list(IDataProviderCompany.__fields__)
+PORTFOLIO_COLUMNS = list(PortfolioCompany.__fields__)
+GRID_COLUMNS = [COLS.COMPANY_ID, COLS.TIME_FRAME, COLS.SCOPE]
+GRID_SCOPES = [EScope.S1S2, EScope.S3, EScope.S1S2S3]
+
+S1, S2, S3 = EScope.S1.value, EScope.S2.value, EScope.S3.value
+S1S2, S1S2S3 = EScope.S1S2.value, EScope.S1S2S3.value
+
+SCOPES = {scope.value: scope for scope in EScope}
+TIME_FRAMES = {time_frame.value: time_frame for time_frame in ETimeFrames}
+
+SLOPE_MAP = {time_frame.value: slope for time_frame, slope in C.SLOPE_MAP.items()}
+INTENSITY_MAPPINGS = {
+    f"{metric}|{scope.value}": sr15
+    for (metric, scope), sr15 in C.INTENSITY_MAPPINGS.items()
+}
+ABSOLUTE_MAPPINGS = {
+    f"{isic}|{scope.value}": sr15 for (isic, scope), sr15 in C.ABSOLUTE_MAPPINGS.items()
+}
+
+# Targets with a boundary coverage below the threshold have their ambition
+# scaled by the coverage
+COVERAGE_THRESHOLDS = {S1S2: (COLS.COVERAGE_S1, 0.95), S3: (COLS.COVERAGE_S3, 0.67)}
+
+
+def _read_first_sheet(path):
+    return next(iter(read_excel_cached(path).values()))
+
+
+@functools.lru_cache()
+def load_regression_model(model=4):
+    df = _read_first_sheet(C.FILE_REGRESSION_MODEL_SUMMARY)
+    return df[df[COLS.MODEL] == model]
+
+
+@functools.lru_cache()
+def load_sbti_target_status():
+    # Whether each ISIN known to the SBTi has a validated target
+    c = PortfolioCoverageTVPConfig
+    df = _read_first_sheet(c.FILE_TARGETS)
+    return (
+        (df[c.COL_TARGET_STATUS] == c.VALUE_TARGET_SET)
+        .groupby(df[c.COL_COMPANY_ISIN])
+        .any()
+    )
+
+
+def _to_str(series):
+    # pydantic coerces numbers (NaN included) to strings in str fields
+    return series.astype(str).where(np.not_equal(series.values, None), None)
+
+
+def _to_int(series):
+    return np.trunc(series.astype(float)).astype("int64")
+
+
+def parse_targets(df_targets):
+    # Mimic the coercions and the validation errors of IDataProviderTarget
+    df = pd.DataFrame(index=df_targets.index)
+    for column in TARGET_COLUMNS:
+        df[column] = df_targets[column] if column in df_targets else None
+    if COLS.ACHIEVED_EMISSIONS not in df_targets:
+        df[COLS.ACHIEVED_EMISSIONS] = 0.0
+
+    df = df[
+        df[COLS.BASE_YEAR].notna()
+        & df[COLS.END_YEAR].notna()
+        & df[COLS.SCOPE].isin(SCOPES.keys())
+    ].copy()
+
+    df[COLS.COMPANY_ID] = _to_str(df[COLS.COMPANY_ID])
+    df[COLS.TARGET_REFERENCE_NUMBER] = _to_str(df[COLS.TARGET_REFERENCE_NUMBER])
+    if COLS.INTENSITY_METRIC in df_targets:
+        df[COLS.INTENSITY_METRIC] = _to_str(df[COLS.INTENSITY_METRIC])
+    for column in [COLS.BASE_YEAR, COLS.END_YEAR]:
+        df[column] = _to_int(df[column])
+    for column in [
+        COLS.COVERAGE_S1,
+        COLS.COVERAGE_S2,
+        COLS.COVERAGE_S3,
+        COLS.REDUCTION_AMBITION,
+        COLS.BASEYEAR_GHG_S1,
+        COLS.BASEYEAR_GHG_S2,
+        COLS.BASEYEAR_GHG_S3,
+        COLS.START_YEAR,
+        COLS.ACHIEVED_EMISSIONS,
+    ]:
+        df[column] = df[column].astype(float)
+    df[COLS.START_YEAR] = np.trunc(df[COLS.START_YEAR])
+    df[COLS.TIME_FRAME] = None
+
+    return df.reset_index(drop=True)
+
+
+def parse_companies(df_fundamental):
+    # Mimic the coercions of IDataProviderCompany
+    df = pd.DataFrame(index=df_fundamental.index)
+    for column in COMPANY_COLUMNS:
+        field = IDataProviderCompany.__fields__[column]
+        if column not in df_fundamental:
+            df[column] = field.default
+        elif field.type_ is str:
+            df[column] = _to_str(df_fundamental[column])
+        elif field.type_ is float:
+            df[column] = df_fundamental[column].astype(float)
+        else:
+            df[column] = df_fundamental[column]
+    return df.reset_index(drop=True)
+
+
+def parse_portfolio(df_portfolio):
+    # Mimic dataframe_to_portfolio and the flattening in SBTi.utils.get_data
+    df = pd.DataFrame(index=df_portfolio.index)
+    for column in PORTFOLIO_COLUMNS:
+        if column in df_portfolio:
+            df[column] = df_portfolio[column]
+    df[COLS.COMPANY_NAME] = _to_str(df[COLS.COMPANY_NAME])
+    df[COLS.COMPANY_ID] = _to_str(df[COLS.COMPANY_ID])
+    if COLS.COMPANY_ISIN in df:
+        df[COLS.COMPANY_ISIN] = _to_str(df[COLS.COMPANY_ISIN])
+    df[COLS.INVESTMENT_VALUE] = df[COLS.INVESTMENT_VALUE].astype(float)
+    engagement_target = df.get(COLS.ENGAGEMENT_TARGET, pd.Series(False, index=df.index))
+    df[COLS.ENGAGEMENT_TARGET] = engagement_target.fillna(False).astype(bool)
+    if "user_fields" in df:
+        df = df.drop(columns="user_fields")
+    return df.reset_index(drop=True)
+
+
+def get_company_data(df_companies, df_portfolio):
+    df = df_companies[
+        df_companies[COLS.COMPANY_ID].isin(df_portfolio[COLS.COMPANY_ID])
+    ].copy()
+
+    # Supplement the company data with the SBTi target status
+    if COLS.COMPANY_ISIN in df_portfolio:
+        isin_map = df_portfolio.drop_duplicates(COLS.COMPANY_ID, keep="last")
+        isin_map = isin_map.set_index(COLS.COMPANY_ID)[COLS.COMPANY_ISIN]
+        sbti_validated = (
+            df[COLS.COMPANY_ID].map(isin_map).map(load_sbti_target_status())
+        )
+        df[COLS.SBTI_VALIDATED] = sbti_validated.fillna(df[COLS.SBTI_VALIDATED])
+    return df.reset_index(drop=True)
+
+
+def _current_years(df, current_year):
+    # A year, or years by company id when snapshots of several years are
+    # scored together
+    if isinstance(current_year, pd.Series):
+        return df[COLS.COMPANY_ID].map(current_year).values
+    return current_year
+
+
+def prepare_targets(df, current_year=None):
+    if current_year is None:
+        current_year = datetime.datetime.now().year
+
+    df = df.copy()
+    df["_order"] = np.arange(len(df))
+    df["_split"] = 0
+
+    # Validate targets
+    scope = df[COLS.SCOPE]
+    target_type = df[COLS.TARGET_REFERENCE_NUMBER].str.lower()
+    intensity_metric = df[COLS.INTENSITY_METRIC]
+    has_ghg_s1s2 = df[COLS.BASEYEAR_GHG_S1].notna() & df[COLS.BASEYEAR_GHG_S2].notna()
+    df[COLS.START_YEAR] = df[COLS.START_YEAR].fillna(df[COLS.BASE_YEAR])
+    valid = (
+        (
+            target_type.str.contains("abs", regex=False)
+            | (
+                target_type.str.contains("int", regex=False)
+                & intensity_metric.notna()
+                & (intensity_metric.str.lower() != "other")
+            )
+        )
+        & (df[COLS.ACHIEVED_EMISSIONS].isna() | (df[COLS.ACHIEVED_EMISSIONS] < 1))
+        & (df[COLS.END_YEAR] > df[COLS.START_YEAR])
+        & (df[COLS.END_YEAR] >= _current_years(df, current_year))
+        & ((scope != S1) | (df[COLS.COVERAGE_S1].notna() & has_ghg_s1s2))
+        & ((scope != S2) | (df[COLS.COVERAGE_S2].notna() & has_ghg_s1s2))
+    )
+    df = df[valid]
+
+    s2_targets = df[
+        (df[COLS.SCOPE] == S2)
+        & df[COLS.BASEYEAR_GHG_S2].notna()
+        & df[COLS.COVERAGE_S2].notna()
+    ]
+
+    # Split S1+S2+S3 targets into S1+S2 and S3 targets
+    scope = df[COLS.SCOPE]
+    c1, c2 = df[COLS.COVERAGE_S1], df[COLS.COVERAGE_S2]
+    g1, g2 = df[COLS.BASEYEAR_GHG_S1], df[COLS.BASEYEAR_GHG_S2]
+    has_ghg_s1s2 = g1.notna() & g2.notna()
+    is_s1s2s3 = scope == S1S2S3
+    df_s3 = df[is_s1s2s3 & df[COLS.COVERAGE_S3].notna()].copy()
+    df_s3[COLS.SCOPE] = S3
+    df_s3["_split"] = 1
+
+    to_s1s2 = is_s1s2s3 & (has_ghg_s1s2 | (c1 == c2))
+    reweighted = to_s1s2 & has_ghg_s1s2 & (g1 + g2 != 0)
+    coverage = (c1 * g1 + c2 * g2) / (g1 + g2)
+    df = df.copy()
+    df.loc[to_s1s2, COLS.SCOPE] = S1S2
+    df.loc[reweighted, COLS.COVERAGE_S1] = coverage[reweighted]
+    df.loc[reweighted, COLS.COVERAGE_S2] = coverage[reweighted]
+    df = pd.concat([df, df_s3]).sort_values(["_order", "_split"], kind="stable")
+    df = df.reset_index(drop=True)
+
+    # Combine S1 targets with a matching S2 target of the highest coverage
+    keys = [
+        COLS.COMPANY_ID,
+        COLS.BASE_YEAR,
+        COLS.START_YEAR,
+        COLS.END_YEAR,
+        COLS.TARGET_REFERENCE_NUMBER,
+        COLS.INTENSITY_METRIC,
+    ]
+    is_s1 = (df[COLS.SCOPE] == S1) & df[COLS.BASEYEAR_GHG_S1].notna()
+    matches = s2_targets.sort_values(COLS.COVERAGE_S2, ascending=False, kind="stable")
+    matches = matches.drop_duplicates(keys)[
+        keys + [COLS.COVERAGE_S2, COLS.BASEYEAR_GHG_S2, COLS.REDUCTION_AMBITION]
+    ]
+    df_s1 = (
+        df.loc[is_s1, keys]
+        .reset_index()
+        .merge(matches, on=keys, how="inner")
+        .set_index("index")
+    )
+    if len(df_s1) > 0:
+        index = df_s1.index
+        c1 = df.loc[index, COLS.COVERAGE_S1]
+        g1 = df.loc[index, COLS.BASEYEAR_GHG_S1]
+        a1 = df.loc[index, COLS.REDUCTION_AMBITION]
+        c2 = df_s1[COLS.COVERAGE_S2]
+        g2 = df_s1[COLS.BASEYEAR_GHG_S2]
+        a2 = df_s1[COLS.REDUCTION_AMBITION]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            combined_coverage = (c1 * g1 + c2 * g2) / (g1 + g2)
+            df.loc[index, COLS.REDUCTION_AMBITION] = (a1 * c1 * g1 + a2 * c2 * g2) / (
+                c1 * g1 + c2 * g2
+            )
+        df.loc[index, COLS.COVERAGE_S1] = combined_coverage
+        df.loc[index, COLS.COVERAGE_S2] = combined_coverage
+        df.loc[index, COLS.SCOPE] = S1S2
+
+    # Convert the remaining S1 and S2 targets into S1+S2 targets
+    g1, g2 = df[COLS.BASEYEAR_GHG_S1], df[COLS.BASEYEAR_GHG_S2]
+    total = g1 + g2
+    for scope, coverage_column, ghg in [
+        (S1, COLS.COVERAGE_S1, g1),
+        (S2, COLS.COVERAGE_S2, g2),
+    ]:
+        converted = (df[COLS.SCOPE] == scope) & (total != 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coverage = df[coverage_column] * ghg / total
+        df.loc[converted, COLS.COVERAGE_S1] = coverage[converted]
+        df.loc[converted, COLS.COVERAGE_S2] = coverage[converted]
+        df.loc[converted, COLS.SCOPE] = S1S2
+
+    # Scale the ambition of targets with a low boundary coverage
+    for scope, (coverage_column, threshold) in COVERAGE_THRESHOLDS.items():
+        scaled = (df[COLS.SCOPE] == scope) & (df[coverage_column] < threshold)
+        df.loc[scaled, COLS.REDUCTION_AMBITION] *= df.loc[scaled, coverage_column]
+
+    # Assign time frames
+    years = df[COLS.END_YEAR] - _current_years(df, current_year)
+    df[COLS.TIME_FRAME] = np.select(
+        [years <= 4, years <= 15, years <= 30],
+        [ETimeFrames.SHORT.value, ETimeFrames.MID.value, ETimeFrames.LONG.value],
+        None,
+    )
+
+    return df
+
+
+def group_targets(df, company_ids):
+    # Pick one target per company, time frame and scope, preferring higher
+    # coverage, later end year and absolute over intensity targets
+    df = df[df[COLS.TIME_FRAME].notna()].copy()
+    df["_coverage"] = np.where(
+        df[COLS.SCOPE] == S3, df[COLS.COVERAGE_S3], df[COLS.COVERAGE_S1]
+    )
+    df = df.sort_values(
+        GRID_COLUMNS + ["_coverage", COLS.END_YEAR, COLS.TARGET_REFERENCE_NUMBER],
+        ascending=[True, True, True, False, False, True],
+    )
+    df = df.drop_duplicates(GRID_COLUMNS)
+
+    grid = pd.DataFrame(
+        product(
+            company_ids,
+            [time_frame.value for time_frame in ETimeFrames],
+            [scope.value for scope in GRID_SCOPES],
+        ),
+        columns=GRID_COLUMNS,
+    )
+    columns = GRID_COLUMNS + [col for col in TARGET_COLUMNS if col not in GRID_COLUMNS]
+    return grid.merge(df[TARGET_COLUMNS], on=GRID_COLUMNS, how="left")[columns]
+
+
+def get_target_mapping(data):
+    scope = data[COLS.SCOPE]
+    is_intensity = (
+        data[COLS.TARGET_REFERENCE_NUMBER].str.strip().str.lower().str.startswith("int")
+    )
+    intensity = (data[COLS.INTENSITY_METRIC] + "|" + scope).map(INTENSITY_MAPPINGS)
+    absolute = (data[COLS.COMPANY_ISIC].str[:3] + "|" + scope).map(ABSOLUTE_MAPPINGS)
+    absolute = absolute.fillna(("other|" + scope).map(ABSOLUTE_MAPPINGS))
+    return intensity.where(is_intensity, absolute)
+
+
+def score_targets(
+    param, intercept, annual_reduction_rate, sbti_validated, fallback_score
+):
+    # Arrays of any shape that broadcast together, e.g. draws x targets
+    missing = np.isnan(param) | np.isnan(intercept) | np.isnan(annual_reduction_rate)
+    scores = np.maximum(
+        param * annual_reduction_rate * 100 + intercept, C.TEMPERATURE_FLOOR
+    )
+    scores = np.where(
+        sbti_validated,
+        scores,
+        scores * C.SBTI_FACTOR + fallback_score * (1 - C.SBTI_FACTOR),
+    )
+    scores = np.where(missing, fallback_score, scores)
+    results = np.where(missing, 1, 0)
+    return scores, results
+
+
+def get_scores(data, fallback_score=C.FALLBACK_SCORE):
+    return score_targets(
+        data[COLS.REGRESSION_PARAM].astype(float).values,
+        data[COLS.REGRESSION_INTERCEPT].astype(float).values,
+        data[COLS.ANNUAL_REDUCTION_RATE].astype(float).values,
+        data[COLS.SBTI_VALIDATED].fillna(False).astype(bool).values,
+        fallback_score,
+    )
+
+
+def combine_scopes(s1s2, s3, ghg_s1s2, ghg_s3, s1s2s3):
+    # S1+S2+S3 values weighted by emissions, or the S1+S2 value if S3 emissions
+    # are low, or the S1+S2+S3 target's own value if emissions are missing
+    with np.errstate(divide="ignore", invalid="ignore"):
+        company_emissions = ghg_s1s2 + ghg_s3
+        low_s3 = ghg_s3 / company_emissions < 0.4
+        weighted = (s1s2 * ghg_s1s2 + s3 * ghg_s3) / company_emissions
+    has_emissions = ~np.isnan(ghg_s1s2) & ~np.isnan(ghg_s3)
+    return np.where(has_emissions, np.where(low_s3, s1s2, weighted), s1s2s3)
+
+
+def get_company_scores(data):
+    # Combine S1+S2 and S3 scores into S1+S2+S3 scores weighted by emissions
+    keys = [COLS.COMPANY_ID, COLS.TIME_FRAME]
+    values = [COLS.TEMPERATURE_SCORE, C.TEMPERATURE_RESULTS]
+    company_data = (
+        data[keys + [COLS.SCOPE, COLS.GHG_SCOPE12, COLS.GHG_SCOPE3] + values]
+        .groupby(keys + [COLS.SCOPE])
+        .mean()
+    )
+    scope = company_data.index.get_level_values(COLS.SCOPE)
+    s1s2 = company_data[scope == S1S2].droplevel(COLS.SCOPE)
+    s1s2 = s1s2[[COLS.GHG_SCOPE12] + values]
+    s3 = company_data[scope == S3].droplevel(COLS.SCOPE)[[COLS.GHG_SCOPE3] + values]
+
+    is_s1s2s3 = data[COLS.SCOPE] == S1S2S3
+    df = (
+        data.loc[is_s1s2s3, keys + values]
+        .reset_index()
+        .merge(s1s2.reset_index(), on=keys, how="left", suffixes=("", "_s1s2"))
+        .merge(s3.reset_index(), on=keys, how="left", suffixes=("", "_s3"))
+        .set_index("index")
+    )
+    ghg_s1s2 = df[COLS.GHG_SCOPE12].astype(float).values
+    ghg_s3 = df[COLS.GHG_SCOPE3].astype(float).values
+    for value in values:
+        data.loc[df.index, value] = combine_scopes(
+            df[f"{value}_s1s2"].astype(float).values,
+            df[f"{value}_s3"].astype(float).values,
+            ghg_s1s2,
+            ghg_s3,
+            df[value].astype(float).values,
+        )
+    return data
+
+
+def prepare_scoring_data(
+    df_targets,
+    df_fundamental,
+    df_portfolio,
+    time_frames,
+    scopes,
+    model=4,
+    current_year=None,
+):
+    # Targets of every company, time frame and scope with their regression
+    # parameters, ready to be scored
+    df_portfolio = parse_portfolio(df_portfolio)
+    df_companies = get_company_data(parse_companies(df_fundamental), df_portfolio)
+    df_targets = prepare_targets(parse_targets(df_targets), current_year)
+
+    data = group_targets(df_targets, df_companies[COLS.COMPANY_ID].unique())
+    data = data.merge(df_companies, how="outer", on=COLS.COMPANY_ID)
+    data = data.merge(
+        df_portfolio.drop(columns=COLS.COMPANY_NAME), how="left", on=COLS.COMPANY_ID
+    )
+
+    # If S1+S2+S3 scores are requested, S1+S2 and S3 scores are needed as well
+    scope_values = [scope.value for scope in scopes]
+    all_scope_values = list(scope_values)
+    if S1S2S3 in scope_values:
+        all_scope_values += [S1S2, S3]
+    data = data[
+        data[COLS.SCOPE].isin(all_scope_values)
+        & data[COLS.TIME_FRAME].isin([time_frame.value for time_frame in time_frames])
+    ].copy()
+
+    data[COLS.TARGET_REFERENCE_NUMBER] = data[COLS.TARGET_REFERENCE_NUMBER].fillna(
+        C.VALUE_TARGET_REFERENCE_ABSOLUTE
+    )
+    data[COLS.SR15] = get_target_mapping(data)
+
+    base_year = data[COLS.BASE_YEAR].astype(float)
+    end_year = data[COLS.END_YEAR].astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annual_reduction_rate = data[COLS.REDUCTION_AMBITION] / (end_year - base_year)
+    data[COLS.ANNUAL_REDUCTION_RATE] = annual_reduction_rate.where(end_year > base_year)
+
+    data[COLS.SLOPE] = data[COLS.TIME_FRAME].map(SLOPE_MAP)
+    data = pd.merge(
+        left=data,
+        right=load_regression_model(model),
+        left_on=[COLS.SLOPE, COLS.SR15],
+        right_on=[COLS.SLOPE, COLS.VARIABLE],
+        how="left",
+    )
+    return data
+
+
+def calculate_temperature_scores(
+    df_targets,
+    df_fundamental,
+    df_portfolio,
+    time_frames,
+    scopes,
+    fallback_score=C.FALLBACK_SCORE,
+    model=4,
+    current_year=None,
+):
+    data = prepare_scoring_data(
+        df_targets,
+        df_fundamental,
+        df_portfolio,
+        time_frames,
+        scopes,
+        model,
+        current_year,
+    )
+    data[COLS.TEMPERATURE_SCORE], data[C.TEMPERATURE_RESULTS] = get_scores(
+        data, fallback_score
+    )
+
+    scope_values = [scope.value for scope in scopes]
+    if S1S2S3 in scope_values:
+        data = get_company_scores(data)
+
+    data = data[data[COLS.SCOPE].isin(scope_values)].copy()
+    data[COLS.TEMPERATURE_SCORE] = data[COLS.TEMPERATURE_SCORE].round(2)
+    data[COLS.SCOPE] = data[COLS.SCOPE].map(SCOPES)
+    data[COLS.TIME_FRAME] = data[COLS.TIME_FRAME].map(TIME_FRAMES)
+    return data
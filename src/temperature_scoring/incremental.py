@@ -0,0 +1,151 @@
+import datetime
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from temperature_scoring.cache import cache_dir, package_hash
+from temperature_scoring.portfolios import (
+    PORTFOLIO_ID,
+    get_portfolio_sums,
+    get_score_matrix,
+)
+
+
+# Company scores depend only on the company's own target, fundamental and
+# portfolio rows. A run keeps hashes of these rows per company together with
+# the company scores and the weighted sums of the portfolios, so the next run
+# rescores only the companies whose rows changed and updates the portfolio sums
+# by their old and new contributions.
+
+COMPANY_ID = "company_id"
+
+
+def company_hashes(df, key=COMPANY_ID):
+    # Stable across processes unlike hash(), and sensitive to the order of
+    # the rows of a company
+    rows = pd.util.hash_pandas_object(df.astype(str), index=False).values
+    position = df.groupby(key, sort=False).cumcount().values
+    mixed = pd.util.hash_pandas_object(
+        pd.DataFrame({"row": rows, "position": position}), index=False
+    ).values
+
+    codes, company_ids = pd.factorize(df[key])
+    hashes = np.zeros(len(company_ids), dtype=np.uint64)
+    # Sums wrap around
+    np.add.at(hashes, codes[codes >= 0], mixed[codes >= 0])
+    return pd.Series(hashes, index=pd.Index(company_ids).astype(str))
+
+
+def get_input_hashes(df_targets, df_fundamental, df_portfolio):
+    hashes = {
+        "targets": company_hashes(df_targets),
+        "fundamental": company_hashes(df_fundamental),
+        "portfolio": company_hashes(df_portfolio),
+    }
+    company_ids = pd.Index([])
+    for series in hashes.values():
+        company_ids = company_ids.union(series.index)
+    return pd.DataFrame(
+        {
+            name: series.reindex(company_ids, fill_value=0)
+            for name, series in hashes.items()
+        }
+    )
+
+
+def changed_companies(df_old_hashes, df_new_hashes):
+    # Companies added, removed or with any changed row
+    company_ids = df_old_hashes.index.union(df_new_hashes.index)
+    df_old = df_old_hashes.reindex(company_ids, fill_value=0)
+    df_new = df_new_hashes.reindex(company_ids, fill_value=0)
+    return company_ids[(df_old != df_new).any(axis=1).values]
+
+
+def get_state_params(**params):
+    # Scores change with the code scoring and aggregating them, e.g. the
+    # engine, revision and portfolios, and the current year as well
+    return {
+        **params,
+        "code": package_hash(),
+        "current_year": datetime.datetime.now().year,
+    }
+
+
+def _state_file(name):
+    return cache_dir("incremental", f"{name}.pkl")
+
+
+def load_state(name, params):
+    path = _state_file(name)
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    return state if state["params"] == params else None
+
+
+def save_state(name, state):
+    path = _state_file(name)
+    os.makedirs(path.parent, exist_ok=True)
+    # Write to a temporary file first so that a failed run keeps the old state
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def patch_scores(df_old, df_new, company_ids, order):
+    # Replace the rows of the rescored companies and sort the companies in the
+    # given order, dropping companies which are not in it
+    df = pd.concat(
+        [df_old[~df_old[COMPANY_ID].isin(company_ids)], df_new], ignore_index=True
+    )
+    rank = pd.Series(np.arange(len(order)), index=pd.Index(order).astype(str))
+    rank = rank.reindex(df[COMPANY_ID].astype(str))
+    df = df[rank.notna().values]
+    rank = rank.dropna().values
+    return df.iloc[np.argsort(rank, kind="stable")].reset_index(drop=True)
+
+
+def _subset(df, company_ids):
+    return df[df[COMPANY_ID].astype(str).isin(company_ids)]
+
+
+def update_portfolio_sums(sums, old, new, company_ids, score_column):
+    # Subtract the contributions of the companies under their old scores and
+    # holdings and add them under the new ones. The sums are a dict of the
+    # weighted sums, total weights and numbers of scored holdings, which set
+    # emptied portfolios to exactly zero instead of rounding errors.
+    sums = dict(sums)
+    for sign, (df_scores, df_holdings) in [(-1, old), (1, new)]:
+        df_scores = _subset(df_scores, company_ids)
+        df_holdings = _subset(df_holdings, company_ids)
+        if df_scores.empty or df_holdings.empty:
+            continue
+        df_sums, df_weights = get_portfolio_sums(df_scores, df_holdings, score_column)
+        # Holdings without a value do not count, as in get_holdings_matrix
+        values = df_holdings["investment_value"].astype(float)
+        _, df_counts = get_portfolio_sums(
+            df_scores,
+            df_holdings.assign(investment_value=(values.fillna(0) != 0) * 1.0),
+            score_column,
+        )
+        for key, df in [("sums", df_sums), ("weights", df_weights)]:
+            sums[key] = sums[key].add(sign * df, fill_value=0)
+        sums["counts"] = sums["counts"].add(sign * df_counts, fill_value=0)
+
+    empty = sums["counts"].values == 0
+    for key in ["sums", "weights"]:
+        sums[key] = sums[key].reindex_like(sums["counts"]).mask(empty, 0.0)
+    return sums
+
+
+def empty_portfolio_sums(df_scores, df_holdings, score_column):
+    # Sums of all portfolios before any company is added
+    portfolio_ids = pd.Index(df_holdings[PORTFOLIO_ID].unique(), name=PORTFOLIO_ID)
+    columns = get_score_matrix(df_scores, score_column).columns
+    df = pd.DataFrame(0.0, index=portfolio_ids, columns=columns)
+    return {"sums": df, "weights": df.copy(), "counts": df.copy()}
@@ -0,0 +1,188 @@
+import contextlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas._libs.parsers import STR_NA_VALUES
+
+from temperature_scoring.config import data_dir
+from temperature_scoring.tracing import span
+
+
+# Score tables are written as Arrow IPC (Feather v2) files by default, which
+# are written and read orders of magnitude faster than workbooks. Excel, CSV
+# and Parquet are written on request. Readers take the most recently written
+# format of a table, so that they follow whatever the last run produced.
+
+DEFAULT_FORMATS = ["arrow"]
+
+# Fastest first, readers prefer them if written at the same time
+FORMATS = ["arrow", "parquet", "csv", "xlsx"]
+
+
+def output_file(name, format):
+    return data_dir("clean", f"{name}.{format}")
+
+
+def output_files(name, formats=DEFAULT_FORMATS):
+    return [output_file(name, format) for format in formats]
+
+
+# Strings that Excel and CSV read back as missing values, e.g. "nan", and
+# "None" since pandas 2
+NA_STRINGS = sorted(STR_NA_VALUES)
+
+
+def _to_arrow_compatible(df):
+    # Written as Excel and CSV read them back: enums and categories as plain
+    # strings, mixed-type columns as strings, "nan" strings as missing values
+    # and numeric ids as numbers
+    df = df.copy()
+    for column in df.columns[df.dtypes == "category"]:
+        df[column] = df[column].astype(object)
+    for column in df.columns[df.dtypes == object]:
+        values = df[column]
+        codes, uniques = pd.factorize(values)
+        if any(isinstance(value, Enum) for value in uniques):
+            uniques = pd.Index([str(value) for value in uniques])
+            values = pd.Series(
+                np.where(codes >= 0, uniques.take(codes), np.nan), index=df.index
+            )
+        else:
+            try:
+                pa.array(uniques, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                values = values.where(values.isna(), values.astype(str))
+        values = values.mask(values.isin(NA_STRINGS))
+
+        uniques = values.dropna().unique()
+        if not len(uniques):
+            # Empty columns are read back as floats
+            values = values.astype(float)
+        elif str(column).endswith("_id"):
+            if not np.isnan(pd.to_numeric(uniques, errors="coerce")).any():
+                values = pd.to_numeric(values)
+        df[column] = values
+    return df
+
+
+def _write_arrow(df, path):
+    # Uncompressed files can be memory-mapped
+    feather.write_feather(
+        _to_arrow_compatible(df).reset_index(drop=True),
+        path,
+        compression="uncompressed",
+    )
+
+
+def _write_parquet(df, path):
+    _to_arrow_compatible(df).to_parquet(path, index=False)
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+def _write_xlsx(df, path):
+    df.to_excel(path, index=False)
+
+
+def _from_arrow(df):
+    # Arrow restores missing strings as None, read_excel gives NaN
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def _read_arrow(path):
+    return _from_arrow(feather.read_table(path, memory_map=True).to_pandas())
+
+
+def _read_parquet(path):
+    return _from_arrow(pd.read_parquet(path))
+
+
+WRITERS = {
+    "arrow": _write_arrow,
+    "parquet": _write_parquet,
+    "csv": _write_csv,
+    "xlsx": _write_xlsx,
+}
+READERS = {
+    "arrow": _read_arrow,
+    "parquet": _read_parquet,
+    "csv": pd.read_csv,
+    "xlsx": pd.read_excel,
+}
+
+
+def write_table(df, path):
+    # Write to a temporary file first so that readers never see a partial table
+    path = str(path)
+    format = path.rsplit(".", 1)[-1]
+    if format not in WRITERS:
+        raise ValueError(f"Unknown output format: {format}")
+
+    with span(f"{format}_write", "io", file=os.path.basename(path), rows=len(df)):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=f".tmp.{format}"
+        )
+        os.close(fd)
+        try:
+            WRITERS[format](df, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def write_output(df, name, formats=DEFAULT_FORMATS):
+    # Formats of one run share their modification time, so that readers take
+    # the fastest of them
+    files = output_files(name, formats)
+    for path in files:
+        write_table(df, path)
+    mtime = max(path.stat().st_mtime_ns for path in files)
+    for path in files:
+        os.utime(path, ns=(mtime, mtime))
+    return files
+
+
+def latest_output_file(name):
+    # Most recently written format of the table, the fastest one on ties
+    files = [path for path in output_files(name, FORMATS) if path.exists()]
+    if not files:
+        raise FileNotFoundError(f"No output {name} in {data_dir('clean')}")
+    return max(files, key=lambda path: (path.stat().st_mtime_ns, -files.index(path)))
+
+
+def read_table(path):
+    format = str(path).rsplit(".", 1)[-1]
+    with span(f"{format}_read", "io", file=os.path.basename(path)) as record:
+        df = READERS[format](path)
+        record["rows"] = len(df)
+    return df
+
+
+def read_output(name):
+    return read_table(latest_output_file(name))
+
+
+@contextlib.contextmanager
+def background_writes():
+    # Writes submitted to the yielded function run on one thread while the
+    # caller goes on, in order. Errors of writes are raised on exit.
+    futures = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        def submit(function, *args, **kwargs):
+            futures.append(executor.submit(function, *args, **kwargs))
+
+        yield submit
+    for future in futures:
+        future.result()
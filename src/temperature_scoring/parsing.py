@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+
+# Thousands separators (space, no-break space, narrow no-break space) are
+# removed and decimal commas become decimal points in a single translate call
+_NUMBER_TRANSLATION = str.maketrans({" ": None, "\xa0": None, "\u202f": None, ",": "."})
+
+MISSING_VALUES = {"", "x", "-"}
+
+
+def parse_numbers(values):
+    # Parse numbers written with Polish conventions, e.g. "1 234,5" or "x"
+    values = np.asarray(values, dtype=object)
+    shape = values.shape
+    values = values.ravel()
+
+    is_str = np.fromiter(
+        (isinstance(value, str) for value in values), dtype=bool, count=len(values)
+    )
+    result = np.full(len(values), np.nan)
+    result[~is_str] = pd.to_numeric(pd.Series(values[~is_str]), errors="raise")
+
+    strings = pd.Series(values[is_str], dtype=object).str.translate(_NUMBER_TRANSLATION)
+    strings = strings.where(~strings.str.lower().isin(MISSING_VALUES))
+    result[is_str] = pd.to_numeric(strings, errors="raise")
+    return result.reshape(shape)
@@ -0,0 +1,184 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+import zipfile
+from pathlib import Path
+
+from temperature_scoring.cache import cache_dir, file_hash, package_hash
+from temperature_scoring.config import project_dir
+from temperature_scoring.tracing import span
+
+
+# Stages declare their input and output files and their parameters. A stage is
+# run again only if its fingerprint (parameters, code and input contents) or its
+# outputs differ from the state saved after its last successful run.
+
+STATE_FILE = "pipeline_state.json"
+
+# Hashes of workbook contents already seen in this process
+_content_hashes = {}
+
+
+def make_stage(name, function, inputs, outputs, **params):
+    return {
+        "name": name,
+        "function": function,
+        "inputs": [Path(path) for path in inputs],
+        "outputs": [Path(path) for path in outputs],
+        "params": params,
+    }
+
+
+def content_hash(path):
+    path = Path(path)
+    if path.suffix != ".xlsx":
+        return file_hash(path)
+
+    # Workbooks store the time they were written, so hash the sheets only
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    if key not in _content_hashes:
+        digest = hashlib.sha256()
+        with zipfile.ZipFile(path) as f:
+            for name in sorted(f.namelist()):
+                if not name.startswith("docProps/"):
+                    digest.update(name.encode())
+                    digest.update(f.read(name))
+        _content_hashes[key] = digest.hexdigest()
+    return _content_hashes[key]
+
+
+def _relative(path):
+    try:
+        return str(Path(path).resolve().relative_to(project_dir()))
+    except ValueError:
+        return str(path)
+
+
+def fingerprint(stage):
+    digest = hashlib.sha256()
+    digest.update(json.dumps(stage["params"], sort_keys=True, default=str).encode())
+    # Traced functions are wrapped, hash the source of the original function
+    # and of the package it uses
+    source_file = inspect.getsourcefile(inspect.unwrap(stage["function"]))
+    digest.update(file_hash(source_file).encode())
+    digest.update(package_hash().encode())
+    for path in stage["inputs"]:
+        digest.update(_relative(path).encode())
+        digest.update(content_hash(path).encode())
+    return digest.hexdigest()
+
+
+def sort_stages(stages, targets=None):
+    # Order the stages so that every stage runs after the stages producing its
+    # inputs, keeping only the targets and their upstream stages if given
+    by_name = {stage["name"]: stage for stage in stages}
+    producers = {}
+    for stage in stages:
+        for path in stage["outputs"]:
+            if path in producers:
+                raise ValueError(f"{path} is an output of more than one stage")
+            producers[path] = stage["name"]
+
+    ordered = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage {name} depends on itself")
+        visiting.add(name)
+        for path in by_name[name]["inputs"]:
+            if path in producers:
+                visit(producers[path])
+        visiting.remove(name)
+        ordered.append(name)
+
+    unknown = set(targets or []) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    for name in targets or by_name:
+        visit(name)
+    return [by_name[name] for name in ordered]
+
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, state_file):
+    os.makedirs(Path(state_file).parent, exist_ok=True)
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+
+def is_up_to_date(stage, record):
+    if record is None or record["fingerprint"] != fingerprint(stage):
+        return False
+    for path in stage["outputs"]:
+        if not path.exists() or content_hash(path) != record["outputs"].get(
+            _relative(path)
+        ):
+            return False
+    return True
+
+
+def run_pipeline(stages, targets=None, force=False, dry_run=False, state_file=None):
+    if state_file is None:
+        state_file = cache_dir(STATE_FILE)
+    state = load_state(state_file)
+
+    results = []
+    changed = set()
+    for stage in sort_stages(stages, targets):
+        name = stage["name"]
+        missing = [path for path in stage["inputs"] if not path.exists()]
+        if missing and not any(path in changed for path in missing):
+            # Raw data is not distributed, keep the outputs built from it
+            if all(path.exists() for path in stage["outputs"]):
+                results.append((name, "inputs missing, kept", 0.0))
+                continue
+            raise FileNotFoundError(
+                f"Missing inputs of stage {name}: "
+                + ", ".join(_relative(path) for path in missing)
+            )
+
+        if dry_run:
+            outdated = (
+                force
+                or any(path in changed for path in stage["inputs"])
+                or not is_up_to_date(stage, state.get(name))
+            )
+            if outdated:
+                changed.update(stage["outputs"])
+            results.append((name, "outdated" if outdated else "up to date", 0.0))
+            continue
+
+        if not force and is_up_to_date(stage, state.get(name)):
+            results.append((name, "up to date", 0.0))
+            continue
+
+        start = time.perf_counter()
+        with span(name, "pipeline"):
+            stage["function"](**stage["params"])
+        elapsed = time.perf_counter() - start
+
+        state[name] = {
+            "fingerprint": fingerprint(stage),
+            "outputs": {
+                _relative(path): content_hash(path) for path in stage["outputs"]
+            },
+        }
+        # Save after every stage so that an interrupted run keeps its progress
+        save_state(state, state_file)
+        results.append((name, "run", elapsed))
+
+    return results
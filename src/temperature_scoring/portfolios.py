@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from temperature_scoring.aggregation import COLS
+from temperature_scoring.schema import pivot_scores
+
+
+# Weighted average scores of many portfolios holding the same company universe.
+# Company scores are computed once and each portfolio is a sparse row of
+# investment values, so all portfolios are aggregated in one matrix product.
+
+PORTFOLIO_ID = "portfolio_id"
+
+
+def get_score_matrix(df_scores, score_column=COLS.TEMPERATURE_SCORE):
+    # Companies x (scope, time frame) matrix of company scores
+    df_matrix = pivot_scores(
+        df_scores[COLS.COMPANY_ID].astype(str),
+        df_scores[COLS.SCOPE],
+        df_scores[COLS.TIME_FRAME],
+        df_scores[score_column].astype(float),
+    )
+    df_matrix.index.name = COLS.COMPANY_ID
+    return df_matrix
+
+
+def get_holdings_matrix(df_holdings, company_ids):
+    # Sparse portfolios x companies matrix in coordinate format
+    portfolio_codes, portfolio_ids = pd.factorize(df_holdings[PORTFOLIO_ID])
+    company_codes = pd.Index(company_ids).get_indexer(
+        df_holdings[COLS.COMPANY_ID].astype(str)
+    )
+    values = df_holdings[COLS.INVESTMENT_VALUE].astype(float).values
+
+    # Companies without scores do not count towards portfolio weights
+    held = (company_codes >= 0) & ~np.isnan(values) & (values != 0)
+    return (
+        portfolio_codes[held],
+        company_codes[held],
+        values[held],
+        pd.Index(portfolio_ids, name=PORTFOLIO_ID),
+    )
+
+
+def get_portfolio_sums(df_scores, df_holdings, score_column=COLS.TEMPERATURE_SCORE):
+    # Weighted sums of scores and total weights of the companies with a score,
+    # portfolios x (scope, time frame)
+    df_matrix = get_score_matrix(df_scores, score_column)
+    rows, cols, values, portfolio_ids = get_holdings_matrix(
+        df_holdings, df_matrix.index
+    )
+
+    scores = df_matrix.values
+    has_score = ~np.isnan(scores)
+    scores = np.where(has_score, scores, 0)
+    n_portfolios = len(portfolio_ids)
+    weighted_sums = np.empty((n_portfolios, scores.shape[1]))
+    total_weights = np.empty((n_portfolios, scores.shape[1]))
+    for k in range(scores.shape[1]):
+        weighted_sums[:, k] = np.bincount(
+            rows, weights=values * scores[cols, k], minlength=n_portfolios
+        )
+        total_weights[:, k] = np.bincount(
+            rows, weights=values * has_score[cols, k], minlength=n_portfolios
+        )
+    return (
+        pd.DataFrame(weighted_sums, index=portfolio_ids, columns=df_matrix.columns),
+        pd.DataFrame(total_weights, index=portfolio_ids, columns=df_matrix.columns),
+    )
+
+
+def get_portfolio_scores(df_sums, df_weights, score_column=COLS.TEMPERATURE_SCORE):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        portfolio_scores = df_sums.values / df_weights.values
+
+    # Long table with one row per portfolio, scope and time frame
+    n_portfolios, n_columns = portfolio_scores.shape
+    return pd.DataFrame(
+        {
+            PORTFOLIO_ID: np.repeat(df_sums.index.values, n_columns),
+            COLS.SCOPE: np.tile(
+                df_sums.columns.get_level_values(COLS.SCOPE), n_portfolios
+            ),
+            COLS.TIME_FRAME: np.tile(
+                df_sums.columns.get_level_values(COLS.TIME_FRAME), n_portfolios
+            ),
+            score_column: portfolio_scores.ravel(),
+        }
+    )
+
+
+def score_portfolios(df_scores, df_holdings, score_column=COLS.TEMPERATURE_SCORE):
+    df_sums, df_weights = get_portfolio_sums(df_scores, df_holdings, score_column)
+    return get_portfolio_scores(df_sums, df_weights, score_column)
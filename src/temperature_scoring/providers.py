@@ -0,0 +1,11 @@
+from SBTi.configs import ColumnsConfig
+from SBTi.data.excel import ExcelProvider
+
+from temperature_scoring.cache import read_excel_cached
+
+
+class CachedExcelProvider(ExcelProvider):
+    # Same as ExcelProvider, but loads the sheets through the columnar cache
+    def __init__(self, path, config=ColumnsConfig):
+        self.data = read_excel_cached(path)
+        self.c = config
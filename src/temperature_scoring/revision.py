@@ -0,0 +1,58 @@
+import numpy as np
+
+from SBTi.interfaces import EScope
+
+from temperature_scoring.aggregation import COLS, normalize_keys
+
+
+# The SBTi tool only combines S1+S2 and S3 scores into S1+S2+S3 scores if both
+# GHG emissions are known, otherwise the S1+S2+S3 score is the S1+S2 score.
+# The revised score combines the S1+S2 and S3 scores with a fallback rule.
+
+
+def _max(s1s2, s3, ghg_s1s2, ghg_s3):
+    return np.fmax(s1s2, s3)
+
+
+def _mean(s1s2, s3, ghg_s1s2, ghg_s3):
+    with np.errstate(invalid="ignore"):
+        return np.nansum([s1s2, s3], axis=0) / np.sum(
+            [~np.isnan(s1s2), ~np.isnan(s3)], axis=0
+        )
+
+
+def _emissions(s1s2, s3, ghg_s1s2, ghg_s3):
+    # Weight by the known emissions only, use the mean if none are known
+    w1 = np.where(np.isnan(s1s2), 0, np.nan_to_num(ghg_s1s2))
+    w3 = np.where(np.isnan(s3), 0, np.nan_to_num(ghg_s3))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weighted = (w1 * np.nan_to_num(s1s2) + w3 * np.nan_to_num(s3)) / (w1 + w3)
+    return np.where(w1 + w3 > 0, weighted, _mean(s1s2, s3, ghg_s1s2, ghg_s3))
+
+
+FALLBACK_RULES = {"max": _max, "mean": _mean, "emissions": _emissions}
+
+
+def revise_combined_scores(df, fallback="max", score_column=COLS.TEMPERATURE_SCORE):
+    if fallback not in FALLBACK_RULES:
+        raise ValueError(f"Unknown fallback rule: {fallback}")
+
+    scope, time_frame = normalize_keys(df)
+    keys = [df[COLS.COMPANY_ID], time_frame]
+    scores = df[score_column]
+
+    # S1+S2 and S3 scores of the same company and time frame on every row
+    s1s2 = scores.where(scope == EScope.S1S2.name).groupby(keys).transform("max")
+    s3 = scores.where(scope == EScope.S3.name).groupby(keys).transform("max")
+
+    revise = (scope == EScope.S1S2S3.name) & (
+        df[COLS.GHG_SCOPE12].isna() | df[COLS.GHG_SCOPE3].isna()
+    )
+    revised = scores.astype(float).copy()
+    revised[revise] = FALLBACK_RULES[fallback](
+        s1s2[revise].values,
+        s3[revise].values,
+        df.loc[revise, COLS.GHG_SCOPE12].astype(float).values,
+        df.loc[revise, COLS.GHG_SCOPE3].astype(float).values,
+    )
+    return revised
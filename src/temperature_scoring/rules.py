@@ -0,0 +1,213 @@
+import itertools
+import json
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# Company-specific adjustments of target data, loaded from a JSON file. Rules
+# are applied in file order, and consecutive rules of one type are compiled
+# into a single pass: rows are matched against all their conditions with one
+# merge per set of condition columns, so adding rules does not add passes over
+# the targets. Every rule of a pass matches the targets as they are before the
+# pass, keep the overrides of one type together to share a pass.
+#
+#   filter            keep rows matching any of the conditions in "keep"
+#   remap             set the "set" values in rows matching "where",
+#                     the first matching rule wins
+#   weighted_merge    merge rows matching "where" with scopes in "scopes" into
+#                     one target per "by" group, with reduction ambitions
+#                     weighted by the base year emissions of each scope, e.g.
+#                     S1 and S2, or S1+S2 and S3
+#   coverage_scaling  scale reduction ambitions of S1+S2 targets in rows
+#                     matching "where" by the S1 and S2 coverage
+#
+# Hits are the rows each rule matches, the rows kept by a filter.
+
+RULE_TYPES = ["filter", "remap", "weighted_merge", "coverage_scaling"]
+
+
+def load_rules(rules_file):
+    with open(rules_file, encoding="utf-8") as f:
+        rules = json.load(f)["rules"]
+    for i, rule in enumerate(rules):
+        rule.setdefault("name", f"rule_{i}")
+        if rule.get("type") not in RULE_TYPES:
+            raise ValueError(f"Unknown type of rule {rule['name']}: {rule.get('type')}")
+    return rules
+
+
+def match_rows(df, conditions):
+    # Pairs of row positions and indices of the conditions they match
+    by_columns = {}
+    for i, where in enumerate(conditions):
+        by_columns.setdefault(tuple(sorted(where)), []).append(i)
+
+    pairs = [pd.DataFrame({"_row": [], "_rule": []}, dtype=int)]
+    for columns, indices in by_columns.items():
+        if not columns:
+            pairs += [
+                pd.DataFrame({"_row": np.arange(len(df)), "_rule": i}) for i in indices
+            ]
+            continue
+
+        # One lookup table for all conditions on the same columns
+        records = []
+        for i in indices:
+            values = [
+                conditions[i][column]
+                if isinstance(conditions[i][column], list)
+                else [conditions[i][column]]
+                for column in columns
+            ]
+            records += [
+                combination + (i,) for combination in itertools.product(*values)
+            ]
+        df_lookup = pd.DataFrame.from_records(records, columns=columns + ("_rule",))
+        df_lookup[list(columns)] = df_lookup[list(columns)].astype(object)
+
+        # Compare values as objects, so that 2020 matches 2020.0
+        df_keys = df[list(columns)].astype(object)
+        df_keys["_row"] = np.arange(len(df))
+        pairs.append(
+            df_keys.merge(df_lookup, on=list(columns), how="inner")[["_row", "_rule"]]
+        )
+    return pd.concat(pairs).drop_duplicates()
+
+
+def _first_matches(df, conditions):
+    # Index of the first matching condition of every row, -1 if none
+    pairs = match_rows(df, conditions)
+    first = np.full(len(df), -1)
+    pairs = pairs.sort_values("_rule").drop_duplicates("_row")
+    first[pairs["_row"].values] = pairs["_rule"].values
+    return first
+
+
+def apply_filters(df, rules):
+    conditions = [where for rule in rules for where in rule["keep"]]
+    owners = np.repeat(np.arange(len(rules)), [len(rule["keep"]) for rule in rules])
+    pairs = match_rows(df, conditions)
+
+    # Rows have to match some condition of every filter
+    matched = np.zeros((len(df), len(rules)), dtype=bool)
+    matched[pairs["_row"].values, owners[pairs["_rule"].values]] = True
+    hits = matched.sum(axis=0)
+    return df[matched.all(axis=1)], hits
+
+
+def apply_remaps(df, rules):
+    first = _first_matches(df, [rule["where"] for rule in rules])
+    df = df.copy()
+    columns = {column for rule in rules for column in rule["set"]}
+    for column in columns:
+        # Values of the first matching rule, in one assignment per column
+        values = pd.Series(
+            [rule["set"].get(column) for rule in rules] + [None], dtype=object
+        )
+        has_value = pd.Series(
+            [column in rule["set"] for rule in rules] + [False]
+        ).values[first]
+        df.loc[has_value, column] = values.values[first][has_value]
+    hits = np.bincount(first[first >= 0], minlength=len(rules))
+    return df, hits
+
+
+def _base_year_ghg(df, scopes, min_count=0):
+    # Base year emissions of all scopes together, S1+S2 being S1 and S2
+    numbers = sorted(
+        {number for scope in scopes for number in re.findall(r"\d", scope)}
+    )
+    return (
+        df[[f"base_year_ghg_s{number}" for number in numbers]]
+        .sum(axis=1, min_count=min_count)
+        .values
+    )
+
+
+def apply_weighted_merges(df, rules):
+    conditions = [{**rule["where"], "scope": rule["scopes"]} for rule in rules]
+    first = _first_matches(df, conditions)
+    merged = first >= 0
+    hits = np.bincount(first[merged], minlength=len(rules))
+    if not merged.any():
+        return df, hits
+
+    df_merged = df[merged].copy()
+    df_merged["_rule"] = first[merged]
+
+    # Weight the reduction ambitions by the base year emissions of each scope
+    scopes = df_merged["scope"]
+    ghg = np.select(
+        [scopes == scope for scope in scopes.unique()],
+        [_base_year_ghg(df_merged, [scope], 1) for scope in scopes.unique()],
+        np.nan,
+    )
+    ghg_total = pd.Series(np.nan, index=df_merged.index)
+    for rule_scopes in {tuple(rule["scopes"]) for rule in rules}:
+        is_group = df_merged["_rule"].map(lambda i: tuple(rules[i]["scopes"]))
+        is_group = (is_group == rule_scopes).values
+        ghg_total[is_group] = _base_year_ghg(df_merged[is_group], rule_scopes)
+    df_merged["reduction_ambition"] *= ghg / ghg_total
+
+    # One target per rule and group, with the values set by the rule
+    dfs = []
+    rule_by = df_merged["_rule"].map(lambda i: tuple(rules[i]["by"]))
+    for by in rule_by.unique():
+        df_group = (
+            df_merged[(rule_by == by).values]
+            .groupby(["_rule"] + list(by))
+            .agg({"reduction_ambition": "sum"})
+            .reset_index()
+        )
+        for column in {column for rule in rules for column in rule["set"]}:
+            df_group[column] = df_group["_rule"].map(
+                lambda i: rules[i]["set"].get(column, np.nan)
+            )
+        dfs.append(df_group.drop(columns="_rule"))
+    return pd.concat([df] + dfs), hits
+
+
+def apply_coverage_scaling(df, rules):
+    first = _first_matches(df, [rule["where"] for rule in rules])
+    scaled = (
+        (first >= 0)
+        & (df["scope"] == "S1+S2").values
+        & (df["coverage_s1"] * df["coverage_s2"] < 1).values
+    )
+    hits = np.bincount(first[scaled], minlength=len(rules))
+
+    # Share of the base year S1+S2 emissions covered by the target
+    df = df.copy()
+    df_scaled = df[scaled]
+    df.loc[scaled, "reduction_ambition"] *= (
+        df_scaled["coverage_s1"] * df_scaled["base_year_ghg_s1"]
+        + df_scaled["coverage_s2"] * df_scaled["base_year_ghg_s2"]
+    ) / df_scaled[["base_year_ghg_s1", "base_year_ghg_s2"]].sum(axis=1)
+    return df, hits
+
+
+APPLY_RULES = {
+    "filter": apply_filters,
+    "remap": apply_remaps,
+    "weighted_merge": apply_weighted_merges,
+    "coverage_scaling": apply_coverage_scaling,
+}
+
+
+def apply_rules(df, rules):
+    # Runs of rules of one type are applied together in file order and share
+    # the time of their pass
+    report = []
+    for rule_type, run in itertools.groupby(rules, key=lambda rule: rule["type"]):
+        run = list(run)
+        start = time.perf_counter()
+        df, hits = APPLY_RULES[rule_type](df, run)
+        elapsed = time.perf_counter() - start
+        report += [
+            {"rule": rule["name"], "type": rule_type, "hits": n, "seconds": elapsed}
+            for rule, n in zip(run, hits)
+        ]
+    return df, pd.DataFrame(report, columns=["rule", "type", "hits", "seconds"])
@@ -0,0 +1,137 @@
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+
+# Keys of score tables shared by the stages: scopes, time frames and target
+# types as categoricals of fixed categories, whose codes index score matrices.
+# Scopes and time frames are read from SBTi enums, names, values and labels
+# alike, and converted once per distinct value instead of once per row. The
+# SBTi tool is not imported, so that plotting does not load it.
+
+SCOPE_ORDER = ["S1S2", "S3", "S1S2S3"]
+TIME_FRAME_ORDER = ["short", "mid", "long"]
+TARGET_TYPES = ["Absolute", "Intensity"]
+
+SCOPE_DTYPE = CategoricalDtype(SCOPE_ORDER, ordered=True)
+TIME_FRAME_DTYPE = CategoricalDtype(TIME_FRAME_ORDER, ordered=True)
+TARGET_TYPE_DTYPE = CategoricalDtype(TARGET_TYPES)
+
+# Labels of plots, scope labels are also the values of EScope
+SCOPE_LABELS = {"S1S2": "S1+S2", "S3": "S3", "S1S2S3": "S1+S2+S3"}
+TIME_FRAME_LABELS = {
+    time_frame: time_frame.capitalize() for time_frame in TIME_FRAME_ORDER
+}
+
+_SCOPE_KEYS = {scope: scope for scope in SCOPE_ORDER}
+_SCOPE_KEYS.update({label: scope for scope, label in SCOPE_LABELS.items()})
+
+
+def _scope_key(value):
+    # EScope members by name
+    if isinstance(value, Enum):
+        value = value.name
+    return _SCOPE_KEYS.get(value)
+
+
+def _time_frame_key(value):
+    # ETimeFrames members by value, names and labels in any case
+    if isinstance(value, Enum):
+        value = value.value
+    return str(value).lower()
+
+
+def _target_type_key(value):
+    # As validated by the engine, e.g. "abs", "Absolute" or "Int"
+    value = str(value).lower()
+    if "abs" in value:
+        return "Absolute"
+    if "int" in value:
+        return "Intensity"
+    return value
+
+
+def _to_categorical(values, get_key, dtype, kind):
+    values = pd.Series(values)
+    if values.dtype == dtype:
+        return values
+
+    codes, uniques = pd.factorize(values)
+    keys = [get_key(value) for value in uniques]
+    unknown = [
+        str(value) for value, key in zip(uniques, keys) if key not in dtype.categories
+    ]
+    if unknown:
+        raise ValueError(f"Unknown {kind}: {', '.join(unknown)}")
+
+    unique_codes = pd.Categorical(keys, dtype=dtype).codes
+    codes = np.where(codes >= 0, unique_codes[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(codes, dtype=dtype),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def to_scope(values):
+    return _to_categorical(values, _scope_key, SCOPE_DTYPE, "scopes")
+
+
+def to_time_frame(values):
+    return _to_categorical(values, _time_frame_key, TIME_FRAME_DTYPE, "time frames")
+
+
+def to_target_type(values):
+    return _to_categorical(values, _target_type_key, TARGET_TYPE_DTYPE, "target types")
+
+
+def key_codes(scope, time_frame):
+    # Position of each (scope, time frame) in the order of score columns,
+    # -1 for missing keys
+    scope_codes = to_scope(scope).cat.codes.values.astype(np.int64)
+    time_frame_codes = to_time_frame(time_frame).cat.codes.values.astype(np.int64)
+    codes = scope_codes * len(TIME_FRAME_ORDER) + time_frame_codes
+    return np.where((scope_codes >= 0) & (time_frame_codes >= 0), codes, -1)
+
+
+def score_columns(codes):
+    # (scope, time frame) of key codes
+    n_time_frames = len(TIME_FRAME_ORDER)
+    return [
+        (SCOPE_ORDER[code // n_time_frames], TIME_FRAME_ORDER[code % n_time_frames])
+        for code in codes
+    ]
+
+
+def pivot_scores(keys, scope, time_frame, values, dtype=np.float64):
+    # Keys x (scope, time frame) matrix filled by integer codes instead of
+    # pivoting strings, with the scored scopes and time frames as columns
+    row_codes, row_keys = pd.factorize(pd.Series(keys))
+    codes = key_codes(scope, time_frame)
+    valid = (row_codes >= 0) & (codes >= 0)
+    row_codes, codes = row_codes[valid], codes[valid]
+
+    n_columns = len(SCOPE_ORDER) * len(TIME_FRAME_ORDER)
+    if pd.Index(row_codes * n_columns + codes).has_duplicates:
+        raise ValueError("Scores must be unique per scope and time frame")
+
+    matrix = np.full((len(row_keys), n_columns), np.nan, dtype=dtype)
+    matrix[row_codes, codes] = np.asarray(values, dtype=dtype)[valid]
+    columns = np.unique(codes)
+    return pd.DataFrame(
+        matrix[:, columns],
+        index=pd.Index(row_keys),
+        columns=pd.MultiIndex.from_tuples(
+            score_columns(columns), names=["scope", "time_frame"]
+        ),
+    )
+
+
+def score_labels(columns):
+    # "S1+S2 Short" labels of (scope, time frame) columns
+    return [
+        f"{SCOPE_LABELS[scope]} {TIME_FRAME_LABELS[time_frame]}"
+        for scope, time_frame in columns
+    ]
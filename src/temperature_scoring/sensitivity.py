@@ -0,0 +1,278 @@
+import numpy as np
+import pandas as pd
+
+from SBTi.interfaces import ETimeFrames
+
+from temperature_scoring.aggregation import SCOPE_NAMES
+from temperature_scoring.engine import (
+    C,
+    COLS,
+    COVERAGE_THRESHOLDS,
+    GRID_SCOPES,
+    combine_scopes,
+    prepare_scoring_data,
+    score_targets,
+)
+from temperature_scoring.portfolios import PORTFOLIO_ID, get_holdings_matrix
+from temperature_scoring.revision import FALLBACK_RULES
+
+
+# Monte Carlo sensitivity of company and portfolio scores. Targets are parsed,
+# validated, grouped and matched to the regression model once. The draws only
+# perturb the numbers entering the scores, so all scenarios are scored together
+# as arrays of draws x companies x time frames x scopes.
+
+# Standard deviations of the perturbations, relative for the reduction
+# ambitions and emissions, absolute for the coverage and the fallback score.
+# Missing S3 emissions are filled with the S3 estimate with probability
+# estimate_share.
+DEFAULT_UNCERTAINTY = {
+    "reduction_ambition": 0.1,
+    "coverage": 0.05,
+    "ghg": 0.1,
+    "ghg_estimate": 0.3,
+    "estimate_share": 0.5,
+    "fallback_score": 0.2,
+}
+
+PERCENTILES = [5, 50, 95]
+
+
+def _to_array(data, column, shape):
+    return data[column].astype(float).values.reshape(shape)
+
+
+def get_scoring_setup(
+    df_targets,
+    df_fundamental,
+    df_portfolio,
+    time_frames=list(ETimeFrames),
+    fallback_score=C.FALLBACK_SCORE,
+    model=4,
+    current_year=None,
+):
+    data = prepare_scoring_data(
+        df_targets,
+        df_fundamental,
+        df_portfolio,
+        time_frames,
+        GRID_SCOPES,
+        model,
+        current_year,
+    )
+
+    # Companies x time frames x scopes arrays
+    company_ids = pd.Index(data[COLS.COMPANY_ID].unique(), name=COLS.COMPANY_ID)
+    time_frame_values = [time_frame.value for time_frame in time_frames]
+    scope_values = [scope.value for scope in GRID_SCOPES]
+    index = pd.MultiIndex.from_product(
+        [company_ids, time_frame_values, scope_values],
+        names=[COLS.COMPANY_ID, COLS.TIME_FRAME, COLS.SCOPE],
+    )
+    data = data.drop_duplicates([COLS.COMPANY_ID, COLS.TIME_FRAME, COLS.SCOPE])
+    data = data.set_index(index.names).reindex(index)
+    shape = (len(company_ids), len(time_frame_values), len(scope_values))
+
+    # Reduction ambitions before the scaling by low coverage, so that the
+    # coverage can be perturbed as well
+    coverage = np.full(shape, np.nan)
+    threshold = np.full(shape, np.inf)
+    for scope, (coverage_column, scope_threshold) in COVERAGE_THRESHOLDS.items():
+        k = scope_values.index(scope)
+        coverage[:, :, k] = _to_array(data, coverage_column, shape)[:, :, k]
+        threshold[:, :, k] = scope_threshold
+    ambition = _to_array(data, COLS.REDUCTION_AMBITION, shape)
+    scale = np.where(coverage < threshold, coverage, 1)
+    ambition = np.divide(ambition, scale, out=ambition.copy(), where=scale > 0)
+
+    companies = data.groupby(level=COLS.COMPANY_ID, sort=False).first()
+
+    # The engine keeps only the company fields of the SBTi tool, so the S3
+    # estimates are taken from the fundamental data
+    ghg_s3_estimate = np.full(len(company_ids), np.nan)
+    if "ghg_s3_estimate" in df_fundamental:
+        estimates = df_fundamental.groupby(df_fundamental[COLS.COMPANY_ID].astype(str))[
+            "ghg_s3_estimate"
+        ].first()
+        ghg_s3_estimate = (
+            estimates.reindex(company_ids.astype(str)).astype(float).values
+        )
+    return {
+        "company_ids": company_ids,
+        "company_names": companies[COLS.COMPANY_NAME].values,
+        "time_frames": time_frame_values,
+        "scopes": [SCOPE_NAMES[value] for value in scope_values],
+        "param": _to_array(data, COLS.REGRESSION_PARAM, shape),
+        "intercept": _to_array(data, COLS.REGRESSION_INTERCEPT, shape),
+        "years": _to_array(data, COLS.END_YEAR, shape)
+        - _to_array(data, COLS.BASE_YEAR, shape),
+        "ambition": ambition,
+        "coverage": coverage,
+        "threshold": threshold,
+        "sbti_validated": companies[COLS.SBTI_VALIDATED]
+        .fillna(False)
+        .astype(bool)
+        .values[:, None, None],
+        "ghg_s1s2": companies[COLS.GHG_SCOPE12].astype(float).values,
+        "ghg_s3": companies[COLS.GHG_SCOPE3].astype(float).values,
+        "ghg_s3_estimate": ghg_s3_estimate,
+        "fallback_score": fallback_score,
+    }
+
+
+def _perturb(rng, values, sd, n_draws, relative=True):
+    noise = sd * rng.standard_normal((n_draws,) + np.shape(values))
+    return values * (1 + noise) if relative else values + noise
+
+
+def draw_inputs(setup, n_draws, uncertainty=None, seed=None):
+    uncertainty = {**DEFAULT_UNCERTAINTY, **(uncertainty or {})}
+    rng = np.random.default_rng(seed)
+
+    ambition = np.clip(
+        _perturb(rng, setup["ambition"], uncertainty["reduction_ambition"], n_draws),
+        0,
+        1,
+    )
+    coverage = np.clip(
+        _perturb(rng, setup["coverage"], uncertainty["coverage"], n_draws, False),
+        0,
+        1,
+    )
+    ghg_s1s2 = np.clip(
+        _perturb(rng, setup["ghg_s1s2"], uncertainty["ghg"], n_draws), 0, None
+    )
+    ghg_s3 = np.clip(
+        _perturb(rng, setup["ghg_s3"], uncertainty["ghg"], n_draws), 0, None
+    )
+
+    # Fill some of the missing S3 emissions with perturbed estimates
+    estimate = np.clip(
+        _perturb(rng, setup["ghg_s3_estimate"], uncertainty["ghg_estimate"], n_draws),
+        0,
+        None,
+    )
+    use_estimate = np.isnan(ghg_s3) & (
+        rng.random(ghg_s3.shape) < uncertainty["estimate_share"]
+    )
+    ghg_s3 = np.where(use_estimate, estimate, ghg_s3)
+
+    fallback_score = _perturb(
+        rng, setup["fallback_score"], uncertainty["fallback_score"], n_draws, False
+    )
+    return {
+        "ambition": ambition,
+        "coverage": coverage,
+        "ghg_s1s2": ghg_s1s2,
+        "ghg_s3": ghg_s3,
+        "fallback_score": fallback_score,
+    }
+
+
+def base_inputs(setup):
+    # A single draw without perturbations
+    return {
+        key: np.asarray(setup[key])[None]
+        for key in ["ambition", "coverage", "ghg_s1s2", "ghg_s3", "fallback_score"]
+    }
+
+
+def score_draws(setup, inputs, combined_fallback=None):
+    # Scores of all draws, companies, time frames and scopes at once
+    scale = np.where(inputs["coverage"] < setup["threshold"], inputs["coverage"], 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annual_reduction_rate = inputs["ambition"] * scale / setup["years"]
+    annual_reduction_rate = np.where(setup["years"] > 0, annual_reduction_rate, np.nan)
+    fallback_score = inputs["fallback_score"][:, None, None, None]
+    scores = score_targets(
+        setup["param"],
+        setup["intercept"],
+        annual_reduction_rate,
+        setup["sbti_validated"],
+        fallback_score,
+    )[0]
+
+    # Combine S1+S2 and S3 scores with the emissions of each draw
+    ghg_s1s2 = inputs["ghg_s1s2"][:, :, None]
+    ghg_s3 = inputs["ghg_s3"][:, :, None]
+    s1s2, s3, s1s2s3 = scores[..., 0], scores[..., 1], scores[..., 2]
+    s1s2s3 = combine_scopes(s1s2, s3, ghg_s1s2, ghg_s3, s1s2s3)
+    if combined_fallback is not None:
+        missing = np.isnan(ghg_s1s2) | np.isnan(ghg_s3)
+        revised = FALLBACK_RULES[combined_fallback](s1s2, s3, ghg_s1s2, ghg_s3)
+        s1s2s3 = np.where(missing, revised, s1s2s3)
+    scores[..., 2] = s1s2s3
+    return scores
+
+
+def score_portfolio_draws(setup, scores, df_holdings):
+    rows, cols, values, portfolio_ids = get_holdings_matrix(
+        df_holdings, setup["company_ids"].astype(str)
+    )
+    holdings = np.zeros((len(portfolio_ids), len(setup["company_ids"])))
+    np.add.at(holdings, (rows, cols), values)
+
+    # Weighted averages over the companies with a score
+    has_score = ~np.isnan(scores)
+    weighted_sums = np.einsum(
+        "pc,dc...->dp...", holdings, np.where(has_score, scores, 0)
+    )
+    total_weights = np.einsum("pc,dc...->dp...", holdings, has_score)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return weighted_sums / total_weights, portfolio_ids
+
+
+def summarize_draws(setup, base_scores, scores, index, percentiles=PERCENTILES):
+    # Long table of the point estimates and percentile bands
+    n_rows = base_scores[0].size
+    df = pd.DataFrame(
+        {
+            COLS.TIME_FRAME: np.tile(
+                np.repeat(setup["time_frames"], len(setup["scopes"])),
+                n_rows // len(setup["time_frames"]) // len(setup["scopes"]),
+            ),
+            COLS.SCOPE: np.tile(setup["scopes"], n_rows // len(setup["scopes"])),
+            COLS.TEMPERATURE_SCORE: base_scores[0].ravel(),
+            "mean": scores.mean(axis=0).ravel(),
+        }
+    )
+    bands = np.percentile(scores, percentiles, axis=0)
+    for percentile, band in zip(percentiles, bands):
+        df[f"p{percentile}"] = band.ravel()
+    return pd.concat([index.reset_index(drop=True), df], axis=1)
+
+
+def run_sensitivity(
+    setup,
+    df_holdings=None,
+    n_draws=1000,
+    uncertainty=None,
+    percentiles=PERCENTILES,
+    seed=None,
+    combined_fallback=None,
+):
+    base_scores = score_draws(setup, base_inputs(setup), combined_fallback)
+    scores = score_draws(
+        setup, draw_inputs(setup, n_draws, uncertainty, seed), combined_fallback
+    )
+
+    n_rows = len(setup["time_frames"]) * len(setup["scopes"])
+    df_index = pd.DataFrame(
+        {
+            COLS.COMPANY_ID: np.repeat(setup["company_ids"].values, n_rows),
+            COLS.COMPANY_NAME: np.repeat(setup["company_names"], n_rows),
+        }
+    )
+    df_companies = summarize_draws(setup, base_scores, scores, df_index, percentiles)
+    if df_holdings is None:
+        return df_companies, None
+
+    base_portfolio_scores, portfolio_ids = score_portfolio_draws(
+        setup, base_scores, df_holdings
+    )
+    portfolio_scores = score_portfolio_draws(setup, scores, df_holdings)[0]
+    df_index = pd.DataFrame({PORTFOLIO_ID: np.repeat(portfolio_ids.values, n_rows)})
+    df_portfolios = summarize_draws(
+        setup, base_portfolio_scores, portfolio_scores, df_index, percentiles
+    )
+    return df_companies, df_portfolios
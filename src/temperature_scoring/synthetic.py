@@ -0,0 +1,271 @@
+import numpy as np
+import pandas as pd
+
+
+# Synthetic input data. make_synthetic_data covers the edge cases of the
+# target protocol for engine parity checks, make_input_data mimics the raw
+# input workbook and emission data at any number of companies for benchmarks.
+
+ISIC_CODES = ["B061", "B072", "C1520", "C231", "C241", "D351", "G4791", "H491", "K641"]
+END_YEARS = [2025, 2030, 2035, 2040, 2050]
+HISTORY_YEARS = list(range(2015, 2022))
+EMISSION_DATA_YEARS = [2018, 2019, 2020, 2021]
+
+
+def make_synthetic_data(n_companies=200, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, share):
+        return pd.Series(values).where(rng.random(len(values)) >= share)
+
+    company_ids = np.arange(1, n_companies + 1)
+    df_fundamental = pd.DataFrame(
+        {
+            "company_name": [f"Company {i}" for i in company_ids],
+            "company_id": company_ids,
+            "isic": with_missing(
+                rng.choice(
+                    ["B061", "C231", "C241", "D351", "H491", "G471"], n_companies
+                ),
+                0.1,
+            ),
+            "ghg_s1s2": with_missing(rng.lognormal(10, 2, n_companies), 0.1),
+            "ghg_s3": with_missing(rng.lognormal(11, 2, n_companies), 0.3),
+            "company_revenue": rng.lognormal(8, 1, n_companies),
+            "company_market_cap": rng.lognormal(8, 1, n_companies),
+        }
+    )
+    df_portfolio = pd.DataFrame(
+        {
+            "company_name": df_fundamental["company_name"],
+            "company_id": company_ids,
+            "company_isin": [f"PL{i:010d}" for i in company_ids],
+            "investment_value": 1,
+            "engagement_target": np.nan,
+        }
+    )
+
+    # Several targets per company, including S1/S2 pairs that can be combined
+    n_targets = 4 * n_companies
+    base_year = rng.integers(2010, 2022, n_targets)
+    coverage = rng.choice([0.5, 0.8, 0.95, 1.0], (3, n_targets))
+    df_targets = pd.DataFrame(
+        {
+            "company_name": "",
+            "company_id": rng.choice(company_ids, n_targets),
+            "target_type": rng.choice(
+                ["Absolute", "absolute", "Intensity", "intensity"], n_targets
+            ),
+            "intensity_metric": with_missing(
+                rng.choice(["Revenue", "Product", "Power", "Oil", "Other"], n_targets),
+                0.3,
+            ),
+            "scope": rng.choice(["S1", "S2", "S1+S2", "S3", "S1+S2+S3"], n_targets),
+            "coverage_s1": with_missing(coverage[0], 0.1),
+            "coverage_s2": with_missing(
+                np.where(rng.random(n_targets) < 0.5, coverage[0], coverage[1]), 0.1
+            ),
+            "coverage_s3": with_missing(coverage[2], 0.2),
+            "reduction_ambition": rng.choice(
+                [0.1, 0.25, 0.3, 0.5, 0.9, 1.0], n_targets
+            ),
+            "base_year": base_year,
+            "end_year": base_year + rng.integers(1, 45, n_targets),
+            "start_year": with_missing(base_year + rng.integers(0, 3, n_targets), 0.7),
+            "base_year_ghg_s1": with_missing(rng.lognormal(9, 2, n_targets), 0.2),
+            "base_year_ghg_s2": with_missing(rng.lognormal(8, 2, n_targets), 0.2),
+            "base_year_ghg_s3": with_missing(rng.lognormal(11, 2, n_targets), 0.3),
+            "achieved_reduction": with_missing(
+                rng.choice([0.0, 0.5, 1.0], n_targets), 0.5
+            ),
+        }
+    )
+    df_targets["company_name"] = "Company " + df_targets["company_id"].astype(str)
+
+    # Duplicate some S1 targets as S2 targets with the same identifying fields
+    df_s2 = df_targets[df_targets["scope"] == "S1"].sample(frac=0.5, random_state=seed)
+    df_s2 = df_s2.assign(scope="S2", reduction_ambition=0.4)
+    df_targets = pd.concat([df_targets, df_s2], ignore_index=True)
+
+    return df_targets, df_fundamental, df_portfolio
+
+
+def make_emission_history(rng, n_companies):
+    # Annual S1 and S2 emissions with a random trend, years x companies
+    ghg = {}
+    for scope, mean in [("s1", 9), ("s2", 8.5)]:
+        level = rng.lognormal(mean, 2.5, n_companies)
+        trend = rng.normal(-0.02, 0.05, n_companies)
+        noise = rng.normal(0, 0.03, (len(HISTORY_YEARS), n_companies))
+        years = np.arange(len(HISTORY_YEARS))[:, None] - len(HISTORY_YEARS) + 1
+        ghg[scope] = (level * np.exp(trend * years + noise)).round(2)
+    ghg["s3"] = (ghg["s1"] + ghg["s2"]) * rng.lognormal(1.5, 1, n_companies)
+    return ghg
+
+
+def make_targets(rng, company_ids, base_year, ghg, history_index):
+    n_companies = len(company_ids)
+
+    # One to three S1+S2 or S1+S2+S3 targets per company with distinct end
+    # years and growing ambitions
+    n_targets = rng.integers(1, 4, n_companies)
+    owners = np.repeat(np.arange(n_companies), n_targets)
+    end_years = np.concatenate(
+        [np.sort(rng.choice(END_YEARS, n, replace=False)) for n in n_targets]
+    )
+    ambition = np.concatenate(
+        [np.sort(rng.uniform(0.1, 1.0, n)).round(2) for n in n_targets]
+    )
+    scope = np.where(rng.random(len(owners)) < 0.75, "S1+S2", "S1+S2+S3")
+
+    # Some companies have an S3 target or separate S1 and S2 targets
+    s3_owners = np.flatnonzero(rng.random(n_companies) < 0.3)
+    pair_owners = np.flatnonzero(rng.random(n_companies) < 0.05)
+    owners = np.concatenate([owners, s3_owners, pair_owners, pair_owners])
+    end_years = np.concatenate(
+        [end_years, np.full(len(s3_owners) + 2 * len(pair_owners), 2030)]
+    )
+    ambition = np.concatenate(
+        [ambition, rng.uniform(0.1, 0.5, len(owners) - len(ambition)).round(2)]
+    )
+    scope = np.concatenate(
+        [
+            scope,
+            np.full(len(s3_owners), "S3"),
+            np.full(len(pair_owners), "S1"),
+            np.full(len(pair_owners), "S2"),
+        ]
+    )
+
+    n_targets = len(owners)
+    base_years = base_year[owners]
+    row = history_index[owners]
+    coverage = rng.choice([1.0, 1.0, 1.0, 0.9, 0.6], (2, n_targets))
+    is_intensity = rng.random(n_targets) < 0.05
+    df = pd.DataFrame(
+        {
+            "company_name": [f"Company {i}" for i in company_ids[owners]],
+            "company_id": company_ids[owners],
+            "target_type": np.where(is_intensity, "Intensity", "Absolute"),
+            "intensity_metric": np.where(is_intensity, "Revenue", None),
+            "scope": scope,
+            "coverage_s1": np.where(scope == "S3", np.nan, coverage[0]),
+            "coverage_s2": np.where(scope == "S3", np.nan, coverage[1]),
+            "coverage_s3": np.where(np.char.find(scope, "3") >= 0, 1.0, np.nan),
+            "reduction_ambition": ambition,
+            "base_year": base_years,
+            "end_year": end_years,
+            "start_year": np.nan,
+            "base_year_ghg_s1": ghg["s1"][row, owners],
+            "base_year_ghg_s2": ghg["s2"][row, owners],
+            "base_year_ghg_s3": ghg["s3"][row, owners],
+            "achieved_reduction": np.nan,
+        }
+    )
+    df["base_year_ghg_s1s2"] = df["base_year_ghg_s1"] + df["base_year_ghg_s2"]
+
+    # Missing base year emissions, which cleaning fills from other targets
+    for column in ["base_year_ghg_s1", "base_year_ghg_s2", "base_year_ghg_s3"]:
+        df[column] = df[column].where(rng.random(n_targets) >= 0.1)
+
+    # Invalid rows without a scope and duplicated rows
+    df["scope"] = df["scope"].where(rng.random(n_targets) >= 0.01)
+    df = pd.concat([df, df.sample(frac=0.02, random_state=rng.integers(1 << 31))])
+    return df.sort_values(["company_id", "end_year"], kind="stable").reset_index(
+        drop=True
+    )
+
+
+def make_input_data(n_companies=100, seed=0):
+    # Sheets of the raw input workbook and the cleaned emission data
+    rng = np.random.default_rng(seed)
+    company_ids = np.arange(1, n_companies + 1)
+    company_names = [f"Company {i}" for i in company_ids]
+    isins = [f"PL{i:010d}" for i in company_ids]
+
+    ghg = make_emission_history(rng, n_companies)
+    base_year = rng.integers(HISTORY_YEARS[0], HISTORY_YEARS[-1] + 1, n_companies)
+    history_index = base_year - HISTORY_YEARS[0]
+    last = len(HISTORY_YEARS) - 1
+
+    df_targets = make_targets(rng, company_ids, base_year, ghg, history_index)
+
+    ghg_s1s2 = (ghg["s1"][last] + ghg["s2"][last]).round(0)
+    ghg_s3 = np.where(rng.random(n_companies) < 0.4, ghg["s3"][last], np.nan)
+    ghg_s3_factor = rng.uniform(1.5, 12, n_companies).round(1)
+    columns = [
+        "industry_level_1",
+        "industry_level_2",
+        "industry_level_3",
+        "industry_level_4",
+        "sector",
+    ]
+    df_fundamental = pd.DataFrame(
+        {
+            "company_name": company_names,
+            "company_id": company_ids,
+            "isic": rng.choice(ISIC_CODES, n_companies),
+            "country": "Poland",
+            "region": "Europe",
+            **{column: np.nan for column in columns},
+            "ghg_s1s2": ghg_s1s2,
+            "ghg_s3": ghg_s3,
+            "base_year_ghg_s1s2": ghg["s1"][history_index, company_ids - 1]
+            + ghg["s2"][history_index, company_ids - 1],
+            "base_year_ghg_s3": np.nan,
+            "ghg_s3_factor": ghg_s3_factor,
+            "ghg_s3_estimate": (ghg_s1s2 * ghg_s3_factor).round(1),
+            "base_year_ghg_s3_estimate": np.nan,
+            "company_revenue": rng.lognormal(8, 1.5, n_companies).round(1),
+            "company_market_cap": rng.lognormal(8, 1.5, n_companies).round(2),
+            "company_enterprise_value": np.nan,
+            "company_total_assets": rng.lognormal(22, 1.5, n_companies).round(0),
+            "company_cash_equivalents": np.nan,
+            "company_free_float": np.nan,
+        }
+    )
+
+    df_portfolio = pd.DataFrame(
+        {
+            "company_name": company_names,
+            "company_id": company_ids,
+            "company_isin": isins,
+            "investment_value": rng.lognormal(0, 1, n_companies).round(2),
+            "engagement_target": np.nan,
+        }
+    )
+
+    # Emission data by company and scope as written by clean_emission_data
+    scopes = {
+        "S1": ghg["s1"],
+        "S1+S2": ghg["s1"] + ghg["s2"],
+        "S2": ghg["s2"],
+        "S3": ghg["s3"],
+    }
+    years = [HISTORY_YEARS.index(year) for year in EMISSION_DATA_YEARS]
+    df_emissions = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "company_code": [f"COMPANY{i}" for i in company_ids],
+                    "scope": scope,
+                    "company_name": company_names,
+                    "ISIN": isins,
+                    "sector": "",
+                    **{
+                        str(year): values[i].round(2)
+                        for year, i in zip(EMISSION_DATA_YEARS, years)
+                    },
+                }
+            )
+            for scope, values in scopes.items()
+        ]
+    )
+    df_emissions = df_emissions.sort_values(["company_code", "scope"], kind="stable")
+
+    return {
+        "target_data": df_targets,
+        "fundamental_data": df_fundamental,
+        "portfolio_data": df_portfolio,
+        "emission_data": df_emissions.reset_index(drop=True),
+    }
@@ -0,0 +1,138 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+# Wall time, CPU time, peak RSS and row counts of stages and their steps,
+# written as a Chrome trace (chrome://tracing, Perfetto). Tracing is off unless
+# a script enables it or TEMPERATURE_SCORING_TRACE names a trace file, then
+# spans cost only a few clock reads.
+
+TRACE_ENV = "TEMPERATURE_SCORING_TRACE"
+
+_events = []
+_enabled = False
+_start = time.perf_counter()
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def count_rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict) and value:
+        if all(isinstance(df, pd.DataFrame) for df in value.values()):
+            return sum(len(df) for df in value.values())
+    return None
+
+
+def enable_tracing():
+    global _enabled
+    _enabled = True
+    _events.clear()
+
+
+def disable_tracing():
+    global _enabled
+    _enabled = False
+
+
+@contextlib.contextmanager
+def span(name, category="step", **args):
+    # The yielded dict collects arguments of the span, e.g. its rows
+    record = dict(args)
+    if not _enabled:
+        yield record
+        return
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        _events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (wall - _start) * 1e6,
+                "dur": (time.perf_counter() - wall) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {
+                    **record,
+                    "cpu_seconds": time.process_time() - cpu,
+                    "peak_rss_mb": peak_rss_mb(),
+                },
+            }
+        )
+
+
+def traced(name=None, category="stage"):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__, category) as record:
+                result = function(*args, **kwargs)
+                rows = count_rows(result)
+                if rows is not None:
+                    record["rows"] = rows
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def get_spans():
+    return pd.DataFrame(
+        [
+            {
+                "name": event["name"],
+                "category": event["cat"],
+                "seconds": event["dur"] / 1e6,
+                **event["args"],
+            }
+            for event in _events
+        ]
+    )
+
+
+def write_trace(trace_file):
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    trace = {"traceEvents": list(_events), "displayTimeUnit": "ms"}
+    with open(trace_file, "w", encoding="utf-8") as f:
+        json.dump(trace, f, default=str)
+
+
+@contextlib.contextmanager
+def trace_run(trace_file):
+    enable_tracing()
+    try:
+        yield
+    finally:
+        write_trace(trace_file)
+        disable_tracing()
+
+
+if os.environ.get(TRACE_ENV):
+    enable_tracing()
+    atexit.register(write_trace, os.environ[TRACE_ENV])
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+# Annual emission pathways of all companies at once. Emissions are matrices of
+# years x companies, with NaN where a company has no data point.
+
+
+def get_emission_points(df_history, df_targets, end_year=None):
+    # Align historical and target emissions (year x company) on one year grid
+    companies = df_targets.columns.union(df_history.columns, sort=False)
+    first_year = min(df_history.index.min(), df_targets.index.min())
+    last_year = max(df_history.index.max(), df_targets.index.max(), end_year or 0)
+    years = np.arange(first_year, last_year + 1)
+
+    history = df_history.reindex(index=years, columns=companies).to_numpy(float)
+    targets = df_targets.reindex(index=years, columns=companies).to_numpy(float)
+
+    # Anchor the pathways to the last historical year: until then historical
+    # data replace the targets, e.g. the base year points
+    has_history = ~np.isnan(history)
+    last_historical = np.where(
+        has_history.any(axis=0),
+        len(years) - 1 - np.argmax(has_history[::-1], axis=0),
+        -1,
+    )
+    is_historical = np.arange(len(years))[:, None] <= last_historical
+    return years, companies, np.where(is_historical, history, targets)
+
+
+def interpolate(years, points, method="linear", extend=True):
+    n_years, n_companies = points.shape
+    is_point = ~np.isnan(points)
+    positions = np.arange(n_years)[:, None]
+
+    # Previous and next data point of every year and company
+    previous = np.maximum.accumulate(np.where(is_point, positions, -1), axis=0)
+    following = np.minimum.accumulate(
+        np.where(is_point, positions, n_years)[::-1], axis=0
+    )[::-1]
+    has_previous = previous >= 0
+    has_following = following < n_years
+    previous = np.clip(previous, 0, n_years - 1)
+    following = np.clip(following, 0, n_years - 1)
+
+    companies = np.arange(n_companies)[None, :]
+    v0 = points[previous, companies]
+    v1 = points[following, companies]
+    t0 = years[previous]
+    t1 = years[following]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = (years[:, None] - t0) / (t1 - t0)
+        values = v0 + (v1 - v0) * share
+        if method == "geometric":
+            # Constant annual reduction rates, linear towards zero emissions
+            geometric = v0 * (v1 / v0) ** share
+            values = np.where((v0 > 0) & (v1 > 0), geometric, values)
+        elif method != "linear":
+            raise ValueError(f"Unknown interpolation method: {method}")
+
+    values = np.where(has_previous & has_following, values, np.nan)
+    if extend:
+        # Emissions stay at the level of the last target once it is reached
+        values = np.where(has_previous & ~has_following, v0, values)
+    return np.where(is_point, points, values)
+
+
+def calculate_trajectories(
+    df_history, df_targets, method="linear", end_year=None, extend=True
+):
+    years, companies, points = get_emission_points(df_history, df_targets, end_year)
+    trajectories = interpolate(years, points, method, extend)
+    df = pd.DataFrame(trajectories, index=years, columns=companies)
+    df.index.name = "year"
+    return df
+
+
+def cumulative_emissions(df_trajectories, start_year):
+    # Years without a trajectory do not count towards the cumulative emissions
+    values = df_trajectories.to_numpy(float)
+    in_window = (df_trajectories.index >= start_year)[:, None]
+    cumulative = np.nancumsum(np.where(in_window, values, 0), axis=0)
+    return pd.DataFrame(
+        cumulative, index=df_trajectories.index, columns=df_trajectories.columns
+    )
+
+
+def linear_budgets(df_trajectories, start_year, net_zero_year):
+    # Cumulative emissions of a straight line from the start year emissions
+    # down to zero in the net-zero year
+    start_emissions = df_trajectories.loc[start_year]
+    return start_emissions * (net_zero_year - start_year + 1) / 2
+
+
+def calculate_carbon_budgets(
+    df_trajectories, start_year, end_year, budgets=None, net_zero_year=2050
+):
+    df_trajectories = df_trajectories.loc[:end_year]
+    if budgets is None:
+        budgets = linear_budgets(df_trajectories, start_year, net_zero_year)
+    budgets = pd.Series(budgets, index=df_trajectories.columns, dtype=float)
+
+    df_cumulative = cumulative_emissions(df_trajectories, start_year)
+    exceeded = df_cumulative.to_numpy() > budgets.to_numpy()[None, :]
+    exhausted_year = np.where(
+        exceeded.any(axis=0), df_cumulative.index[np.argmax(exceeded, axis=0)], np.nan
+    )
+
+    df = pd.DataFrame(
+        {
+            "cumulative_emissions": df_cumulative.iloc[-1],
+            "budget": budgets,
+            "overshoot": df_cumulative.iloc[-1] - budgets,
+            "budget_exhausted_year": exhausted_year,
+        }
+    )
+    df.index.name = "company"
+    return df
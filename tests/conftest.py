@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The scripts are not packaged, tests import them next to the sources
+root = Path(__file__).resolve().parents[1]
+for path in [root / "src", root / "scripts"]:
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
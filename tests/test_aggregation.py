@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from SBTi.interfaces import ETimeFrames, EScope
+from SBTi.portfolio_aggregation import PortfolioAggregationMethod
+from SBTi.temperature_score import TemperatureScore
+
+from temperature_scoring.aggregation import COLS, aggregate_scores
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import calculate_temperature_scores
+
+
+TIME_FRAMES = [ETimeFrames.SHORT, ETimeFrames.MID, ETimeFrames.LONG]
+SCOPES = [EScope.S1S2, EScope.S1S2S3, EScope.S3]
+
+
+@pytest.fixture(scope="module")
+def df_scores():
+    dfs = pd.read_excel(
+        data_dir("clean", "input_data_with_estimates.xlsx"), sheet_name=None
+    )
+    df_portfolio = dfs["portfolio_data"].merge(
+        dfs["fundamental_data"].drop(columns="company_name"), on="company_id"
+    )
+    df = calculate_temperature_scores(
+        dfs["target_data"], dfs["fundamental_data"], df_portfolio, TIME_FRAMES, SCOPES
+    )
+    # Values of every company, so that all methods can aggregate
+    rng = np.random.default_rng(0)
+    for column in [
+        COLS.MARKET_CAP,
+        COLS.COMPANY_ENTERPRISE_VALUE,
+        COLS.CASH_EQUIVALENTS,
+    ]:
+        values = df.groupby(COLS.COMPANY_ID)[COLS.COMPANY_ID].transform(
+            lambda ids: rng.lognormal(8, 1)
+        )
+        df[column] = df[column].fillna(values)
+    df[COLS.INVESTMENT_VALUE] = df[COLS.COMPANY_REVENUE] / 10
+    return df
+
+
+def sbti_aggregation(df, method):
+    temperature_score = TemperatureScore(
+        time_frames=TIME_FRAMES, scopes=SCOPES, aggregation_method=method
+    )
+    return temperature_score.aggregate_scores(df.copy()).dict()
+
+
+@pytest.mark.parametrize("method", list(PortfolioAggregationMethod))
+def test_aggregation_matches_sbti(df_scores, method):
+    expected = sbti_aggregation(df_scores, method)
+    df_agg, df_contributions = aggregate_scores(df_scores, method, contributions=True)
+
+    for time_frame in df_agg.columns:
+        for scope in df_agg.index:
+            aggregation = expected[time_frame][scope]["all"]
+            assert df_agg.loc[scope, time_frame] == pytest.approx(aggregation["score"])
+
+            df_expected = pd.DataFrame(aggregation["contributions"])
+            df_actual = df_contributions[
+                (df_contributions[COLS.TIME_FRAME] == time_frame)
+                & (df_contributions[COLS.SCOPE] == scope)
+            ]
+            columns = list(df_expected.columns)
+            pd.testing.assert_frame_equal(
+                df_actual[columns]
+                .sort_values(COLS.COMPANY_ID, kind="stable")
+                .reset_index(drop=True),
+                df_expected.sort_values(COLS.COMPANY_ID, kind="stable").reset_index(
+                    drop=True
+                ),
+                check_dtype=False,
+            )
+
+
+@pytest.mark.parametrize(
+    "method", [PortfolioAggregationMethod.MOTS, PortfolioAggregationMethod.EOTS]
+)
+def test_missing_values_raise_like_sbti(df_scores, method):
+    df = df_scores.copy()
+    df.loc[df.index[0], COLS.MARKET_CAP] = np.nan
+    df.loc[df.index[0], COLS.COMPANY_ENTERPRISE_VALUE] = np.nan
+    company_name = re.escape(df.loc[df.index[0], COLS.COMPANY_NAME])
+    with pytest.raises(ValueError, match=company_name):
+        sbti_aggregation(df, method)
+    with pytest.raises(ValueError, match=company_name):
+        aggregate_scores(df, method)
@@ -0,0 +1,93 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from calculate_scores import (
+    SCOPES,
+    TIME_FRAMES,
+    calculate_score_backtest,
+    finish_company_scores,
+    get_aggregated_scores,
+    get_holdings,
+    get_investment_values,
+)
+from temperature_scoring.backtest import get_snapshot, split_snapshots
+from temperature_scoring.cache import read_excel_cached
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import calculate_temperature_scores
+from temperature_scoring.outputs import read_table, write_table
+from temperature_scoring.portfolios import score_portfolios
+
+
+REPO_CLEAN_DIR = data_dir("clean")
+AGGREGATION_METHODS = ["Average", "Emissions"]
+
+
+@pytest.fixture
+def tmp_data(tmp_path, monkeypatch):
+    # Outputs and caches of the tests stay in the temporary directory
+    (tmp_path / "data" / "clean").mkdir(parents=True)
+    for name in ["input_data.xlsx", "emission_data.csv"]:
+        shutil.copy(REPO_CLEAN_DIR / name, tmp_path / "data" / "clean" / name)
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    return tmp_path
+
+
+def score_year(year):
+    # A single snapshot scored on its own with a scalar current year
+    input_file = data_dir("clean", "input_data.xlsx")
+    df_targets, df_fundamental, df_portfolio = get_snapshot(
+        read_excel_cached(input_file, "target_data"),
+        read_excel_cached(input_file, "fundamental_data"),
+        read_excel_cached(input_file, "portfolio_data"),
+        pd.read_csv(data_dir("clean", "emission_data.csv")),
+        year,
+    )
+    df_portfolio = df_portfolio.merge(
+        df_fundamental.drop(columns="company_name"), on="company_id", how="left"
+    )
+    df_portfolio["investment_value"] = get_investment_values(
+        df_portfolio, AGGREGATION_METHODS[0]
+    )
+    df = calculate_temperature_scores(
+        df_targets,
+        df_fundamental,
+        df_portfolio,
+        time_frames=TIME_FRAMES,
+        scopes=SCOPES,
+        current_year=year,
+    )
+    df = finish_company_scores(df, revised_combined_score=True)
+    df_scores = score_portfolios(
+        get_aggregated_scores(df, revised_combined_score=True),
+        get_holdings(df_portfolio, AGGREGATION_METHODS),
+    )
+    df_scores["temperature_score"] = df_scores["temperature_score"].round(2)
+    return split_snapshots(df), df_scores
+
+
+def test_stacked_years_match_single_years(tmp_data):
+    years = [2019, 2021]
+    scores_file, company_file = calculate_score_backtest(
+        "",
+        years,
+        revised_combined_score=True,
+        aggregation_methods=AGGREGATION_METHODS,
+    )
+    df_backtest = read_table(company_file)
+    df_portfolios = pd.read_csv(scores_file)
+    assert sorted(df_backtest["year"].unique()) == years
+
+    for year in years:
+        df, df_scores = score_year(year)
+        # Same round trip through Arrow as the backtest output
+        write_table(df, tmp_data / f"scores_{year}.arrow")
+        df_expected = read_table(tmp_data / f"scores_{year}.arrow")
+        df_actual = df_backtest[df_backtest["year"] == year].reset_index(drop=True)
+        pd.testing.assert_frame_equal(df_actual, df_expected)
+
+        df_actual = df_portfolios[df_portfolios["year"] == year]
+        df_actual = df_actual.drop(columns="year").reset_index(drop=True)
+        df_expected = df_scores[df_actual.columns].reset_index(drop=True)
+        pd.testing.assert_frame_equal(df_actual, df_expected, check_dtype=False)
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from benchmark import run_benchmarks
+
+
+@pytest.mark.parametrize("caller_dir", [True, False])
+def test_project_dir_restored(tmp_path, monkeypatch, caller_dir):
+    if caller_dir:
+        monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    else:
+        monkeypatch.delenv("TEMPERATURE_SCORING_DIR", raising=False)
+
+    df = run_benchmarks(sizes=[10], memory=False, max_plot_size=0)
+    assert (df["n_companies"] == 10).all()
+    assert os.environ.get("TEMPERATURE_SCORING_DIR") == (
+        str(tmp_path) if caller_dir else None
+    )
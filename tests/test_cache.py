@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from temperature_scoring.cache import cache_dir, read_excel_cached
+
+
+@pytest.fixture(autouse=True)
+def tmp_data(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+
+
+def write_workbook(path, values):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({"value": values}).to_excel(path, sheet_name="data", index=False)
+
+
+def test_same_name_workbooks_keep_their_caches(tmp_path):
+    first = tmp_path / "a" / "input_data.xlsx"
+    second = tmp_path / "b" / "input_data.xlsx"
+    write_workbook(first, [1, 2])
+    write_workbook(second, [3])
+
+    assert read_excel_cached(first, "data")["value"].tolist() == [1, 2]
+    assert read_excel_cached(second, "data")["value"].tolist() == [3]
+    assert len(list(cache_dir().iterdir())) == 2
+
+    # A new version of a workbook replaces its own cache only
+    write_workbook(first, [4])
+    assert read_excel_cached(first, "data")["value"].tolist() == [4]
+    assert read_excel_cached(second, "data")["value"].tolist() == [3]
+    assert len(list(cache_dir().iterdir())) == 2
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clean_data import clean_input_data, filter_targets
+
+
+@pytest.fixture
+def raw_file(tmp_path, monkeypatch):
+    # Data and caches of the tests stay in the temporary directory
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    df_targets = pd.DataFrame(
+        {
+            "company_id": [1, 1, 2, 3, 3, 1],
+            "scope": [" S1+S2", "S3 ", np.nan, "S1+S2", "S1+S2", " S1+S2"],
+            "reduction_ambition": [0.5, 0.3, 0.4, np.nan, 0.2, 0.5],
+            "base_year": [2019, 2019, 2020, 2020, 2020, 2019],
+            "end_year": [2030, 2030, 2030, 2030, 2040, 2030],
+            "base_year_ghg_s1": [10.0, np.nan, 5.0, 7.0, 7.0, 10.0],
+            "base_year_ghg_s2": [2.0, np.nan, 1.0, 1.0, np.nan, 2.0],
+            "base_year_ghg_s3": [np.nan, 30.0, np.nan, np.nan, 20.0, np.nan],
+        }
+    )
+    df_fundamental = pd.DataFrame(
+        {
+            "company_id": [1, 2, 3],
+            "ghg_s3": [np.nan, 4.0, np.nan],
+            "base_year_ghg_s3": [30.0, np.nan, 20.0],
+            "ghg_s3_estimate": [35.0, 5.0, np.nan],
+        }
+    )
+    df_portfolio = pd.DataFrame({"company_id": [1, 2, 3]})
+
+    path = tmp_path / "raw.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        df_targets.to_excel(writer, sheet_name="Target Data", index=False)
+        df_fundamental.to_excel(writer, sheet_name="Fundamental Data", index=False)
+        df_portfolio.to_excel(writer, sheet_name="Portfolio Data", index=False)
+    return path
+
+
+def read_clean_file(path):
+    dfs = pd.read_excel(path, sheet_name=None)
+    return {key: df.reset_index(drop=True) for key, df in dfs.items()}
+
+
+def test_filter_targets_without_valid_rows():
+    df = pd.DataFrame(
+        {
+            "scope": [np.nan],
+            "reduction_ambition": [0.5],
+            "base_year": [2019],
+            "end_year": [2030],
+        },
+        index=[4],
+    )
+    df, invalid_rows = filter_targets(df)
+    assert df.empty
+    assert invalid_rows == [6]
+
+
+@pytest.mark.parametrize("use_estimates", [False, True])
+@pytest.mark.parametrize("chunk_size", [1, 2, 4, 100])
+def test_chunks_match_single_read(raw_file, tmp_path, chunk_size, use_estimates):
+    expected_file = tmp_path / "expected.xlsx"
+    clean_input_data(raw_file, expected_file, use_estimates)
+    # Paths may be strings, as before tracing
+    clean_file = tmp_path / "clean.xlsx"
+    clean_input_data(raw_file, str(clean_file), use_estimates, chunk_size)
+
+    expected = read_clean_file(expected_file)
+    result = read_clean_file(clean_file)
+    assert list(result) == list(expected)
+    for key in expected:
+        pd.testing.assert_frame_equal(result[key], expected[key])
+
+    # Invalid rows are dropped and scopes stripped
+    assert expected["target_data"]["scope"].tolist() == ["S1+S2", "S3", "S1+S2"]
+    assert expected["fundamental_data"]["company_id"].tolist() == [1, 3]
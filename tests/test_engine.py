@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import SBTi
+from SBTi.interfaces import ETimeFrames, EScope
+from SBTi.temperature_score import TemperatureScore
+
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import calculate_temperature_scores
+from temperature_scoring.synthetic import make_synthetic_data
+
+
+TIME_FRAMES = [ETimeFrames.SHORT, ETimeFrames.MID, ETimeFrames.LONG]
+SCOPES = [EScope.S1S2, EScope.S1S2S3, EScope.S3]
+
+
+def _normalize(series):
+    # Compare numbers exactly, treat None and NaN as equal
+    try:
+        return pd.to_numeric(series).astype(float).fillna(np.inf)
+    except (ValueError, TypeError):
+        return series.map(lambda x: "<NA>" if pd.isnull(x) else str(x))
+
+
+class _DataFrameProvider(SBTi.data.ExcelProvider):
+    def __init__(self, df_targets, df_fundamental):
+        self.data = {"target_data": df_targets, "fundamental_data": df_fundamental}
+        self.c = SBTi.configs.ColumnsConfig
+
+
+def sbti_scores(df_targets, df_fundamental, df_portfolio):
+    return TemperatureScore(time_frames=TIME_FRAMES, scopes=SCOPES).calculate(
+        data=SBTi.utils.get_data(
+            [_DataFrameProvider(df_targets, df_fundamental)],
+            SBTi.utils.dataframe_to_portfolio(df_portfolio.copy()),
+        )
+    )
+
+
+def read_input_data(suffix):
+    dfs = pd.read_excel(data_dir("clean", f"input_data{suffix}.xlsx"), sheet_name=None)
+    return dfs["target_data"], dfs["fundamental_data"], dfs["portfolio_data"]
+
+
+@pytest.fixture(
+    params=["_example", "", "_with_estimates", 0, 1, 2],
+    ids=lambda param: f"seed {param}" if isinstance(param, int) else f"input{param}",
+)
+def input_data(request):
+    # Input workbooks of the repository and synthetic data of edge cases
+    if isinstance(request.param, int):
+        return make_synthetic_data(seed=request.param)
+    return read_input_data(request.param)
+
+
+def test_engine_matches_sbti(input_data):
+    df_targets, df_fundamental, df_portfolio = input_data
+    df_expected = sbti_scores(df_targets, df_fundamental, df_portfolio)
+    df_actual = calculate_temperature_scores(
+        df_targets, df_fundamental, df_portfolio, TIME_FRAMES, SCOPES
+    )
+
+    assert list(df_actual.columns) == list(df_expected.columns)
+    assert len(df_actual) == len(df_expected)
+    df_expected = df_expected.reset_index(drop=True)
+    df_actual = df_actual.reset_index(drop=True)
+    mismatches = {
+        column: (_normalize(df_actual[column]) != _normalize(df_expected[column])).sum()
+        for column in df_expected.columns
+    }
+    assert not {column: n for column, n in mismatches.items() if n}
@@ -0,0 +1,74 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculate_scores import calculate_score, calculate_score_incremental
+from temperature_scoring.config import data_dir
+
+
+REPO_CLEAN_DIR = data_dir("clean")
+
+VARIANTS = {
+    "": dict(revised_combined_score=True, aggregation_methods=["Average"]),
+    "_with_estimates": dict(
+        revised_combined_score=False,
+        aggregation_methods=["Average", "Emissions", "Revenue", "Market Cap"],
+    ),
+}
+
+
+@pytest.fixture(params=list(VARIANTS))
+def suffix(request, tmp_path, monkeypatch):
+    # Outputs, states and caches of the tests stay in the temporary directory
+    input_file = f"input_data{request.param}.xlsx"
+    (tmp_path / "data" / "clean").mkdir(parents=True)
+    shutil.copy(REPO_CLEAN_DIR / input_file, tmp_path / "data" / "clean" / input_file)
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    return request.param
+
+
+def read_outputs(files):
+    return [
+        pd.read_csv(path) if path.suffix == ".csv" else pd.read_feather(path)
+        for path in files
+    ]
+
+
+def assert_outputs_equal(actual, expected):
+    for df_actual, df_expected in zip(actual, expected):
+        pd.testing.assert_frame_equal(df_actual, df_expected, check_dtype=False)
+
+
+def change_input_data(suffix):
+    # Changed, removed and added targets, changed emissions and a company
+    # dropped from the portfolio
+    input_file = data_dir("clean", f"input_data{suffix}.xlsx")
+    dfs = pd.read_excel(input_file, sheet_name=None)
+    df = dfs["target_data"]
+    ids = df["company_id"].unique()
+    df.loc[df["company_id"] == ids[0], "reduction_ambition"] *= 0.5
+    df_new = df[df["company_id"] == ids[2]].assign(end_year=lambda df: df.end_year + 5)
+    dfs["target_data"] = pd.concat([df[df["company_id"] != ids[1]], df_new])
+    df = dfs["fundamental_data"]
+    df.loc[df["company_id"] == ids[3], "ghg_s3"] = np.nan
+    df.loc[df.index[5], "ghg_s1s2"] *= 3
+    dfs["portfolio_data"] = dfs["portfolio_data"].iloc[1:]
+    with pd.ExcelWriter(input_file) as writer:
+        for sheet_name, df in dfs.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def test_incremental_matches_full_rescore(suffix):
+    params = VARIANTS[suffix]
+    files = calculate_score(suffix, engine="numpy", **params)
+    expected = read_outputs(files)
+    assert calculate_score_incremental(suffix, **params) == files
+    assert_outputs_equal(read_outputs(files), expected)
+
+    change_input_data(suffix)
+    calculate_score_incremental(suffix, **params)
+    actual = read_outputs(files)
+    calculate_score(suffix, engine="numpy", **params)
+    assert_outputs_equal(actual, read_outputs(files))
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from SBTi.interfaces import EScope, ETimeFrames
+
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import calculate_temperature_scores
+from temperature_scoring.outputs import FORMATS, read_output, write_output
+from temperature_scoring.schema import to_target_type
+
+
+REPO_CLEAN_DIR = data_dir("clean")
+
+
+@pytest.fixture(autouse=True)
+def tmp_data(tmp_path, monkeypatch):
+    (tmp_path / "data" / "clean").mkdir(parents=True)
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_ids_read_back_alike_in_all_formats(format):
+    # The engine returns company ids as strings
+    df = pd.DataFrame(
+        {
+            "company_id": ["1", "2", "10"],
+            "portfolio_id": ["Average", "Emissions", "Average"],
+            "temperature_score": [1.5, np.nan, 3.2],
+        }
+    )
+    write_output(df, "output_data", [format])
+    df = read_output("output_data")
+    assert df["company_id"].tolist() == [1, 2, 10]
+    assert df["portfolio_id"].tolist() == ["Average", "Emissions", "Average"]
+
+
+def read_back(df, format):
+    write_output(df, "output_data", [format])
+    return read_output("output_data")
+
+
+def assert_read_back_alike(df):
+    # Types may differ, e.g. Excel reads whole floats as integers
+    expected = read_back(df, "xlsx")
+    for format in FORMATS:
+        pd.testing.assert_frame_equal(
+            read_back(df, format), expected, check_dtype=False
+        )
+
+
+def test_tables_read_back_alike_in_all_formats():
+    df = pd.DataFrame(
+        {
+            "company_id": ["1", "2", "3"],
+            "scope": [EScope.S1S2, EScope.S3, np.nan],
+            "time_frame": [ETimeFrames.SHORT, ETimeFrames.MID, ETimeFrames.LONG],
+            "target_type": to_target_type(["abs", "Int", np.nan]),
+            "sector": ["nan", "Energy", ""],
+            "industry_level_1": ["nan", "nan", "nan"],
+            "temperature_score": [1.5, np.nan, 3.2],
+            "sbti_validated": [True, False, True],
+        }
+    )
+    assert_read_back_alike(df)
+
+
+def test_scores_read_back_alike_in_all_formats():
+    dfs = pd.read_excel(REPO_CLEAN_DIR / "input_data_example.xlsx", sheet_name=None)
+    df = calculate_temperature_scores(
+        dfs["target_data"],
+        dfs["fundamental_data"],
+        dfs["portfolio_data"].assign(investment_value=1),
+        time_frames=list(ETimeFrames),
+        scopes=[EScope.S1S2, EScope.S3, EScope.S1S2S3],
+    )
+    df["target_type"] = to_target_type(df["target_type"])
+    assert_read_back_alike(df)
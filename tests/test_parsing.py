@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from temperature_scoring.parsing import parse_numbers
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("1 234", 1234.0),
+        ("1\xa0234\xa0567", 1234567.0),
+        ("1\u202f234", 1234.0),
+        ("12,5", 12.5),
+        ("1\xa0234,56", 1234.56),
+        ("0,001", 0.001),
+        ("-1 234,5", -1234.5),
+        ("-0,5", -0.5),
+        (" 42 ", 42.0),
+        (7, 7.0),
+        (-3.25, -3.25),
+    ],
+)
+def test_numbers(value, expected):
+    assert parse_numbers([value])[0] == expected
+
+
+@pytest.mark.parametrize("value", ["x", "X", "-", "", "   ", "\xa0", None, np.nan])
+def test_placeholders_are_missing(value):
+    assert np.isnan(parse_numbers([value])[0])
+
+
+def test_keeps_shape_of_mixed_values():
+    values = np.array([["1 000,5", 2, "x"], [None, "-3", 4.5]], dtype=object)
+    result = parse_numbers(values)
+    assert result.shape == (2, 3)
+    np.testing.assert_array_equal(result, [[1000.5, 2.0, np.nan], [np.nan, -3.0, 4.5]])
+
+
+def test_invalid_numbers_raise():
+    with pytest.raises(ValueError):
+        parse_numbers(["12 abc"])
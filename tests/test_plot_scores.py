@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plot_scores import (
+    SCORE_BANDS,
+    export_figures,
+    get_pages,
+    get_plot_data,
+    get_score_summary,
+    plot_all_temperature_scores,
+)
+from temperature_scoring.config import data_dir, plots_dir
+from temperature_scoring.outputs import write_output
+
+
+COMPANIES = {
+    "delta": ("Energy", 1.2),
+    "Alpha": ("Energy", 1.8),
+    "charlie": ("Energy", 3.2),
+    "Bravo": ("Utilities", np.nan),
+    "echo": (None, 2.5),
+}
+
+
+@pytest.fixture
+def tmp_data(tmp_path, monkeypatch):
+    # Company scores of two scopes and time frames with a portfolio
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    data_dir("clean").mkdir(parents=True)
+    plots_dir().mkdir()
+
+    df = pd.DataFrame(
+        [
+            {
+                "company_name": name,
+                "sector": sector,
+                "scope": scope,
+                "time_frame": time_frame,
+                "temperature_score": score,
+                "revised_temperature_score": score,
+            }
+            for name, (sector, score) in COMPANIES.items()
+            for scope in ["S1S2", "S1S2S3"]
+            for time_frame in ["SHORT", "LONG"]
+        ]
+    )
+    write_output(df, "output_data")
+    pd.DataFrame(
+        {"scope": ["S1S2", "S1S2S3"], "short": [2.0, 2.1], "long": [2.2, 2.3]}
+    ).to_csv(data_dir("clean", "portfolio_scores_Average.csv"), index=False)
+    return tmp_path
+
+
+def test_plot_data(tmp_data):
+    df = get_plot_data(page_by="sector")
+    # Companies sorted regardless of case, then the portfolios
+    assert list(df.index) == ["Alpha", "Bravo", "charlie", "delta", "echo", "Average"]
+    assert df.attrs["n_companies"] == 5
+    assert df.attrs["groups"]["Bravo"] == "Utilities"
+    assert df.shape[1] == 4
+    assert df.loc["Average"].tolist() == pytest.approx([2.0, 2.2, 2.1, 2.3])
+
+
+def test_pages_by_group(tmp_data):
+    df = get_plot_data(page_by="sector")
+    pages = get_pages(df, 2, df.attrs["groups"])
+    assert [title for title, _ in pages] == [
+        "Energy 1/2",
+        "Energy 2/2",
+        "Other",
+        "Utilities",
+    ]
+    assert [list(companies) for _, companies in pages] == [
+        ["Alpha", "charlie"],
+        ["delta"],
+        ["echo"],
+        ["Bravo"],
+    ]
+
+
+def test_pages_without_groups(tmp_data):
+    df = get_plot_data()
+    pages = get_pages(df, 2)
+    assert [title for title, _ in pages] == ["1/3", "2/3", "3/3"]
+    assert sum(len(companies) for _, companies in pages) == 5
+    # A single page has no title
+    [(title, companies)] = get_pages(df, 5)
+    assert title is None
+    assert list(companies) == list(df.index[:5])
+
+
+def test_score_summary(tmp_data):
+    df_summary = get_score_summary(get_plot_data())
+    assert list(df_summary.index) == SCORE_BANDS + ["No score"]
+    # Portfolios are not counted, 3.2 is in the last band
+    expected = [1, 1, 1, 0, 1, 1]
+    for column in df_summary.columns:
+        assert df_summary[column].tolist() == expected
+
+
+def test_plot_data_only(tmp_data):
+    file_stem = plots_dir("temperature_scores")
+    old_page = plots_dir("temperature_scores_page009.png")
+    old_page.touch()
+
+    files = plot_all_temperature_scores(
+        [{}], formats=["none"], page_size=2, page_by="sector", summary=True
+    )
+    assert sorted(files) == sorted(
+        [
+            file_stem.with_suffix(".csv"),
+            plots_dir("temperature_scores_summary.csv"),
+            plots_dir("temperature_scores_pages.csv"),
+        ]
+    )
+    assert not old_page.exists()
+
+    df_pages = pd.read_csv(plots_dir("temperature_scores_pages.csv"), index_col=0)
+    assert df_pages["page"].tolist() == [1, 1, 2, 3, 4]
+    assert df_pages.loc["Bravo", "title"] == "Utilities"
+
+
+def test_unknown_formats():
+    with pytest.raises(ValueError, match="Unknown plot formats: gif"):
+        export_figures({}, ["png", "gif"])
+    assert export_figures({}, ["none"]) == []
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from SBTi.interfaces import ETimeFrames
+
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import GRID_SCOPES, calculate_temperature_scores
+from temperature_scoring.revision import revise_combined_scores
+
+
+def legacy_revise(df):
+    # Pivot/melt revision of calculate_scores before the grouped transforms
+    df = df.copy()
+    df["scope"] = df["scope"].astype(str)
+    df_revised = (
+        df[
+            [
+                "company_id",
+                "time_frame",
+                "ghg_s1s2",
+                "ghg_s3",
+                "scope",
+                "temperature_score",
+            ]
+        ]
+        .pivot(
+            index=["company_id", "time_frame", "ghg_s1s2", "ghg_s3"],
+            columns="scope",
+            values="temperature_score",
+        )
+        .reset_index()
+    )
+    missing_ghg = df_revised["ghg_s1s2"].isna() | df_revised["ghg_s3"].isna()
+    df_revised.loc[missing_ghg, "S1S2S3"] = df_revised.loc[
+        missing_ghg, ["S1S2", "S3"]
+    ].max(axis=1)
+    df_revised = df_revised.melt(
+        id_vars=["company_id", "time_frame"],
+        value_vars=["S1S2", "S3", "S1S2S3"],
+        var_name="scope",
+        value_name="revised_temperature_score",
+    )
+    df = df.merge(df_revised, on=["company_id", "time_frame", "scope"], how="left")
+    return df["revised_temperature_score"]
+
+
+@pytest.fixture(scope="module")
+def df_scores():
+    dfs = pd.read_excel(data_dir("clean", "input_data.xlsx"), sheet_name=None)
+    df_portfolio = dfs["portfolio_data"].assign(investment_value=1)
+    return calculate_temperature_scores(
+        dfs["target_data"],
+        dfs["fundamental_data"],
+        df_portfolio,
+        time_frames=list(ETimeFrames),
+        scopes=GRID_SCOPES,
+    )
+
+
+def test_max_matches_legacy(df_scores):
+    expected = legacy_revise(df_scores)
+    actual = revise_combined_scores(df_scores, "max")
+    np.testing.assert_allclose(actual.values, expected.values)
+
+
+def test_max_matches_legacy_with_known_emissions(df_scores):
+    # Companies with both emissions known keep their S1+S2+S3 scores
+    df = df_scores.copy()
+    company_ids = df["company_id"].unique()
+    known = df["company_id"].isin(company_ids[::2])
+    df.loc[known, "ghg_s1s2"] = 100.0
+    df.loc[known, "ghg_s3"] = 300.0
+    expected = legacy_revise(df)
+    actual = revise_combined_scores(df, "max")
+    np.testing.assert_allclose(actual.values, expected.values)
+    assert (actual[known] == df.loc[known, "temperature_score"]).all()
+
+
+def combined_scores(s1s2, s3, ghg_s1s2, ghg_s3, s1s2s3=3.2):
+    return pd.DataFrame(
+        {
+            "company_id": "A",
+            "time_frame": "SHORT",
+            "scope": ["S1S2", "S3", "S1S2S3"],
+            "temperature_score": [s1s2, s3, s1s2s3],
+            "ghg_s1s2": ghg_s1s2,
+            "ghg_s3": ghg_s3,
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "fallback, ghg_s1s2, ghg_s3, expected",
+    [
+        ("max", np.nan, np.nan, 3.0),
+        ("mean", np.nan, np.nan, 2.5),
+        ("mean", 100.0, np.nan, 2.5),
+        # Only the S1+S2 emissions are known, so they carry all the weight
+        ("emissions", 100.0, np.nan, 2.0),
+        ("emissions", np.nan, 300.0, 3.0),
+        # No emissions known, fall back to the mean
+        ("emissions", np.nan, np.nan, 2.5),
+        # Both known, the engine's combined score is kept
+        ("emissions", 100.0, 300.0, 3.2),
+        ("mean", 100.0, 300.0, 3.2),
+    ],
+)
+def test_fallback_rules(fallback, ghg_s1s2, ghg_s3, expected):
+    df = combined_scores(2.0, 3.0, ghg_s1s2, ghg_s3)
+    revised = revise_combined_scores(df, fallback)
+    assert revised.tolist() == pytest.approx([2.0, 3.0, expected])
+
+
+@pytest.mark.parametrize("fallback", ["mean", "emissions"])
+def test_fallback_with_missing_score(fallback):
+    # A missing S3 score leaves the S1+S2 score only
+    df = combined_scores(2.0, np.nan, 100.0, np.nan)
+    revised = revise_combined_scores(df, fallback)
+    assert revised.iloc[2] == pytest.approx(2.0)
+
+
+def test_unknown_fallback():
+    with pytest.raises(ValueError, match="Unknown fallback rule"):
+        revise_combined_scores(combined_scores(2.0, 3.0, np.nan, np.nan), "min")
@@ -0,0 +1,152 @@
+import pandas as pd
+import pytest
+
+from process_targets import TARGET_RULES_FILE
+from temperature_scoring.config import data_dir
+from temperature_scoring.rules import apply_rules, load_rules
+
+
+# The adjustments hardcoded in process_targets before the rules engine
+
+AZOTY_BY = [
+    "company_name",
+    "base_year",
+    "end_year",
+    "base_year_ghg_s1",
+    "base_year_ghg_s2",
+    "coverage_s1",
+    "coverage_s2",
+]
+
+
+def legacy_filter(df):
+    return df[(df["target_type"] == "Absolute") | (df["company_name"] == "Grupa Kęty")]
+
+
+def legacy_remap(df):
+    df = df.copy()
+    df.loc[(df["company_name"] == "Enea") & (df["scope"] == "S1"), "scope"] = "S1+S2"
+    return df
+
+
+def legacy_merge(df):
+    df_azoty = df[df["company_name"] == "Grupa Azoty"].copy()
+    for scope in ["S1", "S2"]:
+        is_scope = df_azoty["scope"] == scope
+        df_azoty.loc[is_scope, "reduction_ambition"] *= df_azoty.loc[
+            is_scope, f"base_year_ghg_{scope.lower()}"
+        ] / df_azoty.loc[is_scope, ["base_year_ghg_s1", "base_year_ghg_s2"]].sum(axis=1)
+    df_azoty = (
+        df_azoty.groupby(AZOTY_BY).agg({"reduction_ambition": "sum"}).reset_index()
+    )
+    df_azoty["scope"] = "S1+S2"
+    return pd.concat([df, df_azoty])
+
+
+def legacy_coverage_scaling(df):
+    df = df.copy()
+    reduced_coverage = (df["scope"] == "S1+S2") & (
+        df["coverage_s1"] * df["coverage_s2"] < 1
+    )
+    base_year_ghg_s1s2 = df[["base_year_ghg_s1", "base_year_ghg_s2"]].sum(axis=1)
+    df.loc[reduced_coverage, "reduction_ambition"] *= (
+        df.loc[reduced_coverage, "coverage_s1"]
+        * df.loc[reduced_coverage, "base_year_ghg_s1"]
+        + df.loc[reduced_coverage, "coverage_s2"]
+        * df.loc[reduced_coverage, "base_year_ghg_s2"]
+    ) / base_year_ghg_s1s2[reduced_coverage]
+    return df
+
+
+LEGACY_STEPS = {
+    "filter": legacy_filter,
+    "remap": legacy_remap,
+    "weighted_merge": legacy_merge,
+    "coverage_scaling": legacy_coverage_scaling,
+}
+
+
+@pytest.fixture(scope="module", params=["", "_with_estimates"])
+def df_targets(request):
+    return pd.read_excel(
+        data_dir("clean", f"input_data{request.param}.xlsx"), sheet_name="target_data"
+    )
+
+
+def assert_targets_equal(df_actual, df_expected):
+    columns = list(df_expected.columns)
+    sort = lambda df: df[columns].sort_values(columns).reset_index(drop=True)
+    pd.testing.assert_frame_equal(sort(df_actual), sort(df_expected))
+
+
+@pytest.mark.parametrize("rule", load_rules(TARGET_RULES_FILE), ids=lambda r: r["type"])
+def test_rule_matches_legacy_step(df_targets, rule):
+    df, df_report = apply_rules(df_targets, [rule])
+    assert_targets_equal(df, LEGACY_STEPS[rule["type"]](df_targets))
+    assert df_report["hits"].iloc[0] > 0
+
+
+def test_rules_file_matches_legacy_adjustments(df_targets):
+    df, df_report = apply_rules(df_targets, load_rules(TARGET_RULES_FILE))
+    df_expected = df_targets
+    for rule_type in LEGACY_STEPS:
+        df_expected = LEGACY_STEPS[rule_type](df_expected)
+    assert_targets_equal(df, df_expected)
+    assert list(df_report["rule"]) == [
+        rule["name"] for rule in load_rules(TARGET_RULES_FILE)
+    ]
+
+
+def test_filter_hits_count_kept_rows(df_targets):
+    rule = load_rules(TARGET_RULES_FILE)[0]
+    df, df_report = apply_rules(df_targets, [rule])
+    assert df_report["hits"].iloc[0] == len(df) < len(df_targets)
+
+
+def test_rules_apply_in_file_order():
+    df = pd.DataFrame(
+        {
+            "company_name": ["A", "A"],
+            "scope": ["S1", "S3"],
+            "target_type": ["Absolute", "Absolute"],
+        }
+    )
+    remap = {
+        "name": "remap",
+        "type": "remap",
+        "where": {"scope": "S1"},
+        "set": {"scope": "S1+S2"},
+    }
+    keep = {"name": "keep", "type": "filter", "keep": [{"scope": "S1+S2"}]}
+    df_result, df_report = apply_rules(df, [remap, keep])
+    assert df_result["scope"].tolist() == ["S1+S2"]
+    df_result, _ = apply_rules(df, [keep, remap])
+    assert df_result.empty
+
+
+def test_weighted_merge_of_combined_scopes():
+    df = pd.DataFrame(
+        {
+            "company_name": ["A", "A"],
+            "scope": ["S1+S2", "S3"],
+            "reduction_ambition": [0.5, 0.2],
+            "base_year": [2020, 2020],
+            "base_year_ghg_s1": [10.0, 10.0],
+            "base_year_ghg_s2": [30.0, 30.0],
+            "base_year_ghg_s3": [60.0, 60.0],
+        }
+    )
+    rule = {
+        "name": "merge",
+        "type": "weighted_merge",
+        "where": {"company_name": "A"},
+        "scopes": ["S1+S2", "S3"],
+        "by": ["company_name", "base_year"],
+        "set": {"scope": "S1+S2+S3"},
+    }
+    df_result, df_report = apply_rules(df, [rule])
+    merged = df_result[df_result["scope"] == "S1+S2+S3"]
+    assert merged["reduction_ambition"].tolist() == pytest.approx(
+        [0.5 * 0.4 + 0.2 * 0.6]
+    )
+    assert df_report["hits"].tolist() == [2]
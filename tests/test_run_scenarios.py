@@ -0,0 +1,84 @@
+import json
+import shutil
+
+import pytest
+
+from run_scenarios import run_scenarios
+from temperature_scoring.config import data_dir, plots_dir
+
+
+REPO_CLEAN_DIR = data_dir("clean")
+
+
+@pytest.fixture
+def tmp_data(tmp_path, monkeypatch):
+    # Outputs and caches of the tests stay in the temporary directory
+    (tmp_path / "data" / "clean").mkdir(parents=True)
+    shutil.copy(REPO_CLEAN_DIR / "input_data.xlsx", tmp_path / "data" / "clean")
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    return tmp_path
+
+
+def write_manifest(path, scenarios):
+    manifest_file = path / "scenarios.json"
+    manifest_file.write_text(json.dumps({"scenarios": scenarios}))
+    return manifest_file
+
+
+def test_plot_data_only(tmp_data):
+    manifest_file = write_manifest(
+        tmp_data, [{"name": "base", "engine": "numpy", "plot": True}]
+    )
+    df = run_scenarios(manifest_file, workers=1, plot_formats=["none"])
+    assert df.loc["base", "status"] == "ok"
+    assert str(plots_dir("temperature_scores.csv")) in df.loc["base", "outputs"]
+    assert not list(plots_dir().glob("*.png"))
+
+
+def test_unknown_plot_formats(tmp_data):
+    # Nothing is scored if the plots would fail
+    manifest_file = write_manifest(tmp_data, [{"name": "base", "engine": "numpy"}])
+    with pytest.raises(ValueError, match="Unknown plot formats: gif"):
+        run_scenarios(manifest_file, workers=1, plot_formats=["gif"])
+    assert not list(data_dir("clean").glob("output_data*"))
+
+
+def test_missing_input(tmp_data):
+    # A missing input fails its scenario, the others are scored
+    manifest_file = write_manifest(
+        tmp_data,
+        [
+            {"name": "base", "engine": "numpy"},
+            {"name": "missing", "suffix": "_missing", "engine": "numpy"},
+        ],
+    )
+    df = run_scenarios(manifest_file, workers=1, plot_formats=["none"])
+    assert df.loc["base", "status"] == "ok"
+    assert df.loc["missing", "status"] == "failed"
+    assert "input_data_missing.xlsx" in df.loc["missing", "error"]
+
+
+def test_failed_cleaning(tmp_data):
+    # Stale clean input data of a failed cleaning job are not scored
+    clean_dir = tmp_data / "data" / "clean"
+    shutil.copy(clean_dir / "input_data.xlsx", clean_dir / "input_data_raw.xlsx")
+    manifest_file = write_manifest(
+        tmp_data,
+        [
+            {"name": "base", "engine": "numpy"},
+            {
+                "name": "raw",
+                "suffix": "_raw",
+                "raw_file": "missing.xlsx",
+                "engine": "numpy",
+                "plot": True,
+            },
+        ],
+    )
+    df = run_scenarios(manifest_file, workers=1, clean=True, plot_formats=["none"])
+    assert df.loc["clean_raw", "status"] == "failed"
+    assert df.loc["raw", "status"] == "skipped"
+    assert df.loc["raw", "error"] == "Cleaning job clean_raw failed"
+    assert df.loc["base", "status"] == "ok"
+    assert not list(clean_dir.glob("output_data_raw*"))
+    assert not plots_dir("temperature_scores_raw.csv").exists()
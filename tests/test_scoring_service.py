@@ -0,0 +1,140 @@
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculate_scores import calculate_score
+from scoring_service import (
+    LocalScoringClient,
+    ScoringClient,
+    apply_fundamental_changes,
+    load_service_state,
+    start_background_server,
+)
+from temperature_scoring.config import data_dir
+
+
+REPO_CLEAN_DIR = data_dir("clean")
+
+
+@pytest.fixture(scope="module")
+def state(tmp_path_factory):
+    # Caches of the tests stay in the temporary directory
+    tmp_path = tmp_path_factory.mktemp("service")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+        input_file = tmp_path / "input_data.xlsx"
+        shutil.copy(REPO_CLEAN_DIR / "input_data.xlsx", input_file)
+        yield load_service_state(input_file)
+
+
+@pytest.fixture(scope="module")
+def client(state):
+    return LocalScoringClient(state)
+
+
+def portfolio_scores(result, portfolio_id="Average"):
+    df = pd.DataFrame(result["portfolios"])
+    df = df[df["portfolio_id"] == portfolio_id]
+    return df.set_index(["scope", "time_frame"])["temperature_score"]
+
+
+def test_scores_match_calculate_score(client, state, tmp_path, monkeypatch):
+    monkeypatch.setenv("TEMPERATURE_SCORING_DIR", str(tmp_path))
+    (tmp_path / "data" / "clean").mkdir(parents=True)
+    shutil.copy(state["input_file"], data_dir("clean", "input_data.xlsx"))
+    files = calculate_score(
+        revised_combined_score=True,
+        aggregation_methods=["Average", "Revenue"],
+        engine="numpy",
+    )
+    result = client.score(
+        {"revised_combined_score": True, "aggregation_methods": ["Average", "Revenue"]}
+    )
+    for method, path in zip(["Average", "Revenue"], files[1:]):
+        expected = pd.read_csv(path).set_index("scope").stack()
+        actual = portfolio_scores(result, method)
+        pd.testing.assert_series_equal(
+            actual.reindex(expected.index), expected, check_names=False
+        )
+
+
+def test_fundamental_changes_reweight_portfolios(client, state):
+    company_id = int(state["fundamental_data"]["company_id"].iloc[0])
+    request = {"aggregation_methods": ["Revenue"], "companies": [company_id]}
+    before = portfolio_scores(client.score(request), "Revenue")
+    result = client.score(
+        {
+            **request,
+            "fundamental": [{"company_id": company_id, "company_revenue": 1e15}],
+        }
+    )
+    # The company outweighs all others
+    df_company = pd.DataFrame(result["companies"])
+    expected = df_company.set_index(["scope", "time_frame"])["temperature_score"]
+    after = portfolio_scores(result, "Revenue")
+    assert not after.equals(before)
+    pd.testing.assert_series_equal(
+        after, expected.round(2).reindex(after.index), check_names=False
+    )
+
+
+def test_fundamental_changes_clear_values(state):
+    df_fundamental = state["fundamental_data"]
+    company_id = df_fundamental["company_id"].iloc[0]
+    df = apply_fundamental_changes(
+        df_fundamental,
+        {"fundamental": [{"company_id": str(company_id), "ghg_s1s2": None}]},
+    )
+    row = df[df["company_id"] == company_id].iloc[0]
+    assert np.isnan(row["ghg_s1s2"])
+    # Fields missing from the row are kept
+    assert row["company_revenue"] == df_fundamental["company_revenue"].iloc[0]
+    assert len(df) == len(df_fundamental)
+
+
+def test_company_ids_of_any_type(client, state):
+    company_id = int(state["target_data"]["company_id"].iloc[0])
+    results = [
+        client.score({"remove_targets": [company_id], "companies": [company_id]}),
+        client.score({"remove_targets": [str(company_id)], "companies": [company_id]}),
+    ]
+    assert results[0]["companies"] == results[1]["companies"]
+    assert results[0]["portfolios"] == results[1]["portfolios"]
+    assert results[0] != client.score({"companies": [company_id]})["companies"]
+
+
+@pytest.mark.parametrize("unix_socket", [False, True])
+def test_threaded_server(state, client, tmp_path, unix_socket):
+    if unix_socket:
+        socket_path = str(tmp_path / "scoring.sock")
+        server = start_background_server(state, socket_path=socket_path)
+        remote = ScoringClient(socket_path=socket_path)
+    else:
+        server = start_background_server(state)
+        remote = ScoringClient(port=server.server_address[1])
+    try:
+        assert remote.health()["status"] == "ok"
+        requests = [
+            {"aggregation_methods": ["Average", "Revenue"]},
+            {"remove_targets": [1, 2], "revised_combined_score": True},
+            {
+                "holdings": [
+                    {"portfolio_id": "A", "company_id": 3, "investment_value": 1}
+                ]
+            },
+        ] * 3
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(remote.score, requests))
+        for request, result in zip(requests, results):
+            expected = client.score(request)
+            assert result["companies"] == expected["companies"]
+            assert result["portfolios"] == expected["portfolios"]
+
+        with pytest.raises(RuntimeError, match="400"):
+            remote.score({"fundamental": [{"company_id": 1, "unknown": 1}]})
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from SBTi.interfaces import ETimeFrames
+
+from temperature_scoring.config import data_dir
+from temperature_scoring.engine import GRID_SCOPES, calculate_temperature_scores
+from temperature_scoring.schema import to_scope, to_time_frame
+from temperature_scoring.sensitivity import (
+    draw_inputs,
+    get_scoring_setup,
+    run_sensitivity,
+    score_draws,
+)
+
+
+# No perturbations and no estimates
+NO_UNCERTAINTY = {
+    "reduction_ambition": 0,
+    "coverage": 0,
+    "ghg": 0,
+    "ghg_estimate": 0,
+    "estimate_share": 0,
+    "fallback_score": 0,
+}
+
+
+@pytest.fixture(scope="module")
+def input_data():
+    dfs = pd.read_excel(data_dir("clean", "input_data.xlsx"), sheet_name=None)
+    df_portfolio = dfs["portfolio_data"].assign(investment_value=1)
+    return dfs["target_data"], dfs["fundamental_data"], df_portfolio
+
+
+@pytest.fixture(scope="module")
+def setup(input_data):
+    return get_scoring_setup(*input_data)
+
+
+def score_keys(df):
+    return pd.MultiIndex.from_arrays(
+        [
+            df["company_id"].astype(str),
+            to_time_frame(df["time_frame"]).astype(str),
+            to_scope(df["scope"]).astype(str),
+        ]
+    )
+
+
+def test_unperturbed_scores_match_engine(input_data, setup):
+    df_expected = calculate_temperature_scores(
+        *input_data, time_frames=list(ETimeFrames), scopes=GRID_SCOPES
+    )
+    expected = pd.Series(
+        df_expected["temperature_score"].values, index=score_keys(df_expected)
+    )
+    df_companies, _ = run_sensitivity(setup, n_draws=2, seed=0)
+    actual = pd.Series(
+        df_companies["temperature_score"].values, index=score_keys(df_companies)
+    )
+    # The engine rounds scores like the SBTi tool
+    pd.testing.assert_series_equal(
+        actual.reindex(expected.index).round(2), expected, check_names=False
+    )
+
+    # Draws without uncertainty are the unperturbed scores
+    scores = score_draws(setup, draw_inputs(setup, 3, NO_UNCERTAINTY, seed=0))
+    np.testing.assert_array_equal(scores[0], scores[2])
+    np.testing.assert_array_equal(
+        scores[0].ravel(), df_companies["temperature_score"].values
+    )
+
+
+def test_estimates_fill_missing_s3(input_data, setup):
+    df_fundamental = input_data[1].set_index(input_data[1]["company_id"].astype(str))
+    estimates = df_fundamental["ghg_s3_estimate"].reindex(
+        setup["company_ids"].astype(str)
+    )
+    np.testing.assert_array_equal(setup["ghg_s3_estimate"], estimates.values)
+
+    missing = np.isnan(setup["ghg_s3"]) & ~np.isnan(setup["ghg_s3_estimate"])
+    assert missing.any()
+    inputs = draw_inputs(setup, 2, {**NO_UNCERTAINTY, "estimate_share": 1}, seed=0)
+    np.testing.assert_array_equal(
+        inputs["ghg_s3"][:, missing],
+        np.broadcast_to(setup["ghg_s3_estimate"][missing], (2, missing.sum())),
+    )
+    inputs = draw_inputs(setup, 2, NO_UNCERTAINTY, seed=0)
+    assert np.isnan(inputs["ghg_s3"][:, missing]).all()
+
+
+def test_bands_are_ordered(input_data, setup):
+    df_holdings = pd.DataFrame(
+        {
+            "portfolio_id": "Average",
+            "company_id": input_data[2]["company_id"],
+            "investment_value": 1,
+        }
+    )
+    for df in run_sensitivity(setup, df_holdings, n_draws=200, seed=0):
+        df = df.dropna(subset=["p5", "p50", "p95"])
+        assert len(df)
+        assert (df["p5"] <= df["p50"]).all()
+        assert (df["p50"] <= df["p95"]).all()
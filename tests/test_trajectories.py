@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from temperature_scoring.trajectories import (
+    calculate_carbon_budgets,
+    calculate_trajectories,
+    interpolate,
+)
+
+
+YEARS = np.arange(2020, 2026)
+
+
+def test_linear_interpolation():
+    points = np.array([[100.0], [np.nan], [np.nan], [np.nan], [60.0], [np.nan]])
+    values = interpolate(YEARS, points, "linear", extend=False)
+    np.testing.assert_allclose(values[:5, 0], [100, 90, 80, 70, 60])
+    assert np.isnan(values[5, 0])
+
+
+def test_geometric_interpolation():
+    points = np.array([[100.0, 100.0], [np.nan] * 2, [25.0, 0.0]])
+    values = interpolate(YEARS[:3], points, "geometric")
+    # Constant annual rate, linear towards zero emissions
+    np.testing.assert_allclose(values[:, 0], [100, 50, 25])
+    np.testing.assert_allclose(values[:, 1], [100, 50, 0])
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        interpolate(YEARS[:2], np.array([[1.0], [2.0]]), "cubic")
+
+
+def test_trajectories_anchor_to_history():
+    df_history = pd.DataFrame({"A": [100.0, 90.0]}, index=[2020, 2021])
+    # The base year target point is replaced by the reported emissions
+    df_targets = pd.DataFrame({"A": [120.0, 30.0]}, index=[2020, 2024])
+    df = calculate_trajectories(df_history, df_targets)
+    assert df.index.name == "year"
+    np.testing.assert_allclose(df["A"], [100, 90, 70, 50, 30])
+
+
+def test_trajectories_extend_past_last_target():
+    df_history = pd.DataFrame({"A": [100.0], "B": [50.0]}, index=[2020])
+    df_targets = pd.DataFrame({"A": [60.0], "B": [np.nan]}, index=[2022])
+    df = calculate_trajectories(df_history, df_targets, end_year=2025)
+    np.testing.assert_allclose(df["A"], [100, 80, 60, 60, 60, 60])
+    # Without targets emissions stay at their last reported level
+    np.testing.assert_allclose(df["B"], [50] * 6)
+
+    df = calculate_trajectories(df_history, df_targets, end_year=2025, extend=False)
+    assert df.loc[2023:, "A"].isna().all()
+
+
+def test_budget_exhausted_year():
+    df_trajectories = pd.DataFrame(
+        {"A": [10.0, 10.0, 10.0, 10.0], "B": [10.0, 5.0, 0.0, 0.0]},
+        index=pd.Index([2022, 2023, 2024, 2025], name="year"),
+    )
+    df = calculate_carbon_budgets(
+        df_trajectories, 2022, 2025, budgets={"A": 25.0, "B": 25.0}
+    )
+    # A exceeds its budget with 30 in 2024, B stays below with 15
+    assert df.loc["A", "budget_exhausted_year"] == 2024
+    assert np.isnan(df.loc["B", "budget_exhausted_year"])
+    assert df["cumulative_emissions"].tolist() == [40.0, 15.0]
+    assert df["overshoot"].tolist() == [15.0, -10.0]
+
+
+def test_linear_budgets_to_net_zero():
+    df_trajectories = pd.DataFrame({"A": [10.0] * 4}, index=[2022, 2023, 2024, 2025])
+    df = calculate_carbon_budgets(df_trajectories, 2022, 2025, net_zero_year=2025)
+    # Straight line from 10 in 2022 to zero in 2025 over four years
+    assert df.loc["A", "budget"] == 20.0
+    # Reached in 2023, exceeded in 2024
+    assert df.loc["A", "budget_exhausted_year"] == 2024